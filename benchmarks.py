@@ -0,0 +1,736 @@
+# benchmarks.py
+# 在Linux/CPython上运行的性能测试（不需要上传到ESP32）
+#
+# 用法：
+#     python benchmarks.py            运行全部测试
+#     python benchmarks.py portal     只运行指定测试
+
+import asyncio
+import contextlib
+import io
+import sys
+import threading
+import time
+
+import host_stubs
+host_stubs.install()
+
+
+def _run_loop_in_thread(coro_factory):
+    """在后台线程中运行一个asyncio事件循环，返回(loop, thread)"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def runner():
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_until_complete(coro_factory())
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    ready.wait()
+    return loop, thread
+
+
+def _run_clients(clients, worker):
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def bench_portal(port=8080, clients=8, requests_per_client=50):
+    """配置门户吞吐量：多个并发客户端，分别使用keep-alive和每请求新建连接"""
+    import http.client
+    import web_config_service
+
+    service = web_config_service.WebConfigService()
+    _run_loop_in_thread(lambda: service.run_server_async(port=port, timeout=60))
+    time.sleep(0.2)
+
+    for keep_alive in (True, False):
+        def worker():
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+            for _ in range(requests_per_client):
+                if not keep_alive:
+                    conn = http.client.HTTPConnection('127.0.0.1', port)
+                conn.request('GET', '/')
+                conn.getresponse().read()
+                if not keep_alive:
+                    conn.close()
+            conn.close()
+
+        elapsed = _run_clients(clients, worker)
+        total = clients * requests_per_client
+        print('portal keep_alive={}: {} 请求 / {:.3f} 秒 = {:.0f} 请求/秒'.format(
+            keep_alive, total, elapsed, total / elapsed))
+
+
+def _start_http_server(port):
+    """启动本地HTTP/1.1测试服务器（支持keep-alive），返回server对象"""
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = b'{"ok": true}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_urequests(port=8081, count=500):
+    """urequests每请求新建连接 vs Session连接复用"""
+    import urequests
+
+    server = _start_http_server(port)
+    url = 'http://localhost:{}/status'.format(port)
+    try:
+        start = time.perf_counter()
+        for _ in range(count):
+            urequests.get(url).json()
+        elapsed = time.perf_counter() - start
+        print('urequests.get: {} 请求 / {:.3f} 秒 = {:.0f} 请求/秒'.format(
+            count, elapsed, count / elapsed))
+
+        session = urequests.Session()
+        start = time.perf_counter()
+        for _ in range(count):
+            session.get(url).json()
+        elapsed = time.perf_counter() - start
+        session.close()
+        print('Session.get: {} 请求 / {:.3f} 秒 = {:.0f} 请求/秒（新建连接{}次，复用{}次）'.format(
+            count, elapsed, count / elapsed, session.connections_opened, session.connections_reused))
+    finally:
+        server.shutdown()
+
+
+def _start_ntp_server(host, port, skew=0.0, delay=0.0):
+    """启动本地UDP NTP测试服务器：skew为时钟偏差（秒），delay为处理延迟（秒），返回socket"""
+    import socket
+    import struct
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+
+    def timestamp(t):
+        t += 2208988800
+        seconds = int(t)
+        return struct.pack('!II', seconds, int((t - seconds) * 2 ** 32))
+
+    def serve():
+        while True:
+            try:
+                data, addr = sock.recvfrom(48)
+                t2 = time.time() + skew
+                time.sleep(delay)
+                t3 = time.time() + skew
+                # LI=0, VN=4, Mode=4（服务器），stratum=2，originate为请求的发送时间戳
+                packet = bytes((0x24, 2, 0, 0)) + bytes(20) + data[40:48] + timestamp(t2) + timestamp(t3)
+                sock.sendto(packet, addr)
+            except OSError:
+                return   # 测试结束后socket已关闭
+
+    threading.Thread(target=serve, daemon=True).start()
+    return sock
+
+
+def bench_ntp(port=12300, rounds=10):
+    """NTP同步：逐个查询单个服务器 vs 并发查询多个服务器（其中一个响应慢，一个时钟错误）"""
+    import ntp_client
+
+    servers = {
+        '127.0.0.1': (0.0, 0.0),
+        '127.0.0.2': (0.0, 0.002),
+        '127.0.0.3': (5.0, 0.0),    # 时钟偏差5秒的服务器
+        '127.0.0.4': (0.0, 0.5),    # 响应慢的服务器
+    }
+    socks = [_start_ntp_server(host, port, skew, delay) for host, (skew, delay) in servers.items()]
+    try:
+        for host in servers:
+            start = time.perf_counter()
+            errors = [abs(ntp_client.query(host, port)[0]) for _ in range(rounds)]
+            elapsed = time.perf_counter() - start
+            print('ntp 单服务器 {}: 平均 {:.1f} 毫秒/次, 最大误差 {} 毫秒'.format(
+                host, elapsed * 1000 / rounds, max(errors)))
+
+        start = time.perf_counter()
+        errors = [abs(ntp_client.query(list(servers), port)[0]) for _ in range(rounds)]
+        elapsed = time.perf_counter() - start
+        print('ntp 并发{}个服务器: 平均 {:.1f} 毫秒/次, 最大误差 {} 毫秒'.format(
+            len(servers), elapsed * 1000 / rounds, max(errors)))
+    finally:
+        for sock in socks:
+            sock.close()
+
+
+class _NullUART:
+    def write(self, data):
+        return len(data)
+
+
+def bench_format(count=100000):
+    """每秒时间输出：字符串格式化+拼接 vs TimeFormatter写入预分配缓冲区（main实际使用的输出函数）"""
+    import tracemalloc
+    import sync_time_service
+    import tick_scheduler
+
+    service = sync_time_service.TimeService(set_clock=lambda ms: None, query=lambda *args, **kwargs: (0, 0))
+    service.sync()
+    formatter = sync_time_service.TimeFormatter(service)
+    uart = _NullUART()
+    emit = tick_scheduler.output(formatter, uart)
+    utc_s = int(time.time())
+
+    def old_path():
+        uart.write('本地时间: {}'.format(service.get_local_time_str()) + '\r\n')
+
+    def new_path():
+        emit(utc_s, 0)
+
+    peaks = {}
+    for name, func in (('format', old_path), ('TimeFormatter', new_path)):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        func()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        peaks[name] = peak
+        print('{}: {:.2f} 微秒/次, 单次调用临时分配峰值 {} 字节'.format(
+            name, elapsed * 1000000 / count, peak))
+    # CPython的整数运算也会分配对象，这里只检查没有创建字符串；MicroPython上的分配检查见tests/test_time_output.py
+    assert peaks['TimeFormatter'] < peaks['format']
+
+
+def bench_scheduler(rate_hz=10, seconds=3, work_ms=3):
+    """时间输出间隔：sleep(周期)循环 vs TickScheduler（循环体耗时work_ms毫秒）"""
+    import sync_time_service
+    import tick_scheduler
+
+    service = sync_time_service.TimeService(set_clock=lambda ms: None, query=lambda *args, **kwargs: (0, 0))
+    service.sync()
+    period = 1000 // rate_hz
+    count = rate_hz * seconds
+
+    def work():
+        end = time.perf_counter() + work_ms / 1000
+        while time.perf_counter() < end:
+            pass
+
+    async def naive():
+        stamps = []
+        for _ in range(count):
+            stamps.append(sync_time_service.clock_ms())
+            work()
+            await asyncio.sleep(period / 1000)
+        return stamps
+
+    async def scheduled():
+        scheduler = tick_scheduler.TickScheduler(service, rate_hz)
+        stamps = []
+        for _ in range(count):
+            await scheduler.wait()
+            stamps.append(sync_time_service.clock_ms())
+            work()
+        return stamps, scheduler.metrics()
+
+    stamps = asyncio.run(naive())
+    phases = [stamp % period for stamp in stamps]
+    print('sleep循环: 总漂移 {} 毫秒, 相位 {}..{} 毫秒'.format(
+        stamps[-1] - stamps[0] - (count - 1) * period, min(phases), max(phases)))
+    stamps, metrics = asyncio.run(scheduled())
+    phases = [stamp % period for stamp in stamps]
+    print('TickScheduler: 总漂移 {} 毫秒, 相位 {}..{} 毫秒, 抖动 平均 {:.2f} / 最大 {} 毫秒, 跳过 {}'.format(
+        stamps[-1] - stamps[0] - (count - 1) * period, min(phases), max(phases),
+        metrics['jitter_avg_ms'], metrics['jitter_max_ms'], metrics['missed']))
+
+
+def bench_frame(count=20000):
+    """UART时间输出：文本行 vs 二进制帧的每次字节数和接收端解析耗时（编解码往返见tests/test_time_frame.py）"""
+    import sync_time_service
+    import time_frame
+
+    service = sync_time_service.TimeService(set_clock=lambda ms: None, query=lambda *args, **kwargs: (0, 4))
+    service.sync()
+    text = sync_time_service.TimeFormatter(service, millis=True)
+    encoder = time_frame.TimeFrameEncoder(service)
+    utc_s = sync_time_service.clock_s()
+
+    stream = bytearray()
+    for i in range(count):
+        ms = i * 100 % 1000
+        encoder.set_time(utc_s + i // 10, ms)
+        stream.extend(encoder.buf)
+    lines = [bytes(text.set_time(utc_s + i // 10, i * 100 % 1000)) for i in range(count)]
+
+    prefix = len('本地时间: '.encode('utf-8'))
+    start = time.perf_counter()
+    for line in lines:
+        fields = line[prefix:].decode('utf-8').split()
+        time.strptime(fields[0] + ' ' + fields[1][:8], '%Y-%m-%d %H:%M:%S')
+        int(fields[1][9:])
+    text_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    time_frame.FrameDecoder().feed(stream)
+    frame_elapsed = time.perf_counter() - start
+    print('文本: {} 字节/次, 解析 {:.2f} 微秒/次'.format(
+        len(lines[0]), text_elapsed * 1000000 / count))
+    print('二进制帧: {} 字节/次, 解析 {:.2f} 微秒/次'.format(
+        time_frame.FRAME_SIZE, frame_elapsed * 1000000 / count))
+
+
+def bench_commands(count=200):
+    """UART命令服务：从命令到达到收到回复的延迟（模拟UART，包含轮询间隔）"""
+    import machine
+    import uart_command_service
+
+    uart = machine.UART(1)
+    server = uart_command_service.CommandServer(uart)
+    server.register('PING', lambda args: 'PONG ' + args)
+
+    async def client():
+        task = asyncio.ensure_future(server.run())
+        latencies = []
+        for i in range(count):
+            uart.written = bytearray()
+            start = time.perf_counter()
+            uart.feed('PING {}\n'.format(i).encode())
+            while not uart.written.endswith(b'\r\n'):
+                await asyncio.sleep(0.0005)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert uart.written == 'OK PONG {}\r\n'.format(i).encode(), uart.written
+            await asyncio.sleep(0.003)
+        task.cancel()
+        return latencies
+
+    latencies = sorted(asyncio.run(client()))
+    metrics = server.metrics()
+    print('UART命令: {} 次, 端到端延迟 中位数 {:.2f} / 最大 {:.2f} 毫秒, 处理耗时 平均 {} / 最大 {} 微秒'.format(
+        count, latencies[count // 2], latencies[-1], metrics['latency_avg_us'], metrics['latency_max_us']))
+
+
+def bench_wifi(scan_delay=1.5, connect_delay=0.15, dhcp_delay=0.8):
+    """WiFi冷启动到联网：完整连接（扫描+关联+DHCP） vs 快速重连（缓存的BSSID和IP），使用模拟的各阶段耗时"""
+    import os
+    import tempfile
+    import network
+    import wifi_service
+
+    network.WLAN.networks = {'bench': 'password'}
+    network.WLAN.scan_delay = scan_delay
+    network.WLAN.connect_delay = connect_delay
+    network.WLAN.dhcp_delay = dhcp_delay
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())   # 快速重连缓存写在临时目录
+    try:
+        for name in ('完整连接', '快速重连'):
+            wlan = network.WLAN(network.STA_IF)   # 模拟重新启动
+            wlan.active(True)
+            stats = {}
+            start = time.perf_counter()
+            assert asyncio.run(wifi_service.wifi_connect_fast(wlan, 'bench', 'password', stats=stats))
+            print('{}: {:.0f} 毫秒, 各阶段 {}'.format(name, (time.perf_counter() - start) * 1000, stats))
+    finally:
+        os.chdir(cwd)
+        network.WLAN.networks = {}
+        network.WLAN.scan_delay = network.WLAN.dhcp_delay = 0
+        network.WLAN.connect_delay = 0.5
+
+
+def bench_supervisor(hours=6):
+    """WiFi重连（模拟时钟）：AP每小时掉线5秒、最后一小时完全不可用时，固定60秒重试 vs ConnectionSupervisor"""
+    import random
+    import wifi_service
+
+    class Sim:
+        """模拟时钟和AP：AP在outages列表中的时间段内不可用"""
+        def __init__(self, outages):
+            self.now = 0
+            self.outages = outages
+            self.link = False
+
+        def ap_up(self):
+            for start, end in self.outages:
+                if start <= self.now < end:
+                    return False
+            return True
+
+        async def sleep_ms(self, ms):
+            self.now += ms
+
+        def isconnected(self):
+            if not self.ap_up():
+                self.link = False
+            return self.link
+
+        async def connect(self):
+            self.now += 300    # 每次连接尝试耗时
+            self.link = self.ap_up()
+            return self.link
+
+    hour = 3600000
+    outages = [(h * hour + 1800000, h * hour + 1805000) for h in range(hours - 1)]
+    outages.append(((hours - 1) * hour, hours * hour))
+
+    # 固定间隔：每秒检查一次，断开时每60秒重试一次
+    sim = Sim(outages)
+    attempts = 0
+    offline = 0
+    while sim.now < hours * hour:
+        if sim.isconnected():
+            sim.now += 1000
+            continue
+        start = sim.now
+        attempts += 1
+        asyncio.run(sim.connect())
+        if not sim.link:
+            sim.now += 60000
+        offline += sim.now - start
+    print('固定60秒重试: 离线 {:.1f} 秒, 连接尝试 {} 次'.format(offline / 1000, attempts))
+
+    sim = Sim(outages)
+    supervisor = wifi_service.ConnectionSupervisor(
+        sim, sim.connect, clock=lambda: sim.now, sleep_ms=sim.sleep_ms, rand=random.Random(1).random)
+
+    async def run():
+        while sim.now < hours * hour:
+            await supervisor.step()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(run())
+    metrics = supervisor.metrics()
+    print('ConnectionSupervisor: 离线 {:.1f} 秒, 连接尝试 {} 次, 断网时长直方图 {}'.format(
+        (metrics['total_outage_ms'] + metrics['current_outage_ms'] + metrics['first_connect_ms']) / 1000,
+        metrics['attempts'], metrics['outage_histogram']))
+
+
+def bench_boot(count=1000):
+    """启动路径：冷启动导入main.py的各步骤耗时（子进程），以及缓存配置与每次读取存储的耗时对比"""
+    import json
+    import os
+    import subprocess
+    import tempfile
+    import wifi_config_service
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp()
+    with open(os.path.join(workdir, wifi_config_service.CONFIG_FILE), 'w') as f:
+        json.dump({'ssid': 'bench', 'password': 'password', 'networks': [
+            {'ssid': 'bench{}'.format(i), 'password': 'password', 'priority': i,
+             'successes': 0, 'failures': 0, 'last_success': 0} for i in range(5)]}, f)
+
+    # 在新的解释器中导入main，保证各模块都是冷导入
+    script = ('import sys; sys.path.insert(0, {!r}); import host_stubs; host_stubs.install(); '
+              'import main, boot_profile, json; print(json.dumps(boot_profile.report()))').format(repo)
+    result = subprocess.run([sys.executable, '-c', script], cwd=workdir,
+                            capture_output=True, text=True, check=True)
+    print('冷启动导入main.py（微秒）:')
+    for record in json.loads(result.stdout.splitlines()[-1]):
+        print('  {:<28} {:>8} {:>9}'.format(record['step'], record['us'], record['at_us']))
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for name, invalidate in (('每次读取存储', True), ('缓存的配置', False)):
+            wifi_config_service.invalidate_config()
+            start = time.perf_counter()
+            for _ in range(count):
+                if invalidate:
+                    wifi_config_service.invalidate_config()
+                wifi_config_service.load_networks()
+            elapsed = time.perf_counter() - start
+            print('{}: load_networks() {:.1f} 微秒/次'.format(name, elapsed / count * 1000000))
+    finally:
+        wifi_config_service.invalidate_config()
+        os.chdir(cwd)
+
+
+def bench_storage(repeat=200):
+    """原子JSON文件：内容变化与内容不变（跳过写入）的保存耗时（掉电模拟见tests/test_storage.py）"""
+    import os
+    import tempfile
+    import wifi_config_service
+
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    try:
+        store = wifi_config_service.AtomicJSONFile('bench.json')
+        start = time.perf_counter()
+        for i in range(repeat):
+            store.save({'ssid': 'bench', 'count': i})
+        changed = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            store.save({'ssid': 'bench', 'count': repeat - 1})
+        unchanged = (time.perf_counter() - start) / repeat
+        print('内容变化的保存: {:.0f} 微秒/次, 内容不变的保存: {:.1f} 微秒/次, 写入 {} 次, 跳过 {} 次'.format(
+            changed * 1000000, unchanged * 1000000, store.writes, store.skipped_writes))
+    finally:
+        os.chdir(cwd)
+
+
+def bench_kvstore(updates=500):
+    """设置存储：记录连接结果（每次修改一个网络的计数）时，整个JSON文件重写 vs 原子JSON文件 vs kvstore追加整个配置
+    vs kvstore追加单个网络的统计（wifi_config_service的做法；截断模拟见tests/test_storage.py）"""
+    import json
+    import os
+    import tempfile
+    import kvstore
+    import wifi_config_service
+
+    config = {'ssid': 'bench', 'password': 'password', 'networks': [
+        {'ssid': 'bench{}'.format(i), 'password': 'password', 'priority': i,
+         'successes': 0, 'failures': 0, 'last_success': 0} for i in range(3)]}
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    try:
+        def plain_json(value, profile):
+            with open('plain.json', 'w') as f:
+                json.dump(value, f)
+            return os.path.getsize('plain.json')
+
+        def atomic_json(value, profile):
+            atomic.save(value)
+            return os.path.getsize('atomic.json')
+
+        def kv_config(value, profile):
+            config_store.put_json('wifi_config', value)
+            return kvstore.HEADER_SIZE + len('wifi_config') + len(json.dumps(value))
+
+        def kv_stats(value, profile):
+            key = wifi_config_service.STATS_KEY_PREFIX + profile['ssid']
+            record = [profile['successes'], profile['failures'], profile['last_success']]
+            stats_store.put_json(key, record)
+            return kvstore.HEADER_SIZE + len(key) + len(json.dumps(record))
+
+        atomic = wifi_config_service.AtomicJSONFile('atomic.json')
+        config_store = kvstore.KVStore('config.kv')
+        stats_store = kvstore.KVStore('stats.kv')
+        savers = (('JSON重写', plain_json, None), ('原子JSON文件', atomic_json, None),
+                  ('kvstore追加整个配置', kv_config, config_store),
+                  ('kvstore追加单个网络的统计', kv_stats, stats_store))
+        for name, save, store in savers:
+            value = json.loads(json.dumps(config))
+            written = 0
+            start = time.perf_counter()
+            for i in range(updates):
+                profile = value['networks'][i % 3]
+                profile['successes'] += 1
+                profile['last_success'] = i + 1
+                written += save(value, profile)
+            elapsed = time.perf_counter() - start
+            if store is not None:
+                written += store.compactions * store.live_bytes   # 压缩时重写有效记录
+            print('{}: {:.0f} 微秒/次, 写入 {:.0f} 字节/次'.format(
+                name, elapsed / updates * 1000000, written / updates))
+            if store is not None:
+                print('  kvstore: {}'.format(store.stats()))
+
+        for name, load in (('JSON读取', lambda: json.load(open('plain.json'))),
+                           ('kvstore读取', lambda: config_store.get_json('wifi_config'))):
+            start = time.perf_counter()
+            for _ in range(updates):
+                assert load() == value
+            print('{}: {:.1f} 微秒/次'.format(name, (time.perf_counter() - start) / updates * 1000000))
+        config_store.close()
+        stats_store.close()
+    finally:
+        os.chdir(cwd)
+
+
+def bench_cache(port=8082, count=30, delay=0.05):
+    """DeepSeek响应缓存：访问服务器（本地模拟，每次回复延迟delay秒） vs 内存缓存命中 vs 闪存缓存命中
+    （重启后新建的缓存对象）；LRU、有效期和闪存缓存的检查见tests/test_response_cache.py"""
+    import http.server
+    import json
+    import os
+    import tempfile
+    import deepseek_api
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            time.sleep(delay)
+            body = json.dumps({'choices': [{'message': {'content': '缓存测试回复' * 20}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    deepseek_api.DEEPSEEK_API_URL = 'http://127.0.0.1:{}/v1/chat/completions'.format(port)
+    directory = os.path.join(tempfile.mkdtemp(), 'cache')
+    # 条目数不超过闪存缓存的max_files（默认32），重启后全部能从闪存读到
+    questions = [[{'role': 'user', 'content': '问题{}'.format(i)}] for i in range(count)]
+
+    def measure(label):
+        start = time.perf_counter()
+        for messages in questions:
+            assert deepseek_api.chat(messages)[0]
+        print('{}: {:.3f} 毫秒/次'.format(label, (time.perf_counter() - start) / count * 1000))
+
+    try:
+        cache = deepseek_api.enable_cache(max_bytes=count * 400, directory=directory,
+                                          synced=lambda: True)
+        measure('未命中（访问服务器）')
+        measure('内存缓存命中')
+        cache = deepseek_api.enable_cache(max_bytes=count * 400, directory=directory,
+                                          synced=lambda: True)
+        measure('闪存缓存命中（重启后）')
+        print('统计: {}'.format(cache.stats()))
+    finally:
+        deepseek_api.disable_cache()
+        server.shutdown()
+
+
+def bench_metrics(count=200000):
+    """指标记录的开销：未装饰的函数 vs 装饰后关闭/开启指标，以及with语句计时"""
+    import metrics
+    import web_config_service
+
+    def work(x):
+        return x + 1
+
+    timed_work = metrics.timed('bench_work_us')(work)
+    hist = metrics.histogram('bench_block_us')
+
+    def block(x):
+        with hist.time():
+            return x + 1
+
+    def measure(func):
+        start = time.perf_counter()
+        for i in range(count):
+            func(i)
+        return (time.perf_counter() - start) / count * 1e9
+
+    base = measure(work)
+    print('未装饰: {:.0f} 纳秒/次'.format(base))
+    for enabled in (False, True):
+        metrics.set_enabled(enabled)
+        print('{}: 装饰器 +{:.0f} 纳秒/次, with计时 +{:.0f} 纳秒/次'.format(
+            '开启' if enabled else '关闭', measure(timed_work) - base, measure(block) - base))
+    assert metrics.histogram('bench_work_us').count == count
+
+    status, headers, parts = web_config_service.WebConfigService().handle_request('GET', '/metrics', {}, b'')
+    text = b''.join(parts).decode('utf-8')
+    assert status == 200 and 'bench_work_us_count {}'.format(count) in text
+    print('/metrics: {} 字节, {} 个指标'.format(len(text), len(metrics.snapshot())))
+
+
+def bench_logger(count=100000):
+    """日志开销：直接print格式化后的消息 vs 低于级别的logger调用 vs 记录到缓冲区（不打印）；
+    以及批量写入文件的打开次数（限流、环形缓冲区和轮换的检查见tests/test_logger.py）"""
+    import os
+    import tempfile
+    import logger
+
+    log = logger.get_logger('bench')
+    ssid, left = 'bench', 7
+
+    def measure(func):
+        start = time.perf_counter()
+        for i in range(count):
+            func(i)
+        return (time.perf_counter() - start) / count * 1e9
+
+    def with_print(i):
+        print('等待连接{}...剩余 {} 秒'.format(ssid, left))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        printed = measure(with_print)
+    logger.configure(level=logger.INFO, console_level=logger.ERROR + 1, buffer_size=64)
+    dropped = measure(lambda i: log.debug('等待连接{}...剩余 {} 秒', ssid, left))
+    logger.RATE_LIMIT = count + 1
+    recorded = measure(lambda i: log.info('等待连接{}...剩余 {} 秒', ssid, left))
+    logger.RATE_LIMIT = 5
+    print('print+format: {:.0f} 纳秒/次, 低于级别: {:.0f} 纳秒/次, 记录到缓冲区: {:.0f} 纳秒/次'.format(
+        printed, dropped, recorded))
+
+    # 批量写入：每file_batch条打开一次文件，ERROR立即写入，超过大小后改名为.1
+    path = os.path.join(tempfile.mkdtemp(), 'app.log')
+    logger.configure(file=path, file_level=logger.INFO, file_batch=16, file_max_bytes=2048)
+    opens = [0]
+    real_open = open
+
+    def counting_open(*args, **kwargs):
+        opens[0] += 1
+        return real_open(*args, **kwargs)
+
+    logger.open = counting_open
+    try:
+        for i in range(160):
+            logger._rates.clear()   # 这里不测试限流
+            if i % 50:
+                log.info('写入测试 {}', i)
+            else:
+                log.error('写入错误 {}', i)
+        logger.flush()
+    finally:
+        del logger.open
+        logger.configure(file='')
+    print('写入160条日志: 打开文件{}次, {}: {}字节, {}.1: {}字节'.format(
+        opens[0], os.path.basename(path), os.path.getsize(path), os.path.basename(path),
+        os.path.getsize(path + '.1')))
+
+
+BENCHMARKS = {
+    'portal': bench_portal,
+    'urequests': bench_urequests,
+    'ntp': bench_ntp,
+    'format': bench_format,
+    'scheduler': bench_scheduler,
+    'frame': bench_frame,
+    'commands': bench_commands,
+    'wifi': bench_wifi,
+    'supervisor': bench_supervisor,
+    'boot': bench_boot,
+    'storage': bench_storage,
+    'kvstore': bench_kvstore,
+    'cache': bench_cache,
+    'metrics': bench_metrics,
+    'logger': bench_logger,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
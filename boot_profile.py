@@ -0,0 +1,61 @@
+# boot_profile.py
+# 启动耗时记录：按顺序记录各模块导入和初始化步骤完成的时刻（ticks_us），用于分析启动路径
+# 记录只是一次ticks_us()和一次列表追加，始终开启；config.BOOT_PROFILE为True时启动完成后打印报告
+#
+# 用法（main.py最先导入本模块）：
+#     import boot_profile
+#     import wifi_service
+#     boot_profile.mark('import wifi_service')
+
+import time
+
+# 最多记录的步骤数（启动完成后不再记录，ticks_us约17分钟回绕一次）
+MAX_RECORDS = 32
+
+_start = time.ticks_us()
+_last = _start
+_finished = False
+
+# [(步骤名, 本步耗时us, 从导入本模块起的累计耗时us), ...]
+records = []
+
+def mark(name):
+    """
+    记录一个步骤完成（耗时为距上一个记录的时间）
+
+    参数:
+        name: 步骤名
+    """
+    global _last
+    if _finished or len(records) >= MAX_RECORDS:
+        return
+    now = time.ticks_us()
+    records.append((name, time.ticks_diff(now, _last), time.ticks_diff(now, _start)))
+    _last = now
+
+def finish(name, show=False):
+    """
+    记录最后一个步骤并结束记录（通常是第一次输出时间）
+
+    参数:
+        name: 步骤名
+        show: 是否打印报告
+    """
+    global _finished
+    mark(name)
+    _finished = True
+    if show:
+        print_report()
+
+def report():
+    """
+    返回:
+        步骤列表 [{'step', 'us', 'at_us'}, ...]
+    """
+    return [{'step': name, 'us': us, 'at_us': at_us} for name, us, at_us in records]
+
+def print_report():
+    """打印各步骤耗时"""
+    print('启动耗时（微秒）:')
+    for name, us, at_us in records:
+        print('  {:<28} {:>9} {:>10}'.format(name, us, at_us))
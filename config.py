@@ -1,4 +1,5 @@
 # WiFi configuration - Now loaded from wifi_config_service
+import logger
 import wifi_config_service
 
 # Try to load saved configuration
@@ -8,7 +9,7 @@ WIFI_SSID, WIFI_PASSWORD = wifi_config_service.get_current_config()
 if not WIFI_SSID:
     WIFI_SSID = 'mg'
     WIFI_PASSWORD = 'zmg123456'
-    print("使用默认WiFi配置（无保存的配置）")
+    logger.get_logger('config').info('使用默认WiFi配置（无保存的配置）')
 
 # WiFi connection timeout in seconds
 WIFI_TIMEOUT = 15
@@ -19,3 +20,49 @@ TIMEZONE_OFFSET = 8  # e.g., UTC+8 for China
 # NTP server configuration
 NTP_SERVER = 'pool.ntp.org'
 NTP_PORT = 123
+# Servers queried concurrently on each sync; the best sample wins
+NTP_SERVERS = [NTP_SERVER, 'ntp.aliyun.com', 'ntp.tencent.com', 'time.cloudflare.com']
+
+# Reuse the last AP (BSSID/channel) and DHCP lease to reconnect without scan/DHCP
+WIFI_FAST_CONNECT = True
+
+# WiFi reconnect backoff in seconds: first retry after MIN, doubling (with jitter) up to MAX
+WIFI_BACKOFF_MIN = 1
+WIFI_BACKOFF_MAX = 300
+
+# NTP resync interval in seconds
+NTP_RESYNC_INTERVAL = 3600
+
+# NTP retry interval in seconds after a failed sync
+NTP_RETRY_INTERVAL = 60
+
+# UART time output rate (emissions per second, must divide 1000); above 1 adds milliseconds
+TIME_OUTPUT_RATE_HZ = 1
+
+# UART time output format: 'text' (human-readable line) or 'binary' (10-byte frame, see time_frame.py)
+TIME_OUTPUT_FORMAT = 'text'
+
+# Also print each UART time line to the console once a second (debugging only: the
+# print allocates on every output, so keep it off for a GC-quiet output loop)
+TIME_CONSOLE_ECHO = False
+
+# Record timing metrics (exported by the UART METRICS command and the portal's /metrics page)
+METRICS_ENABLED = True
+
+# Log levels: 10 DEBUG, 20 INFO, 30 WARNING, 40 ERROR (see logger.py).
+# Records below LOG_LEVEL are dropped before their message is formatted;
+# records at or above LOG_CONSOLE_LEVEL are also printed to the console
+LOG_LEVEL = 20
+LOG_CONSOLE_LEVEL = 20
+
+# Append records at or above LOG_FILE_LEVEL to this file on flash, in batches
+# (every LOG_FLUSH_INTERVAL seconds, when a batch fills up, or on an error); '' disables it
+LOG_FILE = ''
+LOG_FILE_LEVEL = 30
+LOG_FLUSH_INTERVAL = 60
+
+# Print per-step boot timings (imports, init, WiFi, NTP, first output) once the first time is output
+BOOT_PROFILE = False
+
+# Config portal run time in seconds
+CONFIG_PORTAL_TIMEOUT = 180
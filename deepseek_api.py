@@ -22,39 +22,448 @@ def get_response():
     return response_buffer
 
 
+import time
 import urequests
+import logger
+try:
+    import ujson
+except ImportError:
+    import json as ujson
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+_log = logger.get_logger('deepseek')
 
 # DeepSeek API 公开接口（如需更换请修改此处）
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
 # 请将 YOUR_API_KEY 替换为你的 DeepSeek API-KEY
 DEEPSEEK_API_KEY = "YOUR_API_KEY"
+DEEPSEEK_MODEL = "deepseek-chat"
+# 连接和每次读取的超时（秒），服务器无响应时请求失败而不是一直等待
+DEEPSEEK_TIMEOUT = 30
 
-def send_to_deepseek():
-    """
-    发送 input_buffer 到 DeepSeek API，并将响应写入 response_buffer
-    """
-    global input_buffer, response_buffer
-    headers = {
+# 响应缓存（enable_cache()启用）
+response_cache = None
+
+# 复用到API服务器的连接（keep-alive + TLS会话），避免每次请求重新握手
+_session = None
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = urequests.Session(timeout=DEEPSEEK_TIMEOUT)
+    return _session
+
+def _headers():
+    return {
         "Content-Type": "application/json",
         "Authorization": "Bearer {}".format(DEEPSEEK_API_KEY)
     }
+
+def enable_cache(max_bytes=4096, ttl=600, directory=None, synced=None):
+    """
+    启用响应缓存：相同模型和消息的请求直接返回缓存的回复，不访问网络
+
+    参数:
+        max_bytes: 内存缓存的字节上限
+        ttl: 缓存有效期（秒）
+        directory: 闪存缓存目录，None表示只使用内存缓存
+        synced: 返回RTC是否已经NTP校准的函数（如TimeService.synced），校准前不使用闪存缓存；
+            None表示按RTC的年份判断
+
+    返回:
+        response_cache.ResponseCache对象（可用于查看命中统计）
+    """
+    global response_cache
+    import response_cache as cache_module
+    response_cache = cache_module.ResponseCache(max_bytes, ttl, directory, synced=synced)
+    return response_cache
+
+def disable_cache():
+    """关闭响应缓存"""
+    global response_cache
+    response_cache = None
+
+def _cached(messages, on_token, stats):
+    # 返回(缓存键, 缓存的回复)：未启用缓存时键为None，未命中时回复为None
+    if stats is not None:
+        stats["cached"] = False
+    cache = response_cache
+    if cache is None:
+        return None, None
+    import response_cache as cache_module
+    key = cache_module.cache_key(DEEPSEEK_MODEL, ujson.dumps(messages))
+    text = cache.get(key)
+    if text is not None:
+        if stats is not None:
+            stats["cached"] = True
+            stats["bytes_sent"] = 0
+            stats["bytes_received"] = 0
+            stats["first_token_ms"] = 0
+        if on_token is not None:
+            on_token(text)
+    return key, text
+
+def chat(messages, on_token=None, stats=None):
+    """
+    发送对话到 DeepSeek API（已启用缓存时优先返回缓存的回复）
+    注意：阻塞直到收到完整回复，在asyncio任务中请使用 chat_async()
+
+    参数:
+        messages: 消息列表，如 [{"role": "user", "content": "..."}]
+        on_token: 为None时等待完整回复；否则以流式方式请求，每收到一段回复文本立即调用 on_token(text)
+        stats: 可选字典，写入本次请求的 bytes_sent、bytes_received、first_token_ms、cached
+
+    返回:
+        (ok, text) 元组，ok为False时text为错误信息
+    """
+    key, text = _cached(messages, on_token, stats)
+    if text is not None:
+        return True, text
+    ok, text = _request(messages, on_token, stats)
+    if ok and key is not None and response_cache is not None:
+        response_cache.put(key, text)
+    return ok, text
+
+async def chat_async(messages, on_token=None, stats=None):
+    """
+    chat()的协程版本：连接、TLS握手和读取回复时让出事件循环，每解析一个事件后再让出一次，
+    请求期间其他任务（时间输出、WiFi、NTP、串口命令）照常运行
+
+    参数和返回值与 chat() 相同
+    """
+    key, text = _cached(messages, on_token, stats)
+    if text is not None:
+        return True, text
+    ok, text = await _request_async(messages, on_token, stats)
+    if ok and key is not None and response_cache is not None:
+        response_cache.put(key, text)
+    return ok, text
+
+def _prepare(messages, on_token, stats):
+    # 返回(请求体, 请求头)，并初始化stats
     data = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "user", "content": input_buffer}
-        ]
+        "model": DEEPSEEK_MODEL,
+        "messages": messages
     }
+    headers = _headers()
+    if on_token is not None:
+        data["stream"] = True
+        headers["Accept"] = "text/event-stream"
+    body = ujson.dumps(data).encode("utf-8")
+    if stats is not None:
+        stats["bytes_sent"] = len(body)
+        stats["bytes_received"] = 0
+        stats["first_token_ms"] = None
+    return body, headers
+
+def _parse_reply(content, stats, start):
+    # 解析非流式请求的完整回复
+    if stats is not None:
+        stats["bytes_received"] = len(content)
+        stats["first_token_ms"] = time.ticks_diff(time.ticks_ms(), start)
+    result = ujson.loads(content)
+    # 解析标准API返回结构
+    if "choices" in result and len(result["choices"]) > 0:
+        return True, result["choices"][0]["message"]["content"]
+    return False, "[API无有效回复]"
+
+def _request(messages, on_token, stats):
+    body, headers = _prepare(messages, on_token, stats)
+    start = time.ticks_ms()
+    resp = None
     try:
-        resp = urequests.post(DEEPSEEK_API_URL, json=data, headers=headers)
-        if resp.status_code == 200:
-            result = resp.json()
-            # 解析标准API返回结构
-            if "choices" in result and len(result["choices"]) > 0:
-                response_buffer = result["choices"][0]["message"]["content"]
-            else:
-                response_buffer = "[API无有效回复]"
-        else:
-            response_buffer = "[HTTP错误] {}".format(resp.status_code)
-        resp.close()
+        resp = _get_session().post(DEEPSEEK_API_URL, data=body, headers=headers)
+        if resp.status_code != 200:
+            return False, "[HTTP错误] {}".format(resp.status_code)
+        if on_token is None:
+            return _parse_reply(resp.content, stats, start)
+        events = _EventStream(on_token, stats, start)
+        # [DONE]之后继续读到响应结束，使连接可以复用
+        for line in resp.iter_lines():
+            events.feed(line)
+        return events.finish()
+    except Exception as e:
+        return False, "[请求异常] {}".format(e)
+    finally:
+        if resp is not None:
+            resp.close()
+
+async def _request_async(messages, on_token, stats):
+    body, headers = _prepare(messages, on_token, stats)
+    start = time.ticks_ms()
+    resp = None
+    try:
+        resp = await _get_session().request_async("POST", DEEPSEEK_API_URL, data=body, headers=headers)
+        if resp.status_code != 200:
+            return False, "[HTTP错误] {}".format(resp.status_code)
+        if on_token is None:
+            return _parse_reply(await resp.read_all(), stats, start)
+        events = _EventStream(on_token, stats, start)
+        while True:
+            line = await resp.readline()
+            if line is None:
+                break
+            if events.feed(line):
+                # 已缓冲的多个事件之间也让出事件循环
+                await asyncio.sleep(0)
+        return events.finish()
     except Exception as e:
-        response_buffer = "[请求异常] {}".format(e)
+        return False, "[请求异常] {}".format(e)
+    finally:
+        if resp is not None:
+            resp.close()
+
+class _EventStream:
+    # 逐行解析server-sent events，一个事件可以包含多行data，以空行结束
+    def __init__(self, on_token, stats, start):
+        self.on_token = on_token
+        self.stats = stats
+        self.start = start
+        self.parts = []
+        self.event_data = []
+
+    def feed(self, line):
+        # 处理一行（不含换行符），返回True表示一个事件结束
+        stats = self.stats
+        if stats is not None:
+            stats["bytes_received"] += len(line) + 1
+        if line.startswith(b"data:"):
+            self.event_data.append(str(line[5:].strip(), "utf-8"))
+            return False
+        if line or not self.event_data:
+            # 注释行（如": keep-alive"）或其他字段
+            return False
+        self._emit()
+        return True
+
+    def _emit(self):
+        text = parse_sse_event("\n".join(self.event_data))
+        self.event_data = []
+        if text:
+            stats = self.stats
+            if stats is not None and stats["first_token_ms"] is None:
+                stats["first_token_ms"] = time.ticks_diff(time.ticks_ms(), self.start)
+            self.parts.append(text)
+            self.on_token(text)
+
+    def finish(self):
+        # 响应结束，返回(ok, text)
+        if self.event_data:
+            self._emit()
+        if self.parts:
+            return True, "".join(self.parts)
+        return False, "[API无有效回复]"
+
+def send_to_deepseek():
+    """
+    发送 input_buffer 到 DeepSeek API，并将响应写入 response_buffer
+    """
+    global input_buffer, response_buffer
+    ok, response_buffer = chat([{"role": "user", "content": input_buffer}])
+
+def parse_sse_event(data):
+    """
+    解析一个server-sent event的data字段（流式chat completion的一个分片）
+
+    返回:
+        分片中的回复文本；没有文本时返回空字符串；流结束（[DONE]）时返回None
+    """
+    if data == "[DONE]":
+        return None
+    chunk = ujson.loads(data)
+    choices = chunk.get("choices")
+    if not choices:
+        return ""
+    delta = choices[0].get("delta") or {}
+    return delta.get("content") or ""
+
+def stream_to_deepseek(on_token):
+    """
+    以流式方式（"stream": true）发送 input_buffer 到 DeepSeek API，
+    逐行解析server-sent events，每收到一段回复文本立即调用 on_token(text)，
+    无需等待完整回复；完整回复同时写入 response_buffer
+
+    参数:
+        on_token: 回调函数，参数为新收到的文本片段
+
+    返回:
+        完整回复文本
+    """
+    global input_buffer, response_buffer
+    ok, response_buffer = chat([{"role": "user", "content": input_buffer}], on_token)
+    return response_buffer
+
+def uart_sink(uart):
+    """
+    返回把回复片段写入串口的回调函数（用于stream_to_deepseek）
+    """
+    def on_token(text):
+        uart.write(text.encode("utf-8"))
+    return on_token
+
+def oled_sink(display, line_height=8):
+    """
+    返回把回复片段显示在SSD1306屏幕上的回调函数（用于stream_to_deepseek）
+    文字逐字符追加，一行写满或遇到换行时整屏上移一行。
+    内置字体只包含ASCII字符，其他字符显示为'?'
+
+    参数:
+        display: ssd1306.SSD1306对象
+        line_height: 行高（像素）
+    """
+    cols = display.width // 8
+    state = [0, display.height - line_height]  # 当前列、当前行的y坐标
+
+    def new_line():
+        state[0] = 0
+        display.scroll(0, -line_height)
+        display.framebuf.fill_rect(0, state[1], display.width, line_height, 0)
+
+    def on_token(text):
+        for ch in text:
+            if ch == "\n":
+                new_line()
+                continue
+            if state[0] >= cols:
+                new_line()
+            display.text(ch if ord(ch) < 128 else "?", state[0] * 8, state[1])
+            state[0] += 1
+        display.show()
+    return on_token
+
+class DeepSeekClient:
+    """
+    DeepSeek对话客户端
+
+    - 保存多轮对话历史，总字节数超过 history_bytes 时从最早的一轮开始淘汰
+    - 多个调用方（串口命令、Web门户等）通过 submit() 提交问题到队列，
+      由后台任务 run() 依次处理，互不覆盖
+    - 记录每次请求的耗时和收发字节数
+
+    参数:
+        history_bytes: 对话历史的字节上限（UTF-8）
+        queue_size: 等待处理的问题数上限
+        system_prompt: 可选的系统提示，每次请求都放在最前面（不计入历史上限）
+    """
+    def __init__(self, history_bytes=2048, queue_size=8, system_prompt=None):
+        self.history_bytes = history_bytes
+        self.queue_size = queue_size
+        self.system_prompt = system_prompt
+        self.history = []         # [(role, content, 字节数), ...]，最早的在前
+        self.history_size = 0     # 当前历史的总字节数
+        self._queue = []          # [(prompt, callback, on_token), ...]
+        self._wakeup = asyncio.Event()
+        self.last_stats = {}      # 最近一次请求的统计
+        self.metrics = {
+            "requests": 0,
+            "errors": 0,
+            "dropped": 0,
+            "total_latency_ms": 0,
+            "max_latency_ms": 0,
+            "bytes_sent": 0,
+            "bytes_received": 0,
+        }
+
+    def messages(self, prompt):
+        """
+        返回:
+            包含系统提示、历史和新问题的消息列表
+        """
+        msgs = []
+        if self.system_prompt:
+            msgs.append({"role": "system", "content": self.system_prompt})
+        for role, content, size in self.history:
+            msgs.append({"role": role, "content": content})
+        msgs.append({"role": "user", "content": prompt})
+        return msgs
+
+    def _remember(self, prompt, reply):
+        # 问题和回复作为一轮加入历史后，再按轮（问题+回复）淘汰最早的对话，直到总字节数不超过上限，
+        # 历史总是以问题开头
+        for role, content in (("user", prompt), ("assistant", reply)):
+            size = len(content.encode("utf-8"))
+            self.history.append((role, content, size))
+            self.history_size += size
+        while self.history_size > self.history_bytes and self.history:
+            self.history_size -= self.history.pop(0)[2]
+            while self.history and self.history[0][0] != "user":
+                self.history_size -= self.history.pop(0)[2]
+
+    def clear_history(self):
+        """清空对话历史"""
+        self.history = []
+        self.history_size = 0
+
+    async def ask(self, prompt, on_token=None):
+        """
+        发送问题（附带对话历史）并等待回复，成功时问题和回复加入历史（协程，等待期间其他任务照常运行）
+
+        参数:
+            prompt: 问题文本
+            on_token: 可选，流式接收回复片段的回调函数
+
+        返回:
+            (ok, text) 元组，ok为False时text为错误信息
+        """
+        stats = {}
+        start = time.ticks_ms()
+        ok, text = await chat_async(self.messages(prompt), on_token, stats)
+        stats["latency_ms"] = time.ticks_diff(time.ticks_ms(), start)
+        stats["ok"] = ok
+        self.last_stats = stats
+
+        metrics = self.metrics
+        metrics["requests"] += 1
+        metrics["total_latency_ms"] += stats["latency_ms"]
+        if stats["latency_ms"] > metrics["max_latency_ms"]:
+            metrics["max_latency_ms"] = stats["latency_ms"]
+        metrics["bytes_sent"] += stats.get("bytes_sent", 0)
+        metrics["bytes_received"] += stats.get("bytes_received", 0)
+        if ok:
+            self._remember(prompt, text)
+        else:
+            metrics["errors"] += 1
+        return ok, text
+
+    def submit(self, prompt, callback=None, on_token=None):
+        """
+        提交问题到队列，由 run() 任务处理
+
+        参数:
+            prompt: 问题文本
+            callback: 可选，处理完成后调用 callback(ok, text)
+            on_token: 可选，流式接收回复片段的回调函数
+
+        返回:
+            True如果已加入队列，队列已满时返回False
+        """
+        if len(self._queue) >= self.queue_size:
+            self.metrics["dropped"] += 1
+            return False
+        self._queue.append((prompt, callback, on_token))
+        self._wakeup.set()
+        return True
+
+    def pending(self):
+        """返回队列中等待处理的问题数"""
+        return len(self._queue)
+
+    async def run(self):
+        """
+        后台任务：依次处理队列中的问题（请求在等待网络时让出事件循环，不阻塞其他任务）
+        """
+        while True:
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            prompt, callback, on_token = self._queue.pop(0)
+            ok, text = await self.ask(prompt, on_token)
+            if callback is not None:
+                try:
+                    callback(ok, text)
+                except Exception as e:
+                    _log.error('DeepSeek回调出错: {}', e)
+            await asyncio.sleep(0)
@@ -0,0 +1,330 @@
+# host_stubs.py
+# 在Linux/CPython上运行本项目时使用的硬件桩模块
+# 提供machine、network、ntptime、framebuf的最小模拟实现，以及time.ticks_*等MicroPython扩展函数，
+# 使main.py等模块无需修改即可在PC上运行和调试（不需要上传到ESP32）
+#
+# 用法：
+#     import host_stubs
+#     host_stubs.install()
+#     import main
+#     main.main()
+
+import builtins
+import sys
+import time
+import types
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+# ---------------------------------------------------------------------------
+# time模块扩展（MicroPython特有的ticks函数）
+# ---------------------------------------------------------------------------
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) & TICKS_MAX
+
+def ticks_us():
+    return int(time.monotonic() * 1000000) & TICKS_MAX
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+def sleep_us(us):
+    time.sleep(us / 1000000)
+
+
+# ---------------------------------------------------------------------------
+# machine模块
+# ---------------------------------------------------------------------------
+
+class UART:
+    """模拟UART：写入的数据保存在written中，feed()注入的数据可被读取"""
+
+    def __init__(self, id, baudrate=115200, tx=None, rx=None, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.written = bytearray()
+        self.rx = bytearray()
+        self.echo = False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.written.extend(data)
+        if self.echo:
+            sys.stdout.write(bytes(data).decode('utf-8', 'replace'))
+        return len(data)
+
+    def feed(self, data):
+        self.rx.extend(data)
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, nbytes=None):
+        if not self.rx:
+            return None
+        if nbytes is None:
+            nbytes = len(self.rx)
+        data = bytes(self.rx[:nbytes])
+        del self.rx[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        if not self.rx:
+            return None
+        if nbytes is None:
+            nbytes = len(buf)
+        n = min(nbytes, len(self.rx), len(buf))
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, id, mode=-1, value=None):
+        self.id = id
+        self._value = value or 0
+
+    def init(self, mode=-1, value=None):
+        if value is not None:
+            self._value = value
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+    def high(self):
+        self._value = 1
+
+    def low(self):
+        self._value = 0
+
+
+class SoftI2C:
+    def __init__(self, scl=None, sda=None, freq=400000):
+        self.bytes_written = 0
+
+    def writeto(self, addr, buf):
+        self.bytes_written += len(buf)
+
+    def writevto(self, addr, vector):
+        for buf in vector:
+            self.bytes_written += len(buf)
+
+
+class RTC:
+    def datetime(self, dt=None):
+        if dt is None:
+            t = time.gmtime()
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+# ---------------------------------------------------------------------------
+# network模块
+# ---------------------------------------------------------------------------
+
+STA_IF = 0
+AP_IF = 1
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_NO_AP_FOUND = 201
+STAT_WRONG_PASSWORD = 202
+
+BSSID = b'\x02\x00\x00\x00\x00\x01'
+
+
+class WLAN:
+    """
+    模拟WLAN接口
+    networks: 可连接的网络 {ssid: password}
+    connect_delay: 模拟的关联耗时（秒）
+    scan_delay: 模拟的扫描耗时（秒），scan()和未指定bssid的connect()都会花费这段时间
+    dhcp_delay: 模拟的DHCP耗时（秒），设置了静态IP时没有这段时间
+    """
+    networks = {}
+    connect_delay = 0.5
+    scan_delay = 0
+    dhcp_delay = 0
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._config = {'essid': '', 'channel': 1}
+        self._ifconfig = ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+        self._static = False
+        self._connected_at = None
+        self._status = STAT_IDLE
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+
+    def connect(self, ssid=None, key=None, bssid=None):
+        self._connected_at = None
+        if ssid not in self.networks or (bssid is not None and bytes(bssid) != BSSID):
+            self._status = STAT_NO_AP_FOUND
+        elif self.networks[ssid] != key:
+            self._status = STAT_WRONG_PASSWORD
+        else:
+            delay = self.connect_delay
+            if bssid is None:
+                delay += self.scan_delay
+            if not self._static:
+                delay += self.dhcp_delay
+            self._connected_at = time.monotonic() + delay
+            self._config['essid'] = ssid
+            self._status = STAT_CONNECTING
+
+    def disconnect(self):
+        self._connected_at = None
+        self._status = STAT_IDLE
+
+    def isconnected(self):
+        if self.interface == AP_IF:
+            return self._active
+        return self._connected_at is not None and time.monotonic() >= self._connected_at
+
+    def status(self, param=None):
+        if param == 'rssi':
+            return -50
+        if self.isconnected():
+            return STAT_GOT_IP
+        return self._status
+
+    def scan(self):
+        time.sleep(self.scan_delay)
+        return [(ssid.encode(), BSSID, 1, -50, 3, False) for ssid in self.networks]
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
+
+    def ifconfig(self, config=None):
+        if config == 'dhcp':
+            self._ifconfig = ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+            self._static = False
+            return
+        if config is not None:
+            self._ifconfig = tuple(config)
+            self._static = self.interface == STA_IF
+            return
+        if self.interface == AP_IF and self._active:
+            return ('127.0.0.1', '255.255.255.0', '127.0.0.1', '127.0.0.1')
+        if self.isconnected() and self._ifconfig[0] == '0.0.0.0':
+            return ('127.0.0.1', '255.255.255.0', '127.0.0.1', '127.0.0.1')
+        return self._ifconfig
+
+
+# ---------------------------------------------------------------------------
+# framebuf模块（只支持单色MONO_VLSB格式；text()使用简化的字形：每个字符的前7列都是字符编码的低8位）
+# ---------------------------------------------------------------------------
+
+MONO_VLSB = 0
+
+
+class FrameBuffer:
+    def __init__(self, buf, width, height, format=MONO_VLSB):
+        self.buf = buf
+        self.width = width
+        self.height = height
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        index = (y >> 3) * self.width + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self.buf[index] & bit else 0
+        if c:
+            self.buf[index] |= bit
+        else:
+            self.buf[index] &= ~bit & 0xff
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(y, 0), min(y + h, self.height)):
+            for xx in range(max(x, 0), min(x + w, self.width)):
+                self.pixel(xx, yy, c)
+
+    def fill(self, c):
+        self.fill_rect(0, 0, self.width, self.height, c)
+
+    def text(self, string, x, y, c=1):
+        for i, char in enumerate(string):
+            bits = ord(char) & 0xff
+            for col in range(7):
+                for row in range(8):
+                    if bits >> row & 1:
+                        self.pixel(x + i * 8 + col, y + row, c)
+
+    def scroll(self, dx, dy):
+        pixels = [[self.pixel(x, y) for x in range(self.width)] for y in range(self.height)]
+        for y in range(self.height):
+            for x in range(self.width):
+                if 0 <= x - dx < self.width and 0 <= y - dy < self.height:
+                    self.pixel(x, y, pixels[y - dy][x - dx])
+
+
+def FrameBuffer1(buf, width, height):
+    return FrameBuffer(buf, width, height, MONO_VLSB)
+
+
+# ---------------------------------------------------------------------------
+# ntptime模块（PC时钟已经是准确的，因此settime不做任何事）
+# ---------------------------------------------------------------------------
+
+def settime():
+    pass
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    for key, value in attrs.items():
+        setattr(module, key, value)
+    return module
+
+
+def install():
+    """
+    安装桩模块（已存在的真实模块不会被覆盖）
+    """
+    for name in ('ticks_ms', 'ticks_us', 'ticks_add', 'ticks_diff', 'sleep_ms', 'sleep_us'):
+        if not hasattr(time, name):
+            setattr(time, name, globals()[name])
+    if not hasattr(builtins, 'const'):
+        builtins.const = lambda x: x
+    stubs = {
+        'micropython': _module('micropython', const=lambda x: x),
+        'machine': _module('machine', UART=UART, Pin=Pin, SoftI2C=SoftI2C,
+                           RTC=RTC, reset=reset),
+        'network': _module('network', WLAN=WLAN, STA_IF=STA_IF, AP_IF=AP_IF,
+                           STAT_IDLE=STAT_IDLE, STAT_CONNECTING=STAT_CONNECTING,
+                           STAT_GOT_IP=STAT_GOT_IP, STAT_NO_AP_FOUND=STAT_NO_AP_FOUND,
+                           STAT_WRONG_PASSWORD=STAT_WRONG_PASSWORD),
+        'ntptime': _module('ntptime', settime=settime, host='pool.ntp.org'),
+        'framebuf': _module('framebuf', FrameBuffer=FrameBuffer, FrameBuffer1=FrameBuffer1,
+                            MONO_VLSB=MONO_VLSB),
+    }
+    for name, module in stubs.items():
+        if name not in sys.modules:
+            sys.modules[name] = module
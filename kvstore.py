@@ -0,0 +1,249 @@
+# kvstore.py
+# 日志结构的键值存储：所有写入都追加到文件末尾，内存中保存键到值位置的索引，
+# 读取只需一次seek+read；文件中过期记录超过一半时压缩（重写有效记录到新文件后改名）
+#
+# 记录格式（多字节字段为小端）：
+#     0     MAGIC (0x4B)
+#     1     键长度（uint8）
+#     2-3   值长度（uint16，0xFFFF表示删除标记，没有值）
+#     4-7   CRC32（键+值）
+#     8-    键（UTF-8）、值（bytes）
+# 加载时遇到不完整或校验失败的记录（写入时掉电）即停止，并通过压缩丢弃文件尾部
+
+import json
+import struct
+import binascii
+import logger
+
+try:
+    import uos as os
+except ImportError:
+    import os
+
+MAGIC = 0x4B
+HEADER_SIZE = 8
+DELETED = 0xFFFF
+MAX_VALUE_SIZE = DELETED - 1
+
+# 文件大于此字节数、且超过有效记录总大小的COMPACT_RATIO倍时压缩
+COMPACT_MIN_BYTES = 4096
+COMPACT_RATIO = 2
+
+DEFAULT_FILE = 'settings.kv'
+TMP_SUFFIX = '.tmp'
+
+_log = logger.get_logger('kv')
+
+_default_store = None
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+def _crc(key, value):
+    return binascii.crc32(value, binascii.crc32(key)) & 0xffffffff
+
+def get_store():
+    """
+    返回:
+        各服务共用的KVStore（DEFAULT_FILE，第一次调用时打开）
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = KVStore(DEFAULT_FILE)
+    return _default_store
+
+class KVStore:
+    """
+    日志结构的键值存储
+
+    参数:
+        path: 文件名
+        compact_min_bytes: 文件小于此字节数时不压缩
+    """
+    def __init__(self, path, compact_min_bytes=COMPACT_MIN_BYTES):
+        self.path = path
+        self.compact_min_bytes = compact_min_bytes
+        self._index = {}       # key -> (值的偏移, 值的长度)
+        self.size = 0          # 文件中有效数据的字节数（即下一条记录的偏移）
+        self.live_bytes = 0    # 当前有效记录的总字节数
+        self.writes = 0
+        self.skipped_writes = 0
+        self.compactions = 0
+        tmp = path + TMP_SUFFIX
+        if _exists(path):
+            if _exists(tmp):
+                os.remove(tmp)   # 压缩时掉电留下的不完整文件
+        elif _exists(tmp):
+            os.rename(tmp, path) # 压缩完成、改名前掉电（旧文件已删除）
+        else:
+            open(path, 'wb').close()
+        self._file = open(path, 'r+b')
+        if self._load():
+            _log.warning('{}尾部有不完整的记录，已丢弃', path)
+            self.compact()
+
+    def _load(self):
+        # 扫描所有记录建立索引，返回文件尾部是否有无效数据
+        f = self._file
+        offset = 0
+        while True:
+            header = f.read(HEADER_SIZE)
+            if not header:
+                break
+            if len(header) < HEADER_SIZE or header[0] != MAGIC:
+                return True
+            key_len, value_len, crc = struct.unpack('<BHI', header[1:])
+            deleted = value_len == DELETED
+            data = f.read(key_len + (0 if deleted else value_len))
+            if len(data) < key_len + (0 if deleted else value_len):
+                return True
+            key = data[:key_len]
+            if _crc(key, data[key_len:]) != crc:
+                return True
+            self._set_index(key.decode('utf-8'), None if deleted else offset + HEADER_SIZE + key_len,
+                            value_len, len(header) + len(data))
+            offset += len(header) + len(data)
+            self.size = offset
+        return False
+
+    def _set_index(self, key, value_offset, value_len, record_size):
+        old = self._index.pop(key, None)
+        if old is not None:
+            self.live_bytes -= HEADER_SIZE + len(key.encode('utf-8')) + old[1]
+        if value_offset is not None:
+            self._index[key] = (value_offset, value_len)
+            self.live_bytes += record_size
+
+    def _append(self, key, value):
+        key_bytes = key.encode('utf-8')
+        if len(key_bytes) > 255:
+            raise ValueError('键太长')
+        if value is None:
+            value_len, value = DELETED, b''
+        else:
+            value_len = len(value)
+            if value_len > MAX_VALUE_SIZE:
+                raise ValueError('值太长')
+        f = self._file
+        f.seek(self.size)
+        f.write(struct.pack('<BBHI', MAGIC, len(key_bytes), value_len, _crc(key_bytes, value)))
+        f.write(key_bytes)
+        f.write(value)
+        f.flush()
+        record_size = HEADER_SIZE + len(key_bytes) + len(value)
+        self._set_index(key, None if value_len == DELETED else self.size + HEADER_SIZE + len(key_bytes),
+                        value_len, record_size)
+        self.size += record_size
+        self.writes += 1
+
+    def get(self, key, default=None):
+        """
+        读取一个值
+
+        返回:
+            值（bytes），不存在时返回default
+        """
+        entry = self._index.get(key)
+        if entry is None:
+            return default
+        f = self._file
+        f.seek(entry[0])
+        return f.read(entry[1])
+
+    def put(self, key, value):
+        """
+        写入一个值（追加一条记录；与当前值相同时不写闪存）
+
+        参数:
+            key: 键（字符串，UTF-8编码后不超过255字节）
+            value: 值（bytes，不超过65534字节）
+        """
+        value = bytes(value)
+        entry = self._index.get(key)
+        if entry is not None and entry[1] == len(value) and self.get(key) == value:
+            self.skipped_writes += 1
+            return
+        self._append(key, value)
+        self._maybe_compact()
+
+    def delete(self, key):
+        """
+        删除一个键（追加一条删除标记）
+
+        返回:
+            True如果键存在
+        """
+        if key not in self._index:
+            return False
+        self._append(key, None)
+        self._maybe_compact()
+        return True
+
+    def get_json(self, key, default=None):
+        """读取JSON值，不存在时返回default"""
+        value = self.get(key)
+        if value is None:
+            return default
+        return json.loads(value)
+
+    def put_json(self, key, value):
+        """把value编码为JSON后写入"""
+        self.put(key, json.dumps(value).encode('utf-8'))
+
+    def keys(self):
+        """返回所有键的列表"""
+        return list(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def _maybe_compact(self):
+        if self.size >= self.compact_min_bytes and self.size > self.live_bytes * COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """把有效记录写入新文件后替换旧文件，丢弃已覆盖、已删除的记录和尾部的无效数据"""
+        tmp = self.path + TMP_SUFFIX
+        old = self._file
+        index = {}
+        offset = 0
+        with open(tmp, 'wb') as f:
+            for key, (value_offset, value_len) in self._index.items():
+                old.seek(value_offset)
+                value = old.read(value_len)
+                key_bytes = key.encode('utf-8')
+                f.write(struct.pack('<BBHI', MAGIC, len(key_bytes), value_len, _crc(key_bytes, value)))
+                f.write(key_bytes)
+                f.write(value)
+                offset += HEADER_SIZE + len(key_bytes)
+                index[key] = (offset, value_len)
+                offset += value_len
+        old.close()
+        os.remove(self.path)
+        os.rename(tmp, self.path)
+        self._file = open(self.path, 'r+b')
+        self._index = index
+        self.size = self.live_bytes = offset
+        self.compactions += 1
+
+    def close(self):
+        """关闭文件"""
+        self._file.close()
+
+    def stats(self):
+        """
+        返回:
+            存储统计字典
+        """
+        return {
+            'keys': len(self._index),
+            'size': self.size,
+            'live_bytes': self.live_bytes,
+            'writes': self.writes,
+            'skipped_writes': self.skipped_writes,
+            'compactions': self.compactions,
+        }
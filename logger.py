@@ -0,0 +1,246 @@
+# logger.py
+# 结构化日志：级别过滤、延迟格式化、内存环形缓冲区、按调用位置限流、批量写入闪存
+#
+# 用法：
+#     import logger
+#     _log = logger.get_logger('wifi')
+#     _log.info('正在连接WiFi网络: {}...', ssid)   # 参数只在需要输出时才格式化
+#
+# 低于当前级别的调用在第一次比较后立即返回；记录只保存(时间, 级别, 名称, 格式串, 参数)，
+# 打印到控制台、读取缓冲区（UART的LOG命令）或写入闪存时才格式化
+
+import time
+
+try:
+    import uos as os
+except ImportError:
+    import os
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARN', ERROR: 'ERROR'}
+
+# 同一调用位置（同一格式串）每RATE_WINDOW_MS毫秒最多记录RATE_LIMIT条，超出的计入抑制数，
+# 下一个时间窗口的第一条记录附带被抑制的条数
+RATE_LIMIT = 5
+RATE_WINDOW_MS = 10000
+
+_level = INFO            # 低于此级别的日志直接丢弃
+_console_level = INFO    # 达到此级别的日志同时打印到控制台
+_buffer = [None] * 64    # 最近的记录（环形缓冲区）
+_next = 0                # 下一条记录的位置
+_total = 0               # 已记录的总条数
+_suppressed_total = 0    # 因限流丢弃的总条数
+_rates = {}              # 格式串 -> [窗口开始tick, 窗口内条数, 被抑制条数]
+_file = None             # 写入闪存的文件名，None表示不写
+_file_level = WARNING
+_file_batch = 16
+_file_max_bytes = 16384
+_pending = []            # 等待写入闪存的记录
+
+def configure(level=None, console_level=None, buffer_size=None, file=None,
+              file_level=None, file_batch=None, file_max_bytes=None):
+    """
+    修改日志配置（只修改传入的参数）
+
+    参数:
+        level: 记录的最低级别
+        console_level: 打印到控制台的最低级别（高于ERROR表示不打印）
+        buffer_size: 环形缓冲区条数（修改时清空缓冲区）
+        file: 写入闪存的文件名（''表示不写）
+        file_level: 写入闪存的最低级别
+        file_batch: 累积多少条后写入一次闪存
+        file_max_bytes: 文件超过此大小时改名为<file>.1后重新开始
+    """
+    global _level, _console_level, _buffer, _next, _file, _file_level, _file_batch, _file_max_bytes
+    if level is not None:
+        _level = level
+    if console_level is not None:
+        _console_level = console_level
+    if buffer_size is not None:
+        _buffer = [None] * buffer_size
+        _next = 0
+    if file is not None:
+        _file = file or None
+    if file_level is not None:
+        _file_level = file_level
+    if file_batch is not None:
+        _file_batch = file_batch
+    if file_max_bytes is not None:
+        _file_max_bytes = file_max_bytes
+
+def format_record(record):
+    """
+    把一条记录格式化为文本行（不含换行）
+
+    参数:
+        record: (时间秒, 级别, 名称, 格式串, 参数, 被抑制条数)
+    """
+    timestamp, level, name, fmt, args, suppressed = record
+    if args:
+        try:
+            message = fmt.format(*args)
+        except Exception:
+            message = '{} {}'.format(fmt, args)
+    else:
+        message = fmt
+    tm = time.gmtime(timestamp)
+    line = '{:02d}:{:02d}:{:02d} {} {}: {}'.format(
+        tm[3], tm[4], tm[5], LEVEL_NAMES.get(level, level), name, message)
+    if suppressed:
+        line += '（之前{}秒内另有{}条被抑制）'.format(RATE_WINDOW_MS // 1000, suppressed)
+    return line
+
+def _rate_check(fmt):
+    # 返回-1表示应丢弃，否则返回需要附带的被抑制条数
+    global _suppressed_total
+    now = time.ticks_ms()
+    state = _rates.get(fmt)
+    if state is None:
+        _rates[fmt] = [now, 1, 0]
+        return 0
+    if time.ticks_diff(now, state[0]) >= RATE_WINDOW_MS:
+        suppressed = state[2]
+        state[0] = now
+        state[1] = 1
+        state[2] = 0
+        return suppressed
+    if state[1] >= RATE_LIMIT:
+        state[2] += 1
+        _suppressed_total += 1
+        return -1
+    state[1] += 1
+    return 0
+
+def _primitive(arg):
+    return arg is None or isinstance(arg, (int, float, str))
+
+def _plain_args(args):
+    # 缓冲区只保存数字、字符串和None：其他参数（例如异常对象及其引用的栈帧）转换为字符串，
+    # 不让环形缓冲区长期持有大对象
+    for arg in args:
+        if not _primitive(arg):
+            return tuple(arg if _primitive(arg) else str(arg) for arg in args)
+    return args
+
+def _record(level, name, fmt, args):
+    global _next, _total
+    suppressed = _rate_check(fmt)
+    if suppressed < 0:
+        return
+    record = (int(time.time()), level, name, fmt, _plain_args(args), suppressed)
+    buffer = _buffer
+    buffer[_next] = record
+    _next += 1
+    if _next == len(buffer):
+        _next = 0
+    _total += 1
+    if level >= _console_level:
+        print(format_record(record))
+    if _file is not None and level >= _file_level:
+        _pending.append(record)
+        if len(_pending) >= _file_batch or level >= ERROR:
+            flush()
+
+def flush():
+    """
+    把等待中的记录写入闪存（一次打开文件写入整批记录）
+
+    返回:
+        写入的条数
+    """
+    global _pending
+    if not _pending or _file is None:
+        return 0
+    records = _pending
+    _pending = []
+    try:
+        try:
+            size = os.stat(_file)[6]
+        except OSError:
+            size = 0   # 文件不存在
+        if size >= _file_max_bytes:
+            # FAT文件系统上目标文件已存在时改名会失败：先删除上一个.1文件
+            try:
+                os.remove(_file + '.1')
+            except OSError:
+                pass
+            os.rename(_file, _file + '.1')
+        with open(_file, 'a') as f:
+            for record in records:
+                f.write(format_record(record))
+                f.write('\n')
+    except Exception as e:
+        print('写入日志文件失败: {}'.format(e))
+        return 0
+    return len(records)
+
+def recent(count=None):
+    """
+    返回:
+        最近count条记录（从旧到新）的文本行列表，None表示缓冲区中的全部记录
+    """
+    size = len(_buffer)
+    lines = []
+    for i in range(size):
+        record = _buffer[(_next + i) % size]
+        if record is not None:
+            lines.append(format_record(record))
+    if count is not None:
+        lines = lines[-count:] if count > 0 else []
+    return lines
+
+def stats():
+    """
+    返回:
+        日志统计字典
+    """
+    return {
+        'level': _level,
+        'records': _total,
+        'suppressed': _suppressed_total,
+        'pending': len(_pending),
+    }
+
+class Logger:
+    """
+    带名称的日志记录器（通常每个模块一个）
+
+    参数:
+        name: 名称（输出在每条记录中）
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def debug(self, fmt, *args):
+        if DEBUG >= _level:
+            _record(DEBUG, self.name, fmt, args)
+
+    def info(self, fmt, *args):
+        if INFO >= _level:
+            _record(INFO, self.name, fmt, args)
+
+    def warning(self, fmt, *args):
+        if WARNING >= _level:
+            _record(WARNING, self.name, fmt, args)
+
+    def error(self, fmt, *args):
+        if ERROR >= _level:
+            _record(ERROR, self.name, fmt, args)
+
+    def enabled(self, level):
+        """是否会记录该级别（用于跳过准备参数本身开销较大的日志）"""
+        return level >= _level
+
+_loggers = {}
+
+def get_logger(name):
+    """返回名为name的Logger（同名共用一个）"""
+    log = _loggers.get(name)
+    if log is None:
+        log = Logger(name)
+        _loggers[name] = log
+    return log
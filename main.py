@@ -1,92 +1,294 @@
+import boot_profile
 import time
 import machine
-from config import WIFI_SSID, WIFI_PASSWORD, WIFI_TIMEOUT, TIMEZONE_OFFSET
+boot_profile.mark('import machine')
+# 导入config时会加载保存的WiFi配置（之后使用缓存，不再重复读取文件）
+from config import (WIFI_SSID, WIFI_PASSWORD, WIFI_TIMEOUT, TIMEZONE_OFFSET,
+                    NTP_SERVERS, NTP_PORT, WIFI_BACKOFF_MIN, WIFI_BACKOFF_MAX,
+                    NTP_RESYNC_INTERVAL, NTP_RETRY_INTERVAL,
+                    CONFIG_PORTAL_TIMEOUT, TIME_CONSOLE_ECHO, TIME_OUTPUT_RATE_HZ,
+                    TIME_OUTPUT_FORMAT, WIFI_FAST_CONNECT, BOOT_PROFILE, METRICS_ENABLED,
+                    LOG_LEVEL, LOG_CONSOLE_LEVEL, LOG_FILE, LOG_FILE_LEVEL,
+                    LOG_FLUSH_INTERVAL)
+boot_profile.mark('import config')
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+boot_profile.mark('import asyncio')
+import logger
+logger.configure(level=LOG_LEVEL, console_level=LOG_CONSOLE_LEVEL,
+                 file=LOG_FILE, file_level=LOG_FILE_LEVEL)
+_log = logger.get_logger('app')
+import kvstore
+import metrics
+metrics.set_enabled(METRICS_ENABLED)
 import wifi_service
+import wifi_config_service
+boot_profile.mark('import wifi_service')
 import sync_time_service
+boot_profile.mark('import sync_time_service')
+import tick_scheduler
+import uart_command_service
+boot_profile.mark('import tick/uart_command')
+# web_config_service、deepseek_api、time_frame只在使用时导入
 
 # 初始化UART1（用户已将UART改为串口1，因为UART0被Python解释器占用）
 # UART1使用TX=GPIO10, RX=GPIO9（具体引脚可能因ESP32板型而异，请根据实际调整）
 # 注意：根据ESP32板型，UART1的引脚可能不同，请根据实际情况修改tx和rx参数
 uart1 = machine.UART(1, baudrate=115200, tx=17, rx=16)  # 示例引脚，可能需要调整
+boot_profile.mark('init uart')
+
+class AppState:
+    """
+    各协程任务之间共享的运行状态
 
-def run_config_portal():
+    属性:
+        wlan: wlan对象
+        time_service: 时间校准服务（保存同步状态和漂移估计）
+        time_formatter: 输出到UART的时间格式化器（文本行或二进制帧，预分配缓冲区）
+        time_scheduler: 时间输出调度器（输出时刻对齐到整秒边界）
+        time_getter: 获取本地时间字符串的函数（NTP同步成功前为None）
+        deepseek: DeepSeek对话客户端（第一次使用ASK命令时创建）
+        wifi_stats: 最近一次WiFi连接的各阶段耗时
+        wifi_supervisor: WiFi连接监管（重连、退避和连接统计，WiFi任务启动后创建）
+        synced: 第一次NTP同步成功
+        resync_request: 请求立即进行NTP同步
+        portal_request: 请求启动配置门户
+        portal_done: 配置门户已关闭
+    """
+    def __init__(self, wlan):
+        self.wlan = wlan
+        self.time_service = sync_time_service.TimeService(
+            wlan, TIMEZONE_OFFSET, NTP_SERVERS, NTP_PORT, NTP_RESYNC_INTERVAL,
+            store=kvstore.get_store())
+        if TIME_OUTPUT_FORMAT == 'binary':
+            import time_frame
+            self.time_formatter = time_frame.TimeFrameEncoder(self.time_service)
+        else:
+            self.time_formatter = sync_time_service.TimeFormatter(
+                self.time_service, millis=TIME_OUTPUT_RATE_HZ > 1)
+        self.time_scheduler = tick_scheduler.TickScheduler(self.time_service, TIME_OUTPUT_RATE_HZ)
+        self.time_getter = None
+        self.deepseek = None
+        self.wifi_stats = {}
+        self.wifi_supervisor = None
+        self.synced = asyncio.Event()
+        self.resync_request = asyncio.Event()
+        self.portal_request = asyncio.Event()
+        self.portal_done = asyncio.Event()
+
+def load_networks():
+    """
+    获取要连接的WiFi网络列表：优先使用保存的网络，否则使用config.py中的默认配置
+
+    返回:
+        网络列表（格式同wifi_config_service.load_networks()）
+    """
+    networks = wifi_config_service.load_networks()
+    if networks:
+        return networks
+    return [{'ssid': WIFI_SSID, 'password': WIFI_PASSWORD, 'priority': 0}]
+
+async def run_config_portal():
     """
     运行配置门户（AP模式 + Web服务器）
     允许用户通过网页配置WiFi SSID和密码
     """
-    print('启动配置门户...')
+    _log.info('启动配置门户...')
     try:
         import web_config_service
         portal = web_config_service.WebConfigService()
-        portal.run_config_portal(timeout=180)  # 运行3分钟
-        print('配置门户已关闭，重新加载配置...')
+        await portal.run_config_portal_async(timeout=CONFIG_PORTAL_TIMEOUT)
+        _log.info('配置门户已关闭，重新加载配置...')
         return True
     except Exception as e:
-        print('启动配置门户失败: {}'.format(e))
+        _log.error('启动配置门户失败: {}', e)
         return False
 
-def main():
-    """主函数"""
-    print('ESP32 MicroPython 网络时间同步程序（服务化重构 + Web配置）')
-    
-    # 初始化WiFi服务
-    wlan = wifi_service.wifi_init()
-    
-    # 连接WiFi
-    wifi_connected = wifi_service.wifi_connect(wlan, WIFI_SSID, WIFI_PASSWORD, WIFI_TIMEOUT)
-    
-    # 如果WiFi连接失败，启动配置门户
-    if not wifi_connected:
-        print('WiFi连接失败，启动配置门户...')
-        run_config_portal()
-        
-        # 重新加载配置（因为用户可能通过网页保存了新配置）
-        import wifi_config_service
-        new_ssid, new_password = wifi_config_service.get_current_config()
-        
-        # 如果有新配置，重新尝试连接
-        if new_ssid:
-            print('使用新配置重新尝试连接WiFi...')
-            wifi_connected = wifi_service.wifi_connect(wlan, new_ssid, new_password, WIFI_TIMEOUT)
+async def time_output_task(state, uart):
+    """
+    通过UART输出本地时间：NTP同步后按TIME_OUTPUT_RATE_HZ输出，输出时刻对齐到整秒边界；
+    WiFi重连、NTP同步在其他任务中进行，不会阻塞输出
+    """
+    while state.time_getter is None:
+        # 如果没有时间服务（WiFi连接失败），则通过print打印失败信息
+        # 每10秒打印一次，避免刷屏；同步成功后立即开始输出
+        _log.warning('无法连接WiFi，请检查配置和网络。当前时间（RTC）: {}', time.localtime())
+        try:
+            await asyncio.wait_for(state.synced.wait(), 10)
+        except asyncio.TimeoutError:
+            pass
+
+    # 通过UART1输出时间（写入预分配缓冲区，每次输出不分配内存）
+    emit = tick_scheduler.output(state.time_formatter, uart)
+    if TIME_CONSOLE_ECHO:
+        write = emit
+
+        def emit(utc_s, ms):
+            write(utc_s, ms)
+            if ms == 0:
+                # 调试信息通过print输出（每秒一次）
+                print('本地时间: {}'.format(state.time_getter()))
+
+    scheduler = state.time_scheduler
+    utc_s, ms = await scheduler.wait()
+    emit(utc_s, ms)
+    boot_profile.finish('first time output', BOOT_PROFILE)
+    await scheduler.run(emit)
+
+def get_deepseek(state):
+    """获取DeepSeek客户端，第一次调用时导入deepseek_api（占用较多内存）并启动其后台任务"""
+    if state.deepseek is None:
+        import deepseek_api
+        state.deepseek = deepseek_api.DeepSeekClient()
+        asyncio.create_task(state.deepseek.run())
+    return state.deepseek
+
+def register_commands(server, state):
+    """
+    注册UART命令：
+        STATUS      WiFi状态和本地时间
+        SYNC        立即进行NTP同步
+        ASK <问题>  提交问题给DeepSeek，回复稍后以"ASK <回复>"发送
+        METRICS     各服务的统计指标（JSON）
+        LOG [n]     最近n条日志（默认全部缓冲的日志），每条一行
+    """
+    def status(args):
+        if state.time_getter is not None:
+            local_time = state.time_getter()
         else:
-            print('未保存新配置，继续使用默认配置')
-    
-    # 如果WiFi连接成功，初始化时间校准服务
-    time_getter = None
-    if wifi_connected:
-        time_getter = sync_time_service.sync_time_service(wlan, TIMEZONE_OFFSET)
-    
-    # 主循环
-    loop_count = 0
+            local_time = '未同步'
+        return 'WiFi: {}, 本地时间: {}'.format(wifi_service.wifi_status(state.wlan), local_time)
+
+    def sync(args):
+        state.resync_request.set()
+        return '已请求NTP同步'
+
+    def ask(args):
+        if not args:
+            raise ValueError('缺少问题')
+        client = get_deepseek(state)
+
+        def reply(ok, text):
+            server.send('ASK' if ok else 'ERR', text)
+
+        if not client.submit(args, reply):
+            raise OSError('DeepSeek请求队列已满')
+        return '已加入队列，等待处理: {}'.format(client.pending())
+
+    def get_metrics(args):
+        import json
+        result = {
+            'time': state.time_service.metrics(),
+            'output': state.time_scheduler.metrics(),
+            'uart': server.metrics(),
+            'wifi': state.wifi_stats,
+            'boot': boot_profile.report(),
+            'registry': metrics.snapshot(),
+            'log': logger.stats(),
+        }
+        if state.wifi_supervisor is not None:
+            result['wifi_supervisor'] = state.wifi_supervisor.metrics()
+        if state.deepseek is not None:
+            result['deepseek'] = state.deepseek.metrics
+        return json.dumps(result)
+
+    def log(args):
+        lines = logger.recent(int(args) if args else None)
+        return '\n'.join(lines) if lines else '没有日志'
+
+    server.register('STATUS', status)
+    server.register('SYNC', sync)
+    server.register('ASK', ask)
+    server.register('METRICS', get_metrics)
+    server.register('LOG', log)
+
+async def wifi_task(state):
+    """保持WiFi连接：断开时立即重连，失败时指数退避，首次连接失败时启动配置门户，连接后触发NTP同步"""
+    async def connect():
+        state.wifi_stats = {}
+        return await wifi_service.wifi_connect_best(
+            state.wlan, load_networks(), WIFI_TIMEOUT, state.wifi_stats, WIFI_FAST_CONNECT)
+
+    async def on_failure(failures):
+        if failures == 1 and state.wifi_supervisor.connects == 0:
+            # 如果WiFi连接失败，启动配置门户，关闭后使用（可能新保存的）配置立即重试
+            _log.warning('WiFi连接失败，启动配置门户...')
+            state.portal_done.clear()
+            state.portal_request.set()
+            await state.portal_done.wait()
+            state.wifi_supervisor.request_retry()
+
+    def on_connect():
+        boot_profile.mark('wifi connected')
+        state.resync_request.set()
+
+    state.wifi_supervisor = wifi_service.ConnectionSupervisor(
+        state.wlan, connect, on_connect=on_connect, on_failure=on_failure,
+        base_delay_ms=WIFI_BACKOFF_MIN * 1000, max_delay_ms=WIFI_BACKOFF_MAX * 1000)
+    await state.wifi_supervisor.run()
+
+async def ntp_task(state):
+    """NTP时间同步：WiFi连接后立即同步，之后按NTP_RESYNC_INTERVAL定期重新同步，两次同步之间补偿RTC漂移"""
+    service = state.time_service
     while True:
-        if time_getter is not None:
-            # 如果有时间服务，则通过UART1输出时间
-            time_str = time_getter()
-            output_msg = '本地时间: {}'.format(time_str)
-            # 调试信息通过print输出
-            print(output_msg)
-            # 本地时间通过UART1输出
-            uart1.write(output_msg + '\r\n')
+        await state.resync_request.wait()
+        state.resync_request.clear()
+
+        if await service.sync_async():
+            boot_profile.mark('ntp synced')
+            state.time_getter = service.get_local_time_str
+            state.synced.set()
+            interval = NTP_RESYNC_INTERVAL
         else:
-            # 如果没有时间服务（WiFi连接失败），则通过print打印失败信息
-            # 每10次循环打印一次，避免刷屏
-            if loop_count % 10 == 0:
-                print('无法连接WiFi，请检查配置和网络。当前时间（RTC）: {}'.format(time.localtime()))
-                
-                # 每60次循环（约1分钟）检查一次是否应该重新尝试连接
-                if loop_count % 60 == 0:
-                    print('重新尝试连接WiFi...')
-                    # 重新加载配置
-                    import wifi_config_service
-                    current_ssid, current_password = wifi_config_service.get_current_config()
-                    if current_ssid:
-                        wifi_connected = wifi_service.wifi_connect(wlan, current_ssid, current_password, WIFI_TIMEOUT)
-                        if wifi_connected:
-                            time_getter = sync_time_service.sync_time_service(wlan, TIMEZONE_OFFSET)
-                            print('WiFi重新连接成功！')
-        
-        time.sleep(1)
-        loop_count += 1
+            interval = NTP_RETRY_INTERVAL
+
+        try:
+            await asyncio.wait_for(state.resync_request.wait(), interval)
+        except asyncio.TimeoutError:
+            state.resync_request.set()
+
+async def portal_task(state):
+    """按需运行配置门户"""
+    while True:
+        await state.portal_request.wait()
+        state.portal_request.clear()
+        await run_config_portal()
+        state.portal_done.set()
+
+async def log_flush_task():
+    """每LOG_FLUSH_INTERVAL秒把累积的日志批量写入闪存"""
+    while True:
+        await asyncio.sleep(LOG_FLUSH_INTERVAL)
+        logger.flush()
+
+async def main_async(uart):
+    """协程主函数：时间输出、UART命令、WiFi连接、NTP同步、配置门户作为独立任务并发运行"""
+    print('ESP32 MicroPython 网络时间同步程序（服务化重构 + Web配置）')
+
+    # 初始化WiFi服务
+    state = AppState(wifi_service.wifi_init())
+    boot_profile.mark('init wifi/time service')
+    command_server = uart_command_service.CommandServer(uart)
+    register_commands(command_server, state)
+    boot_profile.mark('init command server')
+
+    tasks = [
+        time_output_task(state, uart),
+        command_server.run(),
+        wifi_task(state),
+        ntp_task(state),
+        portal_task(state),
+    ]
+    if LOG_FILE:
+        tasks.append(log_flush_task())
+    await asyncio.gather(*tasks)
+
+def main():
+    """主函数"""
+    asyncio.run(main_async(uart1))
 
 if __name__ == '__main__':
     main()
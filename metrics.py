@@ -0,0 +1,247 @@
+# metrics.py
+# 轻量的指标注册表：计数器、仪表和固定桶直方图（耗时用ticks_us测量，单位微秒）
+# 各服务在模块导入时创建指标，用装饰器或上下文管理器记录函数耗时；
+# 关闭后装饰器只多一次全局变量判断，上下文管理器返回共享的空对象，不分配内存
+#
+# 导出：snapshot()返回字典（UART的METRICS命令以JSON输出），
+# render_text()返回Prometheus文本格式（配置门户的/metrics页面）
+
+import time
+
+# 直方图默认桶上界（微秒）：0.1ms、1ms、10ms、100ms、1s、10s，最后一个桶为10s以上
+DEFAULT_BUCKETS_US = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+_enabled = True
+_registry = {}   # name -> Counter/Gauge/Histogram，按创建顺序导出
+
+def set_enabled(enabled):
+    """
+    开启或关闭指标记录（关闭后已有的数值保留）
+
+    参数:
+        enabled: 是否记录
+    """
+    global _enabled
+    _enabled = enabled
+
+def enabled():
+    """是否正在记录指标"""
+    return _enabled
+
+class Counter:
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, n=1):
+        if _enabled:
+            self.value += n
+
+    def export(self):
+        return self.value
+
+class Gauge:
+    """记录当前值的仪表"""
+    kind = 'gauge'
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def set(self, value):
+        if _enabled:
+            self.value = value
+
+    def export(self):
+        return self.value
+
+class _Timer:
+    # 上下文管理器：退出时把耗时记录到直方图，因异常退出时同时计入errors
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.ticks_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        histogram = self.histogram
+        if exc_type is not None:
+            histogram.errors += 1
+        histogram.observe(time.ticks_diff(time.ticks_us(), self.start))
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Histogram:
+    """
+    固定桶直方图
+
+    参数:
+        name: 指标名
+        buckets: 递增的桶上界，counts比buckets多一个桶（大于最后一个上界）
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, buckets=DEFAULT_BUCKETS_US):
+        self.name = name
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.errors = 0   # 被测函数抛出异常的次数
+
+    def observe(self, value):
+        """记录一个数值"""
+        if not _enabled:
+            return
+        buckets = self.buckets
+        i = 0
+        n = len(buckets)
+        while i < n and value > buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def since(self, start_us):
+        """记录从start_us（time.ticks_us()的读数）到现在的耗时"""
+        if _enabled:
+            self.observe(time.ticks_diff(time.ticks_us(), start_us))
+
+    def time(self):
+        """
+        返回:
+            记录with语句块耗时的上下文管理器
+        """
+        if not _enabled:
+            return _NULL_TIMER
+        return _Timer(self)
+
+    def export(self):
+        return {
+            'buckets': list(self.buckets),
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': self.total,
+            'max': self.max,
+            'errors': self.errors,
+        }
+
+def _get(cls, name, *args):
+    metric = _registry.get(name)
+    if metric is None:
+        metric = cls(name, *args)
+        _registry[name] = metric
+    elif not isinstance(metric, cls):
+        raise ValueError('指标{}的类型不同'.format(name))
+    return metric
+
+def counter(name):
+    """返回名为name的计数器（不存在时创建）"""
+    return _get(Counter, name)
+
+def gauge(name):
+    """返回名为name的仪表（不存在时创建）"""
+    return _get(Gauge, name)
+
+def histogram(name, buckets=DEFAULT_BUCKETS_US):
+    """返回名为name的直方图（不存在时按buckets创建）"""
+    return _get(Histogram, name, buckets)
+
+def timed(name, buckets=DEFAULT_BUCKETS_US):
+    """
+    装饰器：把函数每次调用的耗时（微秒）记录到直方图name
+
+    参数:
+        name: 直方图名
+        buckets: 桶上界
+    """
+    hist = histogram(name, buckets)
+
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.ticks_us()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                hist.errors += 1
+                raise
+            finally:
+                hist.observe(time.ticks_diff(time.ticks_us(), start))
+        return wrapper
+    return decorator
+
+def timed_async(name, buckets=DEFAULT_BUCKETS_US):
+    """
+    装饰器（协程函数）：把每次调用从开始到完成的耗时（微秒，包括等待时间）记录到直方图name
+
+    参数:
+        name: 直方图名
+        buckets: 桶上界
+    """
+    hist = histogram(name, buckets)
+
+    def decorator(func):
+        async def wrapper(*args, **kwargs):
+            if not _enabled:
+                return await func(*args, **kwargs)
+            start = time.ticks_us()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                hist.errors += 1
+                raise
+            finally:
+                hist.observe(time.ticks_diff(time.ticks_us(), start))
+        return wrapper
+    return decorator
+
+def snapshot():
+    """
+    返回:
+        所有指标的字典 {name: 数值或直方图字典}
+    """
+    result = {}
+    for name, metric in _registry.items():
+        result[name] = metric.export()
+    return result
+
+def render_text():
+    """
+    返回:
+        Prometheus文本格式的所有指标（str）
+    """
+    lines = []
+    for name, metric in _registry.items():
+        lines.append('# TYPE {} {}'.format(name, metric.kind))
+        if metric.kind != 'histogram':
+            lines.append('{} {}'.format(name, metric.value))
+            continue
+        cumulative = 0
+        for bound, n in zip(metric.buckets, metric.counts):
+            cumulative += n
+            lines.append('{}_bucket{{le="{}"}} {}'.format(name, bound, cumulative))
+        lines.append('{}_bucket{{le="+Inf"}} {}'.format(name, metric.count))
+        lines.append('{}_sum {}'.format(name, metric.total))
+        lines.append('{}_count {}'.format(name, metric.count))
+        lines.append('# TYPE {}_errors counter'.format(name))
+        lines.append('{}_errors {}'.format(name, metric.errors))
+    lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,294 @@
+# ntp_client.py
+# NTP客户端：同时向多个服务器发送请求（非阻塞UDP），按RFC 5905计算每个样本的偏差和往返延迟，
+# 剔除偏差明显偏离多数服务器的样本，选择往返延迟最小的样本
+
+import time
+import socket
+import select
+import struct
+import os
+import metrics
+import logger
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+_log = logger.get_logger('ntp')
+
+if hasattr(asyncio, 'sleep_ms'):
+    _sleep_ms = asyncio.sleep_ms
+else:
+    def _sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+# NTP时间戳（1900年起）与本地纪元的秒数差：ESP32等端口的纪元为2000年，Unix/CPython为1970年
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+
+# 偏差与中位数相差超过 max(OUTLIER_MAD_FACTOR * MAD, OUTLIER_MIN_MS) 的样本视为异常
+OUTLIER_MAD_FACTOR = 3
+OUTLIER_MIN_MS = 50
+
+# 过半服务器响应后，最多再等待 max(已知最小往返延迟, SETTLE_MIN_MS) 毫秒：
+# 更晚到达的响应延迟必然更大，不会被选中，不必让慢速服务器拖慢同步
+SETTLE_MIN_MS = 10
+
+# query_samples_async()没有响应时的轮询间隔（毫秒）：响应的接收时间最多因此推迟这么久，
+# 计入往返延迟，偏差误差不超过它的一半
+POLL_INTERVAL_MS = 2
+
+# 已解析的服务器地址，避免每次同步都进行DNS查询（查询失败时清除）
+_addr_cache = {}
+
+def clock_ms():
+    """
+    获取RTC当前时间（本地纪元起的毫秒数，整数）
+    ESP32上浮点数为单精度，因此时间计算全部使用整数毫秒
+    """
+    if hasattr(time, 'time_ns'):
+        return time.time_ns() // 1000000
+    return int(time.time() * 1000)
+
+def _timestamp_ms(data, offset):
+    seconds, fraction = struct.unpack('!II', data[offset:offset + 8])
+    return (seconds - NTP_DELTA) * 1000 + ((fraction * 1000) >> 32)
+
+def _resolve(server, port):
+    key = (server, port)
+    addr = _addr_cache.get(key)
+    if addr is None:
+        addr = socket.getaddrinfo(server, port)[0][-1]
+        _addr_cache[key] = addr
+    return addr
+
+def _poll_key(obj):
+    # CPython的poll返回文件描述符，MicroPython返回socket对象本身
+    if isinstance(obj, int):
+        return obj
+    if hasattr(obj, 'fileno'):
+        return obj.fileno()
+    return id(obj)
+
+def parse_response(data, nonce, t1, t4):
+    """
+    解析NTP响应并计算偏差和往返延迟（RFC 5905）
+
+    参数:
+        data: 收到的数据包
+        nonce: 请求中发送的8字节发送时间戳（服务器应原样放入originate字段）
+        t1: 本地发送时间（毫秒）
+        t4: 本地接收时间（毫秒）
+
+    返回:
+        (offset_ms, delay_ms) 元组，offset为正表示本地时钟偏慢
+
+    异常:
+        ValueError: 响应无效（长度、模式、未同步的服务器或originate不匹配）
+    """
+    if len(data) < 48:
+        raise ValueError('NTP响应长度错误')
+    if data[0] & 0x07 != 4:
+        raise ValueError('NTP响应模式错误')
+    if data[0] >> 6 == 3 or data[1] == 0 or data[1] > 15:
+        raise ValueError('NTP服务器未同步')
+    if data[24:32] != nonce:
+        raise ValueError('NTP响应与请求不匹配')
+    t2 = _timestamp_ms(data, 32)  # 服务器接收时间
+    t3 = _timestamp_ms(data, 40)  # 服务器发送时间
+    offset = ((t2 - t1) + (t3 - t4)) // 2
+    delay = (t4 - t1) - (t3 - t2)
+    return offset, delay
+
+class _Query:
+    # 一次并发查询的状态：发送请求、处理响应、计算等待截止时间（同步和协程版本共用）
+    def __init__(self, port, timeout, clock):
+        self.port = port
+        self.timeout = timeout
+        self.clock = clock
+        self.poller = select.poll()
+        self.pending = {}
+        self.samples = []
+        self.quorum = 1
+        self.best_delay = None
+        self.deadline = 0
+
+    def send(self, server):
+        s = None
+        try:
+            addr = _resolve(server, self.port)
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.setblocking(False)
+            nonce = os.urandom(8)
+            packet = bytearray(48)
+            packet[0] = 0x23  # LI=0, VN=4, Mode=3（客户端）
+            packet[40:48] = nonce
+            t1 = self.clock()
+            s.sendto(packet, addr)
+        except Exception as e:
+            _log.warning('NTP服务器{}请求失败: {}', server, e)
+            _addr_cache.pop((server, self.port), None)
+            if s is not None:
+                s.close()
+            return
+        self.poller.register(s, select.POLLIN)
+        self.pending[_poll_key(s)] = (server, s, nonce, t1)
+
+    def start(self):
+        # 所有请求已发出，开始计算超时
+        self.quorum = len(self.pending) // 2 + 1
+        self.deadline = time.ticks_add(time.ticks_ms(), int(self.timeout * 1000))
+
+    def remaining(self):
+        # 距截止时间的毫秒数，<=0表示结束等待
+        if not self.pending:
+            return 0
+        return time.ticks_diff(self.deadline, time.ticks_ms())
+
+    def handle(self, events):
+        # 处理poll()返回的可读socket
+        pending = self.pending
+        for obj, event in events:
+            entry = pending.pop(_poll_key(obj), None)
+            if entry is None:
+                continue
+            server, s, nonce, t1 = entry
+            self.poller.unregister(s)
+            try:
+                data = s.recv(48)
+                t4 = self.clock()
+                offset, delay = parse_response(data, nonce, t1, t4)
+                self.samples.append((server, offset, delay))
+                if self.best_delay is None or delay < self.best_delay:
+                    self.best_delay = delay
+            except Exception as e:
+                _log.warning('NTP服务器{}响应无效: {}', server, e)
+            s.close()
+        if len(self.samples) >= self.quorum and pending:
+            settle = time.ticks_add(time.ticks_ms(), max(self.best_delay, SETTLE_MIN_MS))
+            if time.ticks_diff(settle, self.deadline) < 0:
+                self.deadline = settle
+
+    def finish(self):
+        # 超时（或过半响应后仍未响应）的服务器；多数服务器都没有响应时重新解析地址
+        for server, s, nonce, t1 in self.pending.values():
+            self.poller.unregister(s)
+            s.close()
+            if len(self.samples) < self.quorum:
+                _addr_cache.pop((server, self.port), None)
+        self.pending = {}
+        return self.samples
+
+def query_samples(servers, port=123, timeout=1, clock=clock_ms):
+    """
+    同时向多个NTP服务器发送请求，在timeout内收集响应（阻塞，asyncio任务中请使用query_samples_async）
+
+    参数:
+        servers: 服务器地址列表
+        port: NTP端口
+        timeout: 等待响应的总超时时间（秒），慢速服务器不会拖慢其他服务器
+        clock: 本地时钟函数（毫秒）
+
+    返回:
+        样本列表 [(server, offset_ms, delay_ms), ...]
+    """
+    q = _Query(port, timeout, clock)
+    for server in servers:
+        q.send(server)
+    q.start()
+    while True:
+        remaining = q.remaining()
+        if remaining <= 0:
+            break
+        q.handle(q.poller.poll(remaining))
+    return q.finish()
+
+async def query_samples_async(servers, port=123, timeout=1, clock=clock_ms):
+    """
+    query_samples()的协程版本：每个服务器的地址解析之间、等待响应期间都让出事件循环
+    （poll(0)检查响应，没有响应时等待POLL_INTERVAL_MS毫秒）
+
+    参数和返回值与 query_samples() 相同
+    """
+    q = _Query(port, timeout, clock)
+    for server in servers:
+        q.send(server)
+        await _sleep_ms(0)
+    q.start()
+    while True:
+        remaining = q.remaining()
+        if remaining <= 0:
+            break
+        events = q.poller.poll(0)
+        if events:
+            q.handle(events)
+        else:
+            await _sleep_ms(min(remaining, POLL_INTERVAL_MS))
+    return q.finish()
+
+def _median(values):
+    values = sorted(values)
+    n = len(values)
+    if n % 2:
+        return values[n // 2]
+    return (values[n // 2 - 1] + values[n // 2]) // 2
+
+def select_sample(samples):
+    """
+    从多个样本中选择最可信的一个：先剔除偏差异常的样本（与中位数的差超过
+    MAD的OUTLIER_MAD_FACTOR倍，且超过OUTLIER_MIN_MS），再选择往返延迟最小的样本
+    （延迟越小，路径不对称带来的误差上限越小）
+
+    返回:
+        (server, offset_ms, delay_ms)，没有样本时返回None
+    """
+    if not samples:
+        return None
+    if len(samples) >= 3:
+        median = _median([sample[1] for sample in samples])
+        mad = _median([abs(sample[1] - median) for sample in samples])
+        limit = max(OUTLIER_MAD_FACTOR * mad, OUTLIER_MIN_MS)
+        samples = [sample for sample in samples if abs(sample[1] - median) <= limit]
+    best = samples[0]
+    for sample in samples:
+        if sample[2] < best[2]:
+            best = sample
+    return best
+
+def _best(samples):
+    best = select_sample(samples)
+    if best is None:
+        raise OSError('没有可用的NTP服务器响应')
+    return best[1], best[2]
+
+@metrics.timed('ntp_query_us')
+def query(servers, port=123, timeout=1, clock=clock_ms):
+    """
+    查询多个NTP服务器并返回最佳样本（阻塞）
+
+    参数:
+        servers: 服务器地址列表（或单个地址字符串）
+        port: NTP端口
+        timeout: 等待响应的总超时时间（秒）
+        clock: 本地时钟函数（毫秒）
+
+    返回:
+        (offset_ms, delay_ms) 元组
+
+    异常:
+        OSError: 没有服务器返回有效响应
+    """
+    if isinstance(servers, str):
+        servers = [servers]
+    return _best(query_samples(servers, port, timeout, clock))
+
+@metrics.timed_async('ntp_query_us')
+async def query_async(servers, port=123, timeout=1, clock=clock_ms):
+    """
+    query()的协程版本，查询期间其他任务照常运行
+
+    参数、返回值和异常与 query() 相同
+    """
+    if isinstance(servers, str):
+        servers = [servers]
+    return _best(await query_samples_async(servers, port, timeout, clock))
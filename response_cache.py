@@ -0,0 +1,189 @@
+# response_cache.py
+# 按内容寻址的响应缓存：键为请求内容（如模型+消息）的哈希，
+# 内存中保存最近使用的条目（LRU，按字节数限制），可选再用闪存目录作为第二级缓存
+# 内存缓存的有效期用ticks_ms()计时，不受NTP校时引起的RTC跳变影响；闪存缓存需要跨重启有效，
+# 保存RTC校准后的过期时间，RTC未校准时（复位后从2000-01-01开始计时）不读写闪存缓存
+
+import os
+import time
+import binascii
+import logger
+
+try:
+    import hashlib
+except ImportError:
+    import uhashlib as hashlib
+
+_log = logger.get_logger('cache')
+
+# RTC年份早于此值表示尚未经NTP校准
+MIN_SYNCED_YEAR = 2024
+
+def cache_key(*parts):
+    """
+    计算缓存键
+
+    参数:
+        parts: 组成请求内容的字符串
+
+    返回:
+        SHA-256十六进制字符串
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8'))
+        h.update(b'\x00')
+    return str(binascii.hexlify(h.digest()), 'utf-8')
+
+class ResponseCache:
+    """
+    两级响应缓存
+
+    参数:
+        max_bytes: 内存缓存的字节上限（按UTF-8长度计），超出时淘汰最久未使用的条目
+        ttl: 条目有效期（秒）
+        directory: 闪存缓存目录，None表示只使用内存缓存
+        max_files: 闪存缓存的最大条目数
+        clock: 返回RTC时间（秒）的函数，用于闪存缓存的过期时间，默认time.time
+        synced: 返回RTC是否已经NTP校准的函数（如TimeService.synced），
+            None表示按clock()的年份判断；未校准时闪存中的条目视为过期，也不写入闪存
+        ticks_ms: 内存缓存计时使用的毫秒tick函数，默认time.ticks_ms
+    """
+    def __init__(self, max_bytes=4096, ttl=600, directory=None, max_files=32, clock=time.time,
+                 synced=None, ticks_ms=time.ticks_ms):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self.max_files = max_files
+        self.clock = clock
+        self.synced = synced or self._clock_synced
+        self.ticks_ms = ticks_ms
+        # key -> (value, 过期时的ticks_ms, 字节数)；ticks_diff()只能比较约6天以内的间隔，ttl不应超过
+        self._entries = {}
+        self._order = []     # 最久未使用的key在前
+        self.size = 0
+        self.hits = 0
+        self.flash_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory is not None:
+            try:
+                os.mkdir(directory)
+            except OSError:
+                pass  # 目录已存在
+
+    def get(self, key):
+        """
+        返回:
+            缓存的值，不存在或已过期时返回None
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.ticks_diff(entry[1], self.ticks_ms()) > 0:
+                self._order.remove(key)
+                self._order.append(key)
+                self.hits += 1
+                return entry[0]
+            self._drop(key)
+        if self.directory is not None and self.synced():
+            value, expires = self._read_file(key)
+            left = expires - int(self.clock())
+            if value is not None and left > 0:
+                self.flash_hits += 1
+                self._store(key, value, min(left, self.ttl) * 1000)
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """保存一个值（RTC已校准时同时写入闪存缓存）"""
+        self._store(key, value, self.ttl * 1000)
+        if self.directory is not None and self.synced():
+            self._write_file(key, value, int(self.clock()) + self.ttl)
+
+    def clear(self):
+        """清空内存缓存和闪存缓存"""
+        self._entries = {}
+        self._order = []
+        self.size = 0
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                os.remove(self._path(name))
+
+    def stats(self):
+        """
+        返回:
+            统计信息字典
+        """
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'flash_hits': self.flash_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _clock_synced(self):
+        return time.gmtime(int(self.clock()))[0] >= MIN_SYNCED_YEAR
+
+    def _store(self, key, value, ttl_ms):
+        if key in self._entries:
+            self._drop(key)
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        while self.size + size > self.max_bytes:
+            self._drop(self._order[0])
+            self.evictions += 1
+        self._entries[key] = (value, time.ticks_add(self.ticks_ms(), ttl_ms), size)
+        self._order.append(key)
+        self.size += size
+
+    def _drop(self, key):
+        self.size -= self._entries.pop(key)[2]
+        self._order.remove(key)
+
+    def _path(self, name):
+        return self.directory + '/' + name
+
+    def _read_file(self, key):
+        # 文件格式：第一行为"过期时间（RTC秒） 完整key"，其余为值；文件名为key的前16个字符
+        try:
+            with open(self._path(key[:16]), 'r') as f:
+                expires, stored_key = f.readline().split()
+                if stored_key != key:
+                    return None, 0
+                return f.read(), int(expires)
+        except (OSError, ValueError):
+            return None, 0
+
+    def _read_expires(self, name):
+        try:
+            with open(self._path(name), 'r') as f:
+                return int(f.readline().split()[0])
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def _write_file(self, key, value, expires):
+        try:
+            names = os.listdir(self.directory)
+            if len(names) >= self.max_files and key[:16] not in names:
+                self._evict_file(names)
+            with open(self._path(key[:16]), 'w') as f:
+                f.write('{} {}\n'.format(int(expires), key))
+                f.write(value)
+        except OSError as e:
+            _log.warning('写入缓存文件失败: {}', e)
+
+    def _evict_file(self, names):
+        # 删除最早过期的条目
+        oldest = None
+        oldest_expires = None
+        for name in names:
+            expires = self._read_expires(name)
+            if oldest is None or expires < oldest_expires:
+                oldest = name
+                oldest_expires = expires
+        if oldest is not None:
+            os.remove(self._path(oldest))
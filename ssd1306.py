@@ -2,6 +2,7 @@
 
 import time
 import framebuf
+import metrics
 
 # register definitions
 SET_CONTRAST        = const(0x81)
@@ -29,6 +30,15 @@ class SSD1306:
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
+        # Dirty column span per page, updated by the drawing methods so that
+        # show() only has to transmit what actually changed.  A page whose
+        # low bound is greater than its high bound is clean.
+        self.dirty_lo = bytearray(self.pages)
+        self.dirty_hi = bytearray(self.pages)
+        self.invalidate()
+        # Number of bytes written to the bus (commands + display data,
+        # including the I2C control bytes), counted by the transports.
+        self.bytes_sent = 0
         # Note the subclass must initialize self.framebuf to a framebuffer.
         # This is necessary because the underlying data buffer is different
         # between I2C and SPI implementations (I2C needs an extra byte).
@@ -72,32 +82,81 @@ class SSD1306:
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
-            # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_framebuf()
+    def invalidate(self, x=0, y=0, w=None, h=None):
+        # Mark a rectangle (default: the whole screen) as needing a refresh.
+        # Call this after drawing on self.framebuf directly.
+        if w is None:
+            w = self.width - x
+        if h is None:
+            h = self.height - y
+        x0 = max(x, 0)
+        x1 = min(x + w, self.width) - 1
+        y0 = max(y, 0)
+        y1 = min(y + h, self.height) - 1
+        if x0 > x1 or y0 > y1:
+            return
+        lo = self.dirty_lo
+        hi = self.dirty_hi
+        for page in range(y0 >> 3, (y1 >> 3) + 1):
+            if x0 < lo[page]:
+                lo[page] = x0
+            if x1 > hi[page]:
+                hi[page] = x1
+
+    @metrics.timed('oled_show_us')
+    def show(self, full=False):
+        # Only the dirty column span of each dirty page is sent, each inside
+        # its own SET_COL_ADDR/SET_PAGE_ADDR window.  Runs of fully dirty
+        # pages are contiguous in the buffer and go out as one window, so a
+        # full refresh is still a single transfer.
+        if full:
+            self.invalidate()
+        lo = self.dirty_lo
+        hi = self.dirty_hi
+        width = self.width
+        # displays with width of 64 pixels are shifted by 32
+        offset = 32 if width == 64 else 0
+        page = 0
+        while page < self.pages:
+            x0 = lo[page]
+            x1 = hi[page]
+            if x0 > x1:
+                page += 1
+                continue
+            end = page
+            if x0 == 0 and x1 == width - 1:
+                while (end + 1 < self.pages and lo[end + 1] == 0
+                       and hi[end + 1] == width - 1):
+                    end += 1
+            self.write_cmd(SET_COL_ADDR)
+            self.write_cmd(x0 + offset)
+            self.write_cmd(x1 + offset)
+            self.write_cmd(SET_PAGE_ADDR)
+            self.write_cmd(page)
+            self.write_cmd(end)
+            start = page * width + x0
+            stop = end * width + x1 + 1
+            self.write_data(start, stop)
+            while page <= end:
+                lo[page] = 0xff
+                hi[page] = 0
+                page += 1
 
     def fill(self, col):
         self.framebuf.fill(col)
+        self.invalidate()
 
     def pixel(self, x, y, col):
         self.framebuf.pixel(x, y, col)
+        self.invalidate(x, y, 1, 1)
 
     def scroll(self, dx, dy):
         self.framebuf.scroll(dx, dy)
+        self.invalidate()
 
     def text(self, string, x, y, col=1):
         self.framebuf.text(string, x, y, col)
+        self.invalidate(x, y, 8 * len(string), 8)
 
 
 class SSD1306_I2C(SSD1306):
@@ -112,18 +171,32 @@ class SSD1306_I2C(SSD1306):
         # buffer).
         self.buffer = bytearray(((height // 8) * width) + 1)
         self.buffer[0] = 0x40  # Set first byte of data buffer to Co=0, D/C=1
-        self.framebuf = framebuf.FrameBuffer1(memoryview(self.buffer)[1:], width, height)
+        self.bufmv = memoryview(self.buffer)
+        self.data_prefix = b'\x40'
+        self.framebuf = framebuf.FrameBuffer1(self.bufmv[1:], width, height)
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80 # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
+        self.bytes_sent += 2
 
     def write_framebuf(self):
         # Blast out the frame buffer using a single I2C transaction to support
         # hardware I2C interfaces.
         self.i2c.writeto(self.addr, self.buffer)
+        self.bytes_sent += len(self.buffer)
+
+    def write_data(self, start, stop):
+        # start/stop are framebuffer offsets; the buffer is shifted by the
+        # control byte.  Partial spans are sent as a vectored write so the
+        # control byte can be prepended without copying the data.
+        if start == 0 and stop == len(self.buffer) - 1:
+            self.write_framebuf()
+        else:
+            self.i2c.writevto(self.addr, (self.data_prefix, self.bufmv[start + 1:stop + 1]))
+            self.bytes_sent += 1 + stop - start
 
     def poweron(self):
         pass
@@ -140,6 +213,7 @@ class SSD1306_SPI(SSD1306):
         self.res = res
         self.cs = cs
         self.buffer = bytearray((height // 8) * width)
+        self.bufmv = memoryview(self.buffer)
         self.framebuf = framebuf.FrameBuffer1(self.buffer, width, height)
         super().__init__(width, height, external_vcc)
 
@@ -150,6 +224,7 @@ class SSD1306_SPI(SSD1306):
         self.cs.low()
         self.spi.write(bytearray([cmd]))
         self.cs.high()
+        self.bytes_sent += 1
 
     def write_framebuf(self):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
@@ -158,6 +233,16 @@ class SSD1306_SPI(SSD1306):
         self.cs.low()
         self.spi.write(self.buffer)
         self.cs.high()
+        self.bytes_sent += len(self.buffer)
+
+    def write_data(self, start, stop):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs.high()
+        self.dc.high()
+        self.cs.low()
+        self.spi.write(self.bufmv[start:stop])
+        self.cs.high()
+        self.bytes_sent += stop - start
 
     def poweron(self):
         self.res.high()
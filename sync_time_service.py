@@ -1,42 +1,332 @@
 import time
-from ntptime import settime
+import ntp_client
+import metrics
+import logger
+from ntp_client import clock_ms
+
+# 两次同步间隔小于此值（毫秒）时不更新漂移率估计，避免测量误差被放大
+MIN_DRIFT_INTERVAL_MS = 600000
+
+_log = logger.get_logger('time')
+
+_offset_gauge = metrics.gauge('ntp_offset_ms')
+_delay_gauge = metrics.gauge('ntp_delay_ms')
+_sync_failures = metrics.counter('ntp_sync_failures')
+
+# 漂移率估计保存在键值存储中的键（重启后不必再等两次同步才开始补偿）
+DRIFT_KEY = 'ntp_drift'
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# TimeFormatter每隔多少秒重新计算一次漂移校正量（计算使用毫秒，ESP32上会分配大整数）
+CORRECTION_REFRESH_S = 60
+
+def clock_s():
+    """
+    获取RTC当前时间（本地纪元起的秒数，整数）
+    ESP32上time.time()返回小整数，读取时不分配内存
+    """
+    return int(time.time())
+
+def set_rtc_ms(timestamp_ms):
+    """
+    设置RTC时间
+
+    参数:
+        timestamp_ms: UTC时间（本地纪元起的毫秒数）
+    """
+    import machine
+    tm = time.gmtime(timestamp_ms // 1000)
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5],
+                            (timestamp_ms % 1000) * 1000))
+
+class TimeService:
+    """
+    时间校准服务：定期从NTP同步RTC，并在两次同步之间补偿RTC漂移
+
+    每次同步测量本地时钟相对NTP的偏差；根据两次同步之间累计的偏差估算RTC漂移率（ppm），
+    get_local_time_str()等读取时间的方法按漂移率对RTC读数做线性校正（不修改RTC）
+
+    参数:
+        wlan: wlan对象，用于检查网络连接（None表示不检查）
+        timezone_offset: 时区偏移（小时）
+        servers: NTP服务器地址列表（同时查询，选择最佳样本），也可以是单个地址
+        port: NTP服务器端口
+        resync_interval: 定期重新同步的间隔（秒）
+        clock: 本地时钟函数（毫秒），测试时可替换为模拟时钟
+        set_clock: 设置本地时钟的函数（毫秒）
+        query: NTP查询函数，签名同ntp_client.query（sync()使用）
+        query_async: NTP查询协程函数，签名同ntp_client.query_async（sync_async()使用）
+        store: 保存漂移率估计的kvstore.KVStore（None表示不保存）
+    """
+    def __init__(self, wlan=None, timezone_offset=8, servers=('pool.ntp.org',), port=123,
+                 resync_interval=3600, clock=clock_ms, set_clock=set_rtc_ms, query=ntp_client.query,
+                 store=None, query_async=ntp_client.query_async):
+        self.wlan = wlan
+        self.timezone_offset = timezone_offset
+        self.servers = servers
+        self.port = port
+        self.resync_interval = resync_interval
+        self.clock = clock
+        self.set_clock = set_clock
+        self.query = query
+        self.query_async = query_async
+        self.last_sync_ms = None   # 上次同步后的时间（已校准）
+        self.last_offset_ms = None # 上次同步测得的偏差
+        self.last_delay_ms = None  # 上次同步的网络往返延迟
+        self.drift_ppm = 0         # RTC漂移率估计（百万分之一，正数表示RTC偏慢）
+        self.drift_estimates = 0   # 已有的漂移率估计次数（包括上次运行保存的）
+        self.sync_count = 0
+        self.fail_count = 0
+        self.store = store
+        if store is not None:
+            try:
+                saved = store.get_json(DRIFT_KEY)
+                if saved is not None:
+                    self.drift_ppm = saved['drift_ppm']
+                    self.drift_estimates = 1
+            except Exception as e:
+                _log.warning('加载RTC漂移率时出错: {}', e)
+
+    def synced(self):
+        """是否已至少同步过一次"""
+        return self.last_sync_ms is not None
+
+    def due(self):
+        """是否到了需要重新同步的时间"""
+        if self.last_sync_ms is None:
+            return True
+        return self.clock() - self.last_sync_ms >= self.resync_interval * 1000
+
+    def sync(self):
+        """
+        从NTP同步一次时间（阻塞直到查询完成，asyncio任务中请使用sync_async()）
+
+        返回:
+            True如果同步成功，否则False
+        """
+        if not self._connected():
+            return False
+        try:
+            offset, delay = self.query(self.servers, self.port, clock=self.clock)
+        except Exception as e:
+            self._failed(e)
+            return False
+        self._apply(offset, delay)
+        return True
+
+    async def sync_async(self):
+        """
+        sync()的协程版本：等待NTP响应期间其他任务（时间输出、串口命令等）照常运行
+
+        返回:
+            True如果同步成功，否则False
+        """
+        if not self._connected():
+            return False
+        try:
+            offset, delay = await self.query_async(self.servers, self.port, clock=self.clock)
+        except Exception as e:
+            self._failed(e)
+            return False
+        self._apply(offset, delay)
+        return True
+
+    def _connected(self):
+        # 检查网络连接
+        if self.wlan is not None and not self.wlan.isconnected():
+            _log.warning('时间服务：网络未连接，无法同步时间')
+            return False
+        return True
+
+    def _failed(self, e):
+        self.fail_count += 1
+        _sync_failures.inc()
+        _log.warning('NTP时间同步失败: {}', e)
+
+    def _apply(self, offset, delay):
+        # 根据一次查询的结果校准RTC并更新漂移率估计
+        now = self.clock()
+        if self.last_sync_ms is not None:
+            # 上次同步后RTC自由运行，本次偏差即为这段时间累计的漂移
+            elapsed = now - self.last_sync_ms
+            if elapsed >= MIN_DRIFT_INTERVAL_MS:
+                drift = offset * 1000000 // elapsed
+                if self.drift_estimates:
+                    # 平滑估计，降低单次测量误差的影响
+                    drift = (self.drift_ppm * 3 + drift) // 4
+                self.drift_estimates += 1
+                if drift != self.drift_ppm:
+                    self.drift_ppm = drift
+                    self._save_drift()
+        self.set_clock(now + offset)
+        self.last_sync_ms = now + offset
+        self.last_offset_ms = offset
+        self.last_delay_ms = delay
+        self.sync_count += 1
+        _offset_gauge.set(offset)
+        _delay_gauge.set(delay)
+        _log.info('NTP时间同步成功! 偏差: {}ms, 往返延迟: {}ms, 漂移: {}ppm',
+                  offset, delay, self.drift_ppm)
+
+    def _save_drift(self):
+        if self.store is None:
+            return
+        try:
+            self.store.put_json(DRIFT_KEY, {'drift_ppm': self.drift_ppm})
+        except Exception as e:
+            _log.warning('保存RTC漂移率时出错: {}', e)
+
+    def correction_ms(self, now=None):
+        """
+        返回:
+            当前RTC读数需要加上的漂移校正量（毫秒）
+        """
+        if self.last_sync_ms is None or not self.drift_ppm:
+            return 0
+        if now is None:
+            now = self.clock()
+        return (now - self.last_sync_ms) * self.drift_ppm // 1000000
+
+    def now_ms(self):
+        """
+        返回:
+            经过漂移校正的UTC时间（本地纪元起的毫秒数）
+        """
+        now = self.clock()
+        return now + self.correction_ms(now)
+
+    def get_local_time_str(self):
+        """获取本地时间字符串（考虑时区偏移和漂移校正）"""
+        local_time = time.gmtime(self.now_ms() // 1000 + self.timezone_offset * 3600)
+        year, month, day, hour, minute, second, weekday = local_time[:7]
+        return '{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d} {}'.format(
+            year, month, day, hour, minute, second, WEEKDAYS[weekday])
+
+    def metrics(self):
+        """
+        返回:
+            同步状态指标字典
+        """
+        return {
+            'synced': self.synced(),
+            'sync_count': self.sync_count,
+            'fail_count': self.fail_count,
+            'last_offset_ms': self.last_offset_ms,
+            'last_delay_ms': self.last_delay_ms,
+            'drift_ppm': self.drift_ppm,
+            'correction_ms': self.correction_ms(),
+        }
+
+def _put_digits(buf, pos, value, width):
+    # 把value按width位十进制（不足补0）写入buf[pos:pos + width]，不分配内存
+    pos += width
+    while width:
+        pos -= 1
+        width -= 1
+        buf[pos] = 48 + value % 10
+        value //= 10
+
+class TimeFormatter:
+    """
+    无内存分配的本地时间格式化器：把"<前缀>YYYY-MM-DD HH:MM:SS[.mmm] Www\\r\\n"写入预分配的bytearray
+
+    每次调用只更新时、分、秒（和毫秒）字段；日期和星期只在日期变化时重新计算，
+    漂移校正量每CORRECTION_REFRESH_S秒或重新同步后刷新一次，因此write_time()每秒输出不分配堆内存
+
+    参数:
+        service: TimeService对象（提供时区偏移和漂移校正）
+        prefix: 输出前缀（bytes）
+        clock: 本地时钟函数（秒，整数）
+        millis: 是否输出毫秒字段
+    """
+    def __init__(self, service, prefix='本地时间: '.encode('utf-8'), clock=clock_s, millis=False):
+        self.service = service
+        self.clock = clock
+        self.millis = millis
+        self.buf = bytearray(prefix + b'0000-00-00 00:00:00' + (b'.000' if millis else b'') + b' Mon\r\n')
+        self.view = memoryview(self.buf)
+        self._date_pos = len(prefix)
+        self._time_pos = self._date_pos + 11
+        self._weekday_pos = self._time_pos + (13 if millis else 9)
+        self._day = -1
+        self._refresh_at = 0
+        self._sync_count = -1
+        self._correction_s = 0
+
+    def _refresh_correction(self, now):
+        # 漂移校正量（四舍五入到秒）
+        service = self.service
+        self._correction_s = (service.correction_ms() + 500) // 1000
+        self._sync_count = service.sync_count
+        self._refresh_at = now + CORRECTION_REFRESH_S
+
+    def _set_date(self, local_s):
+        year, month, day, hour, minute, second, weekday = time.gmtime(local_s)[:7]
+        buf = self.buf
+        pos = self._date_pos
+        _put_digits(buf, pos, year, 4)
+        _put_digits(buf, pos + 5, month, 2)
+        _put_digits(buf, pos + 8, day, 2)
+        pos = self._weekday_pos
+        buf[pos:pos + 3] = WEEKDAYS[weekday].encode()
+
+    def set_time(self, utc_s, ms=0):
+        """
+        把指定时间写入缓冲区（只加时区偏移，不做漂移校正）
+
+        参数:
+            utc_s: UTC时间（本地纪元起的秒数）
+            ms: 毫秒（millis为True时输出）
+
+        返回:
+            缓冲区的memoryview（内容为完整的一行输出）
+        """
+        local_s = utc_s + self.service.timezone_offset * 3600
+        day = local_s // 86400
+        if day != self._day:
+            self._set_date(local_s)
+            self._day = day
+        seconds = local_s - day * 86400
+        buf = self.buf
+        pos = self._time_pos
+        _put_digits(buf, pos, seconds // 3600, 2)
+        _put_digits(buf, pos + 3, seconds // 60 % 60, 2)
+        _put_digits(buf, pos + 6, seconds % 60, 2)
+        if self.millis:
+            _put_digits(buf, pos + 9, ms, 3)
+        return self.view
+
+    def update(self):
+        """
+        按当前时间（经过漂移校正）更新缓冲区
+
+        返回:
+            缓冲区的memoryview（内容为完整的一行输出）
+        """
+        now = self.clock()
+        if now >= self._refresh_at or self.service.sync_count != self._sync_count:
+            self._refresh_correction(now)
+        return self.set_time(now + self._correction_s)
+
+    def write_time(self, uart):
+        """更新并通过uart输出一行时间（不分配堆内存）"""
+        self.update()
+        uart.write(self.buf)
 
 def sync_time_service(wlan, timezone_offset=8):
     """
     时间校准服务：负责从NTP同步时间，并提供本地时间获取和格式化
-    
+
     参数:
         wlan: wlan对象，用于检查网络连接
         timezone_offset: 时区偏移（小时），默认UTC+8
-    
+
     返回:
         如果同步成功，返回一个函数get_local_time_str()，用于获取格式化后的本地时间字符串
         否则返回None
     """
-    # 检查网络连接
-    if wlan is None or not wlan.isconnected():
-        print('时间服务：网络未连接，无法同步时间')
-        return None
-    
-    try:
-        settime()  # 设置UTC时间
-        print('NTP时间同步成功!')
-    except Exception as e:
-        print('NTP时间同步失败: {}'.format(e))
+    service = TimeService(wlan, timezone_offset)
+    if not service.sync():
         return None
-    
-    def get_local_time_str():
-        """获取本地时间字符串（考虑时区偏移）"""
-        # 获取UTC时间戳
-        utc_timestamp = time.time()
-        # 加上时区偏移（小时转换为秒）
-        local_timestamp = utc_timestamp + (timezone_offset * 3600)
-        # 转换为本地时间元组
-        local_time = time.localtime(local_timestamp)
-        # 格式化时间
-        year, month, day, hour, minute, second, weekday, yearday = local_time
-        weekdays = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        return '{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d} {}'.format(
-            year, month, day, hour, minute, second, weekdays[weekday])
-    
-    return get_local_time_str
+    return service.get_local_time_str
@@ -0,0 +1,15 @@
+# conftest.py
+# pytest配置：在PC上运行测试时把项目根目录加入导入路径，并安装host_stubs中的硬件桩模块
+#
+# 用法（在项目根目录）：
+#     python -m pytest -q
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import host_stubs
+host_stubs.install()
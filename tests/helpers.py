@@ -0,0 +1,87 @@
+# helpers.py
+# 测试共用的本地服务器
+
+import http.server
+import threading
+
+
+def start_http_server(handler=None, port=0):
+    """
+    启动本地HTTP/1.1测试服务器（支持keep-alive）
+
+    参数:
+        handler: 请求处理类，None表示GET返回{"ok": true}、POST原样返回请求体
+        port: 端口，0表示自动分配（server.server_port）
+
+    返回:
+        server对象（测试结束时调用shutdown()）
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), handler or EchoHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class EchoHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_ntp_server(skew=0.0, delay=0.0, host='127.0.0.1', port=0):
+    """
+    启动本地UDP NTP测试服务器
+
+    参数:
+        skew: 服务器时钟偏差（秒）
+        delay: 处理每个请求的延迟（秒）
+        host: 监听地址（127.0.0.x可以在同一端口启动多个服务器）
+        port: 端口，0表示自动分配
+
+    返回:
+        (socket, port)，测试结束时关闭socket
+    """
+    import socket
+    import struct
+    import time
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+
+    def timestamp(t):
+        t += 2208988800
+        seconds = int(t)
+        return struct.pack('!II', seconds, int((t - seconds) * 2 ** 32))
+
+    def serve():
+        while True:
+            try:
+                data, addr = sock.recvfrom(48)
+                t2 = time.time() + skew
+                time.sleep(delay)
+                t3 = time.time() + skew
+                # LI=0, VN=4, Mode=4（服务器），stratum=2，originate为请求的发送时间戳
+                packet = bytes((0x24, 2, 0, 0)) + bytes(20) + data[40:48] + timestamp(t2) + timestamp(t3)
+                sock.sendto(packet, addr)
+            except OSError:
+                return
+
+    threading.Thread(target=serve, daemon=True).start()
+    return sock, sock.getsockname()[1]
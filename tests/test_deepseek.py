@@ -0,0 +1,286 @@
+# test_deepseek.py
+# deepseek_api：用本地SSE服务器代替DeepSeek，检查流式回复的解析
+
+import asyncio
+import http.server
+import json
+import time
+
+import pytest
+
+import deepseek_api
+from helpers import start_http_server
+
+
+def _delta(text):
+    return json.dumps({'choices': [{'delta': {'content': text}}]}, ensure_ascii=False)
+
+
+# 服务器发送的事件流：注释行、单行和多行data、没有文本的分片、[DONE]
+EVENTS = (
+    ': keep-alive\n\n'
+    'data: ' + json.dumps({'choices': [{'delta': {'role': 'assistant'}}]}) + '\n\n'
+    'data: ' + _delta('你好') + '\n\n'
+    ': keep-alive\n\n'
+    'data: {"choices": [\n'
+    'data: {"delta": {"content": "，世界"}}]}\n\n'
+    'data: ' + _delta('!\nOK') + '\r\n\r\n'
+    'data: [DONE]\n\n'
+).encode('utf-8')
+
+
+class SSEHandler(http.server.BaseHTTPRequestHandler):
+    """模拟流式chat completion：用chunked编码分成chunk_size字节的小块发送（块边界落在行和UTF-8字符中间）"""
+    protocol_version = 'HTTP/1.1'
+    chunk_size = 7
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append((dict(self.headers), body))
+        if not body.get('stream'):
+            data = json.dumps({'choices': [{'message': {'content': '完整回复'}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i in range(0, len(EVENTS), self.chunk_size):
+            chunk = EVENTS[i:i + self.chunk_size]
+            self.wfile.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+
+@pytest.fixture
+def sse_server(monkeypatch):
+    SSEHandler.requests = []
+    server = start_http_server(SSEHandler)
+    monkeypatch.setattr(deepseek_api, 'DEEPSEEK_API_URL',
+                        'http://127.0.0.1:{}/v1/chat/completions'.format(server.server_port))
+    monkeypatch.setattr(deepseek_api, '_session', None)
+    monkeypatch.setattr(deepseek_api, 'response_cache', None)
+    yield server
+    if deepseek_api._session is not None:
+        deepseek_api._session.close()
+    server.shutdown()
+
+
+def test_parse_sse_event():
+    assert deepseek_api.parse_sse_event('[DONE]') is None
+    assert deepseek_api.parse_sse_event(_delta('hi')) == 'hi'
+    assert deepseek_api.parse_sse_event('{"choices": []}') == ''
+    assert deepseek_api.parse_sse_event('{"choices": [{"delta": {"role": "assistant"}}]}') == ''
+
+
+def test_chat_stream(sse_server):
+    tokens = []
+    stats = {}
+    ok, text = deepseek_api.chat([{'role': 'user', 'content': 'hi'}], tokens.append, stats)
+    assert ok
+    assert tokens == ['你好', '，世界', '!\nOK']
+    assert text == '你好，世界!\nOK'
+    assert stats['first_token_ms'] is not None
+    assert stats['bytes_received'] >= len(EVENTS) - EVENTS.count(b'\r')
+    headers, body = SSEHandler.requests[0]
+    assert body['stream'] is True and headers['Accept'] == 'text/event-stream'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64, 4096])
+def test_chat_stream_chunk_boundaries(sse_server, monkeypatch, chunk_size):
+    monkeypatch.setattr(SSEHandler, 'chunk_size', chunk_size)
+    tokens = []
+    ok, text = deepseek_api.chat([{'role': 'user', 'content': 'hi'}], tokens.append)
+    assert (ok, text) == (True, '你好，世界!\nOK')
+    assert len(tokens) == 3
+
+
+def test_stream_reuses_connection(sse_server):
+    # [DONE]之后读到chunked响应结束，连接可以复用
+    for _ in range(3):
+        assert deepseek_api.chat([{'role': 'user', 'content': 'hi'}], lambda text: None)[0]
+    assert deepseek_api._session.connections_opened == 1
+    assert deepseek_api._session.connections_reused == 2
+
+
+def test_chat_without_stream(sse_server):
+    assert deepseek_api.chat([{'role': 'user', 'content': 'hi'}]) == (True, '完整回复')
+
+
+class BadEventHandler(SSEHandler):
+    """第二个事件不是有效的JSON"""
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        data = ('data: ' + _delta('a') + '\n\ndata: {bad\n\ndata: [DONE]\n\n').encode()
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n0\r\n\r\n')
+
+
+def test_chat_closes_response_on_error(sse_server, monkeypatch):
+    # 解析事件出错时关闭响应（未读完的连接不归还连接池）
+    server = start_http_server(BadEventHandler)
+    monkeypatch.setattr(deepseek_api, 'DEEPSEEK_API_URL',
+                        'http://127.0.0.1:{}/v1/chat/completions'.format(server.server_port))
+    session = deepseek_api._get_session()
+    responses = []
+    post = session.post
+
+    def recording_post(url, **kw):
+        responses.append(post(url, **kw))
+        return responses[-1]
+
+    monkeypatch.setattr(session, 'post', recording_post)
+    try:
+        ok, text = deepseek_api.chat([{'role': 'user', 'content': 'hi'}], lambda text: None)
+    finally:
+        server.shutdown()
+    assert not ok and text.startswith('[请求异常]')
+    assert responses[0].raw is None
+    assert not any(session._pool.values())
+
+
+class FakeDisplay:
+    """记录oled_sink的绘制调用（width/height与128x64屏幕相同）"""
+    width = 128
+    height = 64
+
+    def __init__(self):
+        self.calls = []
+        display = self
+
+        class FrameBuffer:
+            def fill_rect(self, *args):
+                display.calls.append(('fill_rect',) + args)
+        self.framebuf = FrameBuffer()
+
+    def text(self, string, x, y):
+        self.calls.append(('text', string, x, y))
+
+    def scroll(self, dx, dy):
+        self.calls.append(('scroll', dx, dy))
+
+    def show(self):
+        self.calls.append(('show',))
+
+
+def test_oled_sink_wraps_and_scrolls():
+    display = FakeDisplay()
+    on_token = deepseek_api.oled_sink(display)
+    on_token('a' * 17)      # 一行16个字符，第17个换到新行
+    on_token('é\nb')
+    texts = [call for call in display.calls if call[0] == 'text']
+    assert texts[15] == ('text', 'a', 120, 56)
+    assert texts[16] == ('text', 'a', 0, 56)
+    assert texts[17] == ('text', '?', 8, 56)     # 内置字体只有ASCII
+    assert texts[18] == ('text', 'b', 0, 56)
+    assert [call for call in display.calls if call[0] == 'scroll'] == [('scroll', 0, -8)] * 2
+    assert display.calls.count(('show',)) == 2
+
+
+def test_chat_async_stream(sse_server):
+    tokens = []
+
+    async def main():
+        try:
+            return await deepseek_api.chat_async([{'role': 'user', 'content': 'hi'}], tokens.append)
+        finally:
+            deepseek_api._session.close()   # 空闲连接属于这个事件循环
+
+    ok, text = asyncio.run(main())
+    assert (ok, text) == (True, '你好，世界!\nOK')
+    assert tokens == ['你好', '，世界', '!\nOK']
+
+
+class SlowSSEHandler(SSEHandler):
+    """每个事件之间等待delay秒（模拟逐字生成的回复）"""
+    delay = 0.05
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i in range(10):
+            time.sleep(self.delay)
+            chunk = ('data: ' + _delta(str(i)) + '\n\n').encode()
+            self.wfile.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def test_client_does_not_block_event_loop(sse_server, monkeypatch):
+    # 请求进行中（约0.5秒），其他任务的10ms定时仍按时运行
+    server = start_http_server(SlowSSEHandler)
+    monkeypatch.setattr(deepseek_api, 'DEEPSEEK_API_URL',
+                        'http://127.0.0.1:{}/v1/chat/completions'.format(server.server_port))
+    client = deepseek_api.DeepSeekClient()
+    results = []
+    gaps = []
+
+    async def ticker(done):
+        last = time.monotonic()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    async def main():
+        done = asyncio.Event()
+        task = asyncio.create_task(client.run())
+        tick = asyncio.create_task(ticker(done))
+        client.submit('count', lambda ok, text: (results.append((ok, text)), done.set()),
+                      lambda text: None)
+        await asyncio.wait_for(done.wait(), 5)
+        await tick
+        task.cancel()
+        deepseek_api._session.close()
+
+    try:
+        asyncio.run(main())
+    finally:
+        server.shutdown()
+    assert results == [(True, '0123456789')]
+    assert len(gaps) > 20
+    assert max(gaps) < 0.05
+
+
+def test_client_timeout_on_stalled_server(monkeypatch):
+    import socket
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    monkeypatch.setattr(deepseek_api, 'DEEPSEEK_API_URL',
+                        'http://127.0.0.1:{}/v1/chat/completions'.format(server.getsockname()[1]))
+    monkeypatch.setattr(deepseek_api, 'DEEPSEEK_TIMEOUT', 0.2)
+    monkeypatch.setattr(deepseek_api, '_session', None)
+    monkeypatch.setattr(deepseek_api, 'response_cache', None)
+    try:
+        ok, text = asyncio.run(deepseek_api.chat_async([{'role': 'user', 'content': 'hi'}]))
+    finally:
+        server.close()
+    assert not ok and text.startswith('[请求异常]')
+
+
+def test_history_evicts_whole_turns():
+    client = deepseek_api.DeepSeekClient(history_bytes=20)
+    client._remember('q1', 'a' * 8)          # 10字节
+    client._remember('q2', 'b' * 8)          # 20字节，未超过上限
+    assert [role for role, content, size in client.history] == ['user', 'assistant'] * 2
+    client._remember('q3', 'c' * 8)          # 淘汰第一轮
+    assert [content for role, content, size in client.history] == ['q2', 'b' * 8, 'q3', 'c' * 8]
+    client._remember('q' * 30, 'd')          # 超过上限的一轮：全部淘汰，不留下没有问题的回复
+    assert client.history == [] and client.history_size == 0
+    client._remember('q5', 'e')
+    assert client.history[0][0] == 'user'
+    assert client.history_size == sum(size for role, content, size in client.history)
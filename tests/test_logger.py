@@ -0,0 +1,109 @@
+# test_logger.py
+# logger：限流、环形缓冲区、参数的保存方式，以及批量写入和日志文件轮换
+
+import os
+
+import pytest
+
+import logger
+
+
+@pytest.fixture
+def log(monkeypatch):
+    # 每个测试使用新的缓冲区和限流状态，不打印到控制台，结束后恢复默认配置
+    monkeypatch.setattr(logger, '_rates', {})
+    monkeypatch.setattr(logger, '_pending', [])
+    logger.configure(level=logger.INFO, console_level=logger.ERROR + 1, buffer_size=64)
+    yield logger.get_logger('test')
+    logger.configure(level=logger.INFO, console_level=logger.INFO, buffer_size=64, file='')
+
+
+def test_rate_limit(log):
+    stats = logger.stats()
+    for i in range(100):
+        log.warning('限流测试 {}', i)
+    assert logger.stats()['records'] - stats['records'] == logger.RATE_LIMIT
+    assert logger.stats()['suppressed'] - stats['suppressed'] == 100 - logger.RATE_LIMIT
+    lines = logger.recent()
+    assert lines[-1].endswith('限流测试 {}'.format(logger.RATE_LIMIT - 1))
+
+
+def test_ring_buffer_keeps_latest(log, monkeypatch):
+    monkeypatch.setattr(logger, 'RATE_LIMIT', 1000)
+    for i in range(100):
+        log.info('记录 {}', i)
+    log.debug('低于级别 {}', 0)
+    lines = logger.recent()
+    assert len(lines) == 64
+    assert lines[0].endswith('记录 36') and lines[-1].endswith('记录 99')
+    assert [line[-2:] for line in logger.recent(3)] == ['97', '98', '99']
+    assert logger.recent(0) == []
+
+
+def test_buffer_stores_plain_args(log):
+    class Big:
+        def __str__(self):
+            return 'big'
+
+    try:
+        raise OSError(110, 'ETIMEDOUT')
+    except OSError as e:
+        error = e
+    log.warning('出错: {} {} {} {:.1f} {}', error, Big(), 3, 2.5, None)
+    record = logger._buffer[(logger._next - 1) % len(logger._buffer)]
+    # 异常等对象转换为字符串保存，缓冲区不引用异常对象（及其栈帧）
+    assert record[4] == (str(error), 'big', 3, 2.5, None)
+    assert logger.recent(1)[0].endswith('出错: {} big 3 2.5 None'.format(error))
+
+
+def test_batched_file_writes_and_rotation(log, tmp_path, monkeypatch):
+    # 每file_batch条打开一次文件，ERROR立即写入，超过大小后改名为.1
+    path = str(tmp_path / 'app.log')
+    logger.configure(file=path, file_level=logger.INFO, file_batch=16, file_max_bytes=2048)
+    opens = []
+    real_open = open
+
+    def counting_open(*args, **kwargs):
+        opens.append(args[0])
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(logger, 'open', counting_open, raising=False)
+    for i in range(160):
+        logger._rates.clear()   # 这里不测试限流
+        if i % 50:
+            log.info('写入测试 {}', i)
+        else:
+            log.error('写入错误 {}', i)
+    logger.flush()
+    assert len(opens) < 20
+    with real_open(path) as f:
+        tail = f.read().splitlines()
+    with real_open(path + '.1') as f:
+        head = f.read().splitlines()
+    assert tail[-1].endswith('写入测试 159') and len(head) + len(tail) <= 160
+    assert os.path.getsize(path + '.1') >= 2048
+
+
+def test_rotation_replaces_old_file(log, tmp_path, monkeypatch):
+    # FAT文件系统上改名的目标已存在时失败：轮换前必须先删除旧的.1
+    path = str(tmp_path / 'app.log')
+    real_rename = os.rename
+
+    def fat_rename(src, dst):
+        if os.path.exists(dst):
+            raise OSError(17, 'EEXIST')
+        real_rename(src, dst)
+
+    monkeypatch.setattr(logger.os, 'rename', fat_rename)
+    logger.configure(file=path, file_level=logger.INFO, file_batch=1, file_max_bytes=64)
+    for i in range(20):
+        logger._rates.clear()
+        log.info('轮换测试 {}', i)
+    with open(path + '.1') as f:
+        head = f.read().splitlines()
+    with open(path) as f:
+        tail = f.read().splitlines()
+    # 两个文件中是最近的连续记录，没有因为改名失败而丢失
+    numbers = [int(line.rsplit(' ', 1)[1]) for line in head + tail]
+    assert numbers == list(range(20 - len(numbers), 20)) and len(head) > 0
+    assert os.path.getsize(path) < 2 * 64
@@ -0,0 +1,154 @@
+# test_main.py
+# main：ASK命令（DeepSeek请求）和WiFi重连（扫描）进行期间，UART时间输出照常进行
+
+import asyncio
+import http.server
+import importlib
+import json
+import time
+
+import pytest
+
+import deepseek_api
+import kvstore
+import machine
+import network
+import sync_time_service
+import tick_scheduler
+import uart_command_service
+import wifi_config_service
+import wifi_service
+from helpers import start_http_server
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    # 在临时目录中导入main（导入config时会读取和迁移当前目录下的配置文件）
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(kvstore, '_default_store', None)
+    return importlib.import_module('main')
+
+
+class SlowReplyHandler(http.server.BaseHTTPRequestHandler):
+    """非流式chat completion：回复分10次发送，每次间隔0.05秒"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        data = json.dumps({'choices': [{'message': {'content': '0123456789'}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        step = len(data) // 10 + 1
+        for i in range(0, len(data), step):
+            time.sleep(0.05)
+            self.wfile.write(data[i:i + step])
+            self.wfile.flush()
+
+
+class _UART(machine.UART):
+    """记录每次写入时刻的模拟UART"""
+    def __init__(self):
+        super().__init__(1)
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append((time.monotonic(), bytes(data)))
+        return super().write(data)
+
+
+def _time_state(main, wlan):
+    # 每20ms输出一次时间（不需要NTP同步）
+    state = main.AppState(wlan)
+    service = state.time_service
+    state.time_getter = service.get_local_time_str
+    state.time_formatter = sync_time_service.TimeFormatter(service, millis=True)
+    state.time_scheduler = tick_scheduler.TickScheduler(service, 50)
+    return state
+
+
+def _time_stamps(uart, start):
+    return [t for t, data in uart.writes if data.startswith('本地时间'.encode('utf-8')) and t >= start]
+
+
+def test_ask_does_not_stall_time_output(main, monkeypatch, capsys):
+    # 服务器约0.5秒后才发完回复：期间每20ms一次的时间输出不中断
+    server = start_http_server(SlowReplyHandler)
+    monkeypatch.setattr(deepseek_api, 'DEEPSEEK_API_URL',
+                        'http://127.0.0.1:{}/v1/chat/completions'.format(server.server_port))
+    monkeypatch.setattr(deepseek_api, '_session', None)
+    monkeypatch.setattr(deepseek_api, 'response_cache', None)
+    uart = _UART()
+    state = _time_state(main, None)
+
+    async def scenario():
+        commands = uart_command_service.CommandServer(uart)
+        main.register_commands(commands, state)
+        tasks = [asyncio.create_task(main.time_output_task(state, uart)),
+                 asyncio.create_task(commands.run())]
+        await asyncio.sleep(0.1)
+        uart.feed(b'ASK count\r\n')
+        start = time.monotonic()
+        while b'ASK 0123456789' not in uart.written and time.monotonic() - start < 5:
+            await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        deepseek_api._session.close()
+        return start
+
+    try:
+        start = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    assert b'ASK 0123456789\r\n' in uart.written
+    stamps = _time_stamps(uart, start)
+    assert len(stamps) > 20 and stamps[-1] - start > 0.4
+    assert max(b - a for a, b in zip(stamps, stamps[1:])) < 0.06
+    # 默认配置不把时间行打印到控制台（打印会在输出路径上分配内存）
+    assert '本地时间' not in capsys.readouterr().out
+
+
+def test_wifi_reconnect_does_not_stall_time_output(main, monkeypatch):
+    # WiFi断开后重连，扫描耗时0.5秒：期间每20ms一次的时间输出不中断
+    monkeypatch.setattr(wifi_config_service, '_store', None)
+    monkeypatch.setattr(wifi_config_service, '_config', None)
+    monkeypatch.setattr(wifi_config_service, '_pending_failures', {})
+    monkeypatch.setattr(wifi_service, '_last_scan', [None, None])
+    monkeypatch.setattr(network.WLAN, 'networks', {'home': 'secret'})
+    monkeypatch.setattr(network.WLAN, 'connect_delay', 0.05)
+    monkeypatch.setattr(network.WLAN, 'scan_delay', 0.5)
+    wifi_config_service.save_wifi_config('home', 'secret')
+    uart = _UART()
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    state = _time_state(main, wlan)
+
+    async def wait_connects(count):
+        deadline = time.monotonic() + 5
+        while state.wifi_supervisor is None or state.wifi_supervisor.connects < count:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        tasks = [asyncio.create_task(main.time_output_task(state, uart)),
+                 asyncio.create_task(main.wifi_task(state))]
+        await wait_connects(1)
+        # 断开，并让重连必须重新扫描（没有快速重连缓存和最近的扫描结果）
+        wifi_config_service.clear_fast_connect()
+        wifi_service._last_scan[:] = [None, None]
+        wlan.disconnect()
+        start = time.monotonic()
+        await wait_connects(2)
+        await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        return start
+
+    start = asyncio.run(scenario())
+    assert state.wifi_stats['scan_ms'] >= 500
+    stamps = _time_stamps(uart, start)
+    assert stamps[-1] - start > 0.5
+    assert max(b - a for a, b in zip(stamps, stamps[1:])) < 0.06
@@ -0,0 +1,131 @@
+# test_metrics.py
+# metrics：直方图的桶边界、被测函数抛出异常时的errors计数、关闭后不记录、同名不同类型的指标，
+# 以及Prometheus文本格式（累计的le桶和+Inf）
+
+import asyncio
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # 每个测试使用空的注册表，结束后恢复原来的注册表和开关
+    monkeypatch.setattr(metrics, '_registry', {})
+    monkeypatch.setattr(metrics, '_enabled', True)
+
+
+def test_bucket_boundaries():
+    hist = metrics.histogram('h', (10, 100))
+    # 等于上界的值计入该桶（Prometheus的le），大于最后一个上界的计入溢出桶
+    for value in (0, 10, 11, 100, 101, 5000):
+        hist.observe(value)
+    assert hist.counts == [2, 2, 2]
+    assert (hist.count, hist.total, hist.max) == (6, 5222, 5000)
+    assert metrics.snapshot()['h'] == {'buckets': [10, 100], 'counts': [2, 2, 2],
+                                       'count': 6, 'sum': 5222, 'max': 5000, 'errors': 0}
+
+
+def test_timed_counts_errors():
+    @metrics.timed('sync_us')
+    def work(fail):
+        if fail:
+            raise ValueError('失败')
+        return 'ok'
+
+    assert work(False) == 'ok'
+    with pytest.raises(ValueError):
+        work(True)
+    hist = metrics.histogram('sync_us')
+    assert (hist.count, hist.errors) == (2, 1)
+
+
+def test_timed_async_counts_errors():
+    @metrics.timed_async('async_us')
+    async def work(fail):
+        await asyncio.sleep(0)
+        if fail:
+            raise OSError(110, 'ETIMEDOUT')
+        return 'ok'
+
+    assert asyncio.run(work(False)) == 'ok'
+    with pytest.raises(OSError):
+        asyncio.run(work(True))
+    hist = metrics.histogram('async_us')
+    assert (hist.count, hist.errors) == (2, 1)
+
+
+def test_timer_counts_errors():
+    hist = metrics.histogram('block_us')
+    with hist.time():
+        pass
+    with pytest.raises(KeyError):
+        with hist.time():
+            raise KeyError('x')
+    assert (hist.count, hist.errors) == (2, 1)
+
+
+def test_disabled_records_nothing():
+    count = metrics.counter('c')
+    level = metrics.gauge('g')
+    hist = metrics.histogram('h')
+
+    @metrics.timed('h')
+    def fail():
+        raise ValueError('失败')
+
+    @metrics.timed_async('h')
+    async def work():
+        return 'ok'
+
+    metrics.set_enabled(False)
+    assert not metrics.enabled()
+    count.inc()
+    level.set(5)
+    hist.observe(1)
+    hist.since(0)
+    # 关闭后time()返回共享的空对象，不创建计时器
+    assert hist.time() is hist.time()
+    with hist.time():
+        pass
+    with pytest.raises(ValueError):
+        fail()
+    assert asyncio.run(work()) == 'ok'
+    assert (count.value, level.value, hist.count, hist.errors) == (0, 0, 0, 0)
+    # 重新开启后继续记录，已有的数值保留
+    metrics.set_enabled(True)
+    count.inc(2)
+    assert metrics.snapshot()['c'] == 2
+
+
+def test_same_name_different_type():
+    assert metrics.counter('x') is metrics.counter('x')
+    with pytest.raises(ValueError):
+        metrics.gauge('x')
+    with pytest.raises(ValueError):
+        metrics.histogram('x')
+
+
+def test_render_text():
+    metrics.counter('requests').inc(3)
+    metrics.gauge('free_bytes').set(1024)
+    hist = metrics.histogram('latency_us', (10, 100))
+    for value in (5, 50, 60, 500):
+        hist.observe(value)
+    hist.errors = 1
+    assert metrics.render_text() == '\n'.join([
+        '# TYPE requests counter',
+        'requests 3',
+        '# TYPE free_bytes gauge',
+        'free_bytes 1024',
+        '# TYPE latency_us histogram',
+        'latency_us_bucket{le="10"} 1',
+        'latency_us_bucket{le="100"} 3',
+        'latency_us_bucket{le="+Inf"} 4',
+        'latency_us_sum 615',
+        'latency_us_count 4',
+        '# TYPE latency_us_errors counter',
+        'latency_us_errors 1',
+        '',
+    ])
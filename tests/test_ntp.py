@@ -0,0 +1,108 @@
+# test_ntp.py
+# ntp_client / TimeService：协程版本的NTP查询不阻塞事件循环
+
+import asyncio
+import time
+
+import pytest
+
+import ntp_client
+import sync_time_service
+from helpers import start_ntp_server
+
+
+async def _run_with_ticker(coro):
+    """运行coro的同时每10ms唤醒一次的任务，返回(coro的结果, 两次唤醒的最大间隔秒数)"""
+    gaps = []
+    done = asyncio.Event()
+
+    async def ticker():
+        last = time.monotonic()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        done.set()
+        await task
+    return result, max(gaps)
+
+
+def test_query_async_does_not_block():
+    # 服务器0.3秒后才回复：查询期间其他任务照常运行
+    sock, port = start_ntp_server(skew=1.0, delay=0.3)
+    try:
+        start = time.monotonic()
+        (offset, delay), max_gap = asyncio.run(_run_with_ticker(
+            ntp_client.query_async('127.0.0.1', port)))
+        elapsed = time.monotonic() - start
+    finally:
+        sock.close()
+    assert elapsed >= 0.3
+    assert abs(offset - 1000) < 20
+    assert 0 <= delay <= ntp_client.POLL_INTERVAL_MS + 10
+    assert max_gap < 0.05
+
+
+def test_query_async_timeout():
+    import socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))   # 不回复的服务器
+    try:
+        start = time.monotonic()
+        with pytest.raises(OSError):
+            asyncio.run(ntp_client.query_async('127.0.0.1', sock.getsockname()[1], timeout=0.2))
+        assert time.monotonic() - start < 1
+    finally:
+        sock.close()
+
+
+def test_query_async_selects_best_sample():
+    # 同时查询三个服务器，时钟错误的服务器被剔除，慢速服务器不拖慢查询
+    first, port = start_ntp_server(skew=0.5, host='127.0.0.1')
+    socks = [first,
+             start_ntp_server(skew=0.5, delay=0.01, host='127.0.0.2', port=port)[0],
+             start_ntp_server(skew=5.0, host='127.0.0.3', port=port)[0],
+             start_ntp_server(skew=0.5, delay=0.8, host='127.0.0.4', port=port)[0]]
+    try:
+        start = time.monotonic()
+        offset, delay = asyncio.run(ntp_client.query_async(
+            ['127.0.0.1', '127.0.0.2', '127.0.0.3', '127.0.0.4'], port))
+        elapsed = time.monotonic() - start
+    finally:
+        for sock in socks:
+            sock.close()
+    assert abs(offset - 500) < 20
+    assert elapsed < 0.5
+
+
+def test_time_service_sync_async():
+    clock = [1000000]
+    calls = []
+
+    async def query_async(servers, port, clock=None):
+        calls.append((servers, port))
+        await asyncio.sleep(0)
+        return 250, 12
+
+    service = sync_time_service.TimeService(
+        servers=['a', 'b'], port=1230, clock=lambda: clock[0],
+        set_clock=lambda ms: clock.__setitem__(0, ms), query_async=query_async)
+    assert asyncio.run(service.sync_async())
+    assert calls == [(['a', 'b'], 1230)]
+    assert clock[0] == 1000250
+    assert (service.last_offset_ms, service.last_delay_ms, service.sync_count) == (250, 12, 1)
+
+
+def test_time_service_sync_async_failure():
+    async def query_async(servers, port, clock=None):
+        raise OSError('没有可用的NTP服务器响应')
+
+    service = sync_time_service.TimeService(set_clock=lambda ms: None, query_async=query_async)
+    assert not asyncio.run(service.sync_async())
+    assert service.fail_count == 1 and not service.synced()
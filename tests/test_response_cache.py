@@ -0,0 +1,166 @@
+# test_response_cache.py
+# response_cache.ResponseCache：按字节数的LRU淘汰、有效期（不受RTC跳变影响）、闪存缓存的保存和重新加载、
+# 文件名冲突和命中统计
+
+import response_cache
+
+SYNCED_S = 1700000000       # 2023-11，NTP校准后的RTC时间
+UNSYNCED_S = 946684800      # 2000-01-01，复位后未校准的RTC时间
+
+
+class Clocks:
+    """模拟的ticks_ms和RTC（秒），可以分别推进或跳变"""
+    def __init__(self, rtc=SYNCED_S + 365 * 86400):
+        self.ticks = 1000
+        self.rtc = rtc
+
+    def ticks_ms(self):
+        return self.ticks
+
+    def clock(self):
+        return self.rtc
+
+    def advance(self, seconds):
+        self.ticks += seconds * 1000
+        self.rtc += seconds
+
+
+def _cache(clocks, **kwargs):
+    return response_cache.ResponseCache(clock=clocks.clock, ticks_ms=clocks.ticks_ms, **kwargs)
+
+
+def _key(n):
+    return response_cache.cache_key('model', str(n))
+
+
+def test_lru_evicts_by_bytes():
+    cache = _cache(Clocks(), max_bytes=30)
+    cache.put('a', 'x' * 10)
+    cache.put('b', '测试' * 2)      # UTF-8 12字节
+    cache.put('c', 'z' * 8)
+    assert cache.size == 30
+    assert cache.get('a') == 'x' * 10    # a变为最近使用
+    cache.put('d', 'w' * 10)            # 淘汰最久未使用的b
+    assert cache.get('b') is None
+    assert [cache.get(k) is not None for k in 'acd'] == [True, True, True]
+    assert cache.size == 28 and cache.evictions == 1
+    # 超过上限的值不缓存，也不淘汰已有的条目
+    cache.put('e', 'v' * 31)
+    assert cache.get('e') is None and cache.stats()['entries'] == 3
+    # 替换已有的键时按新值的字节数计算
+    cache.put('a', 'y')
+    assert cache.size == 19
+
+
+def test_ttl_uses_ticks_not_rtc():
+    clocks = Clocks()
+    cache = _cache(clocks, ttl=60)
+    cache.put('k', 'v')
+    # NTP校时把RTC向前跳一天或向回跳到2000年：内存缓存不受影响
+    clocks.rtc += 86400
+    assert cache.get('k') == 'v'
+    clocks.rtc = UNSYNCED_S
+    assert cache.get('k') == 'v'
+    clocks.ticks += 59999
+    assert cache.get('k') == 'v'
+    clocks.ticks += 1
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0 and cache.size == 0
+
+
+def test_ttl_across_ticks_wraparound():
+    clocks = Clocks()
+    clocks.ticks = response_cache.time.ticks_add(0, -10000)   # 10秒后回绕
+    cache = _cache(clocks, ttl=60)
+    cache.put('k', 'v')
+    clocks.ticks = response_cache.time.ticks_add(clocks.ticks, 30000)
+    assert cache.get('k') == 'v'
+    clocks.ticks = response_cache.time.ticks_add(clocks.ticks, 30000)
+    assert cache.get('k') is None
+
+
+def test_flash_tier_persists_and_reloads(tmp_path):
+    directory = str(tmp_path / 'cache')
+    clocks = Clocks()
+    cache = _cache(clocks, ttl=600, directory=directory)
+    cache.put(_key(1), '第一条回复')
+    cache.put(_key(2), 'second')
+    # 重启：新的对象（内存缓存为空），ticks_ms从头开始计时
+    clocks.advance(100)
+    clocks.ticks = 0
+    reloaded = _cache(clocks, ttl=600, directory=directory)
+    assert reloaded.get(_key(1)) == '第一条回复'
+    assert reloaded.get(_key(1)) == '第一条回复'
+    assert (reloaded.flash_hits, reloaded.hits, reloaded.misses) == (1, 1, 0)
+    # 从闪存载入的条目在内存中只保留剩余的有效期（600 - 100秒）
+    clocks.ticks += 499 * 1000
+    assert reloaded.get(_key(1)) == '第一条回复'
+    clocks.ticks += 1000
+    clocks.rtc += 500
+    assert reloaded.get(_key(1)) is None and reloaded.get(_key(2)) is None
+    assert reloaded.misses == 2
+
+
+def test_flash_tier_ignored_until_rtc_synced(tmp_path):
+    directory = str(tmp_path / 'cache')
+    clocks = Clocks()
+    _cache(clocks, directory=directory).put(_key(1), 'saved')
+    # 复位后RTC从2000年开始计时：闪存中的条目视为过期，也不写入新的条目
+    clocks.rtc = UNSYNCED_S
+    cache = _cache(clocks, directory=directory)
+    assert cache.get(_key(1)) is None
+    cache.put(_key(2), 'unsynced')
+    assert cache.get(_key(2)) == 'unsynced'
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
+    # 校准后可以读取
+    clocks.rtc = SYNCED_S + 365 * 86400 + 10
+    assert _cache(clocks, directory=directory).get(_key(1)) == 'saved'
+
+
+def test_flash_tier_uses_synced_callback(tmp_path):
+    synced = [False]
+    clocks = Clocks()
+    cache = _cache(clocks, directory=str(tmp_path), synced=lambda: synced[0])
+    cache.put(_key(1), 'v')
+    assert list(tmp_path.iterdir()) == []
+    synced[0] = True
+    cache.put(_key(1), 'v')
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_flash_file_name_collision(tmp_path):
+    # 文件名为键的前16个字符：前缀相同的两个键共用一个文件，后写入的覆盖前一个，
+    # 读取时比较完整的键，不会返回另一个键的值
+    clocks = Clocks()
+    first = '0123456789abcdef' + 'a' * 48
+    second = '0123456789abcdef' + 'b' * 48
+    cache = _cache(clocks, directory=str(tmp_path))
+    cache.put(first, 'first')
+    cache.put(second, 'second')
+    assert len(list(tmp_path.iterdir())) == 1
+    reloaded = _cache(clocks, directory=str(tmp_path))
+    assert reloaded.get(first) is None
+    assert reloaded.get(second) == 'second'
+
+
+def test_flash_tier_evicts_earliest_expiry(tmp_path):
+    clocks = Clocks()
+    cache = _cache(clocks, directory=str(tmp_path), max_files=3)
+    for n in range(4):
+        cache.put(_key(n), str(n))
+        clocks.advance(1)
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert names == sorted(_key(n)[:16] for n in (1, 2, 3))
+
+
+def test_hit_miss_counters():
+    cache = _cache(Clocks())
+    assert cache.get('missing') is None
+    cache.put('k', 'v')
+    for _ in range(3):
+        cache.get('k')
+    stats = cache.stats()
+    assert (stats['hits'], stats['flash_hits'], stats['misses']) == (3, 0, 1)
+    cache.clear()
+    assert cache.get('k') is None and cache.stats()['misses'] == 2
+
@@ -0,0 +1,173 @@
+# test_ssd1306.py
+# ssd1306：用记录传输内容的模拟I2C/SPI检查show()只发送脏区域、整屏刷新和相邻整页的合并，以及bytes_sent的计数
+
+import pytest
+
+import ssd1306
+from host_stubs import Pin
+
+WINDOW = 6   # 每个窗口的命令数：SET_COL_ADDR x0 x1 SET_PAGE_ADDR p0 p1
+
+
+class FakeI2C:
+    """记录每次传输：('cmd', 命令字节)或('data', 显示数据)"""
+    def __init__(self):
+        self.transfers = []
+
+    def writeto(self, addr, buf):
+        buf = bytes(buf)
+        if buf[0] == 0x80:
+            assert len(buf) == 2
+            self.transfers.append(('cmd', buf[1]))
+        else:
+            assert buf[0] == 0x40
+            self.transfers.append(('data', buf[1:]))
+
+    def writevto(self, addr, vector):
+        data = b''.join(bytes(buf) for buf in vector)
+        assert data[0] == 0x40
+        self.transfers.append(('data', data[1:]))
+
+
+class FakeSPI:
+    """按D/C引脚的电平把每次写入记录为命令或显示数据"""
+    def __init__(self, dc):
+        self.dc = dc
+        self.transfers = []
+
+    def init(self, **kwargs):
+        pass
+
+    def write(self, buf):
+        buf = bytes(buf)
+        if self.dc.value():
+            self.transfers.append(('data', buf))
+        else:
+            assert len(buf) == 1
+            self.transfers.append(('cmd', buf[0]))
+
+
+def _i2c_display(width=128, height=64):
+    i2c = FakeI2C()
+    display = ssd1306.SSD1306_I2C(width, height, i2c)
+    i2c.transfers = []
+    display.bytes_sent = 0
+    return display, i2c
+
+
+def _spi_display(width=128, height=64):
+    dc = Pin(1)
+    spi = FakeSPI(dc)
+    display = ssd1306.SSD1306_SPI(width, height, spi, dc, Pin(2), Pin(3))
+    spi.transfers = []
+    display.bytes_sent = 0
+    return display, spi
+
+
+def _framebuffer(display):
+    # I2C的缓冲区第一个字节是控制字节
+    return bytes(display.buffer[1:] if isinstance(display, ssd1306.SSD1306_I2C) else display.buffer)
+
+
+def _windows(display, transfers):
+    """把传输记录解析为[(x0, x1, 起始页, 结束页, 数据字节数)]，并检查数据与帧缓冲区的对应部分相同"""
+    windows = []
+    buf = _framebuffer(display)
+    offset = 32 if display.width == 64 else 0
+    i = 0
+    while i < len(transfers):
+        cmds = [value for kind, value in transfers[i:i + WINDOW]]
+        assert [kind for kind, value in transfers[i:i + WINDOW + 1]] == ['cmd'] * WINDOW + ['data']
+        assert cmds[0] == ssd1306.SET_COL_ADDR and cmds[3] == ssd1306.SET_PAGE_ADDR
+        x0, x1, p0, p1 = cmds[1] - offset, cmds[2] - offset, cmds[4], cmds[5]
+        data = transfers[i + WINDOW][1]
+        assert data == buf[p0 * display.width + x0:p1 * display.width + x1 + 1]
+        windows.append((x0, x1, p0, p1, len(data)))
+        i += WINDOW + 1
+    return windows
+
+
+@pytest.mark.parametrize('make', [_i2c_display, _spi_display])
+def test_clean_show_sends_nothing(make):
+    display, bus = make()
+    display.show()
+    assert bus.transfers == [] and display.bytes_sent == 0
+    display.text('x', 0, 0)
+    display.show()
+    bus.transfers = []
+    sent = display.bytes_sent
+    display.show()
+    assert bus.transfers == [] and display.bytes_sent == sent
+
+
+def test_text_sends_only_touched_columns():
+    display, i2c = _i2c_display()
+    display.text('hi', 16, 8)
+    display.show()
+    assert _windows(display, i2c.transfers) == [(16, 31, 1, 1, 16)]
+    # I2C：每个命令2字节，数据前加1个控制字节
+    assert display.bytes_sent == WINDOW * 2 + 1 + 16
+
+
+def test_text_across_pages_and_clipped():
+    display, i2c = _i2c_display()
+    display.text('abc', 120, 4)     # 跨第0、1页，超出右边缘的部分被裁掉
+    display.show()
+    assert _windows(display, i2c.transfers) == [(120, 127, 0, 0, 8), (120, 127, 1, 1, 8)]
+
+
+@pytest.mark.parametrize('refresh', [
+    lambda display: display.show(full=True),
+    lambda display: (display.invalidate(), display.show()),
+])
+def test_full_refresh_sends_whole_buffer(refresh):
+    display, i2c = _i2c_display()
+    display.text('x', 0, 0)
+    refresh(display)
+    assert _windows(display, i2c.transfers) == [(0, 127, 0, 7, 1024)]
+    # 整屏用一次writeto发送（缓冲区包括控制字节）
+    assert display.bytes_sent == WINDOW * 2 + 1 + 1024
+    i2c.transfers = []
+    display.show()
+    assert i2c.transfers == []
+
+
+def test_adjacent_full_pages_merge():
+    display, i2c = _i2c_display()
+    display.invalidate(0, 8, None, 16)        # 第1、2页整页
+    display.invalidate(0, 40, None, 24)       # 第5~7页整页
+    display.show()
+    assert _windows(display, i2c.transfers) == [(0, 127, 1, 2, 256), (0, 127, 5, 7, 384)]
+    assert display.bytes_sent == 2 * (WINDOW * 2 + 1) + 256 + 384
+
+
+def test_partial_pages_not_merged():
+    # 整页之间夹着部分脏的页：各自一个窗口（窗口内的数据在缓冲区中必须连续）
+    display, i2c = _i2c_display()
+    display.invalidate(0, 0, None, 8)
+    display.pixel(5, 9, 1)
+    display.invalidate(0, 16, None, 8)
+    display.invalidate(3, 24, 2, 8)
+    display.show()
+    assert _windows(display, i2c.transfers) == [
+        (0, 127, 0, 0, 128), (5, 5, 1, 1, 1), (0, 127, 2, 2, 128), (3, 4, 3, 3, 2)]
+
+
+def test_spi_bytes_sent():
+    display, spi = _spi_display()
+    display.text('hi', 16, 8)
+    display.show()
+    assert _windows(display, spi.transfers) == [(16, 31, 1, 1, 16)]
+    assert display.bytes_sent == WINDOW + 16
+    spi.transfers = []
+    display.show(full=True)
+    assert _windows(display, spi.transfers) == [(0, 127, 0, 7, 1024)]
+    assert display.bytes_sent == 2 * WINDOW + 16 + 1024
+
+
+def test_64_wide_display_column_offset():
+    display, i2c = _i2c_display(64, 48)
+    display.text('a', 8, 16)
+    display.show()
+    assert i2c.transfers[1:3] == [('cmd', 8 + 32), ('cmd', 15 + 32)]
+    assert _windows(display, i2c.transfers) == [(8, 15, 2, 2, 8)]
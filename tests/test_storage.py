@@ -0,0 +1,139 @@
+# test_storage.py
+# wifi_config_service.AtomicJSONFile和kvstore：在写入的每个字节处和每个改名步骤处模拟掉电，
+# 检查重启后总能读到完整的配置
+
+import builtins
+import json
+
+import pytest
+
+import kvstore
+import wifi_config_service
+
+OLD = {'ssid': 'old', 'password': 'x' * 20}
+NEW = {'ssid': '新网络', 'password': 'y' * 20}
+# 第3个版本的文件长度（文件头 + JSON正文）
+SIZE = len(b'3 00000000\n') + len(json.dumps(NEW).encode('utf-8'))
+
+
+class PowerLoss(Exception):
+    pass
+
+
+class _FaultyFile:
+    """写入budget[0]个字节后模拟掉电（已写入的部分保留在文件中）"""
+    def __init__(self, path, mode, budget):
+        self.f = builtins.open(path, mode)
+        self.budget = budget
+
+    def write(self, data):
+        n = min(len(data), self.budget[0])
+        self.f.write(data[:n])
+        self.budget[0] -= n
+        if n < len(data):
+            raise PowerLoss()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _power_loss(monkeypatch, written, steps):
+    # 之后的保存在写入written个字节或执行steps次改名/删除后掉电
+    budget = [written]
+    ops = [steps]
+    module = wifi_config_service
+
+    def faulty_open(path, mode='r'):
+        return _FaultyFile(path, mode, budget) if 'w' in mode else builtins.open(path, mode)
+
+    def faulty(func):
+        def wrapper(*args):
+            if ops[0] == 0:
+                raise PowerLoss()
+            ops[0] -= 1
+            func(*args)
+        return wrapper
+
+    monkeypatch.setattr(module, 'open', faulty_open, raising=False)
+    monkeypatch.setattr(module, 'rename_file', faulty(module.rename_file))
+    monkeypatch.setattr(module, 'remove_file', faulty(module.remove_file))
+
+
+@pytest.mark.parametrize('steps', range(4))
+def test_atomic_save_survives_power_loss(workdir, monkeypatch, steps):
+    for written in range(SIZE + 1):
+        for path in workdir.iterdir():
+            path.unlink()
+        store = wifi_config_service.AtomicJSONFile('config.json')
+        assert store.save({'ssid': 'older'}) and store.save(OLD)
+        with monkeypatch.context() as patch:
+            _power_loss(patch, written, steps)
+            try:
+                store.save(NEW)
+            except PowerLoss:
+                pass
+        # 重启后读取：临时文件完整写入后必须读到新配置，否则必须读到旧配置
+        loaded = wifi_config_service.AtomicJSONFile('config.json').load()
+        assert loaded == (NEW if written == SIZE else OLD), (written, steps)
+
+
+def test_atomic_load_falls_back_to_backup(workdir):
+    store = wifi_config_service.AtomicJSONFile('config.json')
+    assert store.save({'ssid': 'older'}) and store.save(OLD) and store.save(NEW)
+    data = (workdir / 'config.json').read_bytes()
+    for length in range(len(data)):
+        # 正式文件损坏（截断到任意长度）时使用备份
+        (workdir / 'config.json').write_bytes(data[:length])
+        assert wifi_config_service.AtomicJSONFile('config.json').load() == OLD, length
+
+
+def test_atomic_save_skips_unchanged(workdir):
+    store = wifi_config_service.AtomicJSONFile('config.json')
+    for i in range(3):
+        store.save({'ssid': 'a', 'count': i})
+    for _ in range(3):
+        store.save({'ssid': 'a', 'count': 2})
+    assert (store.writes, store.skipped_writes) == (3, 3)
+    assert wifi_config_service.AtomicJSONFile('config.json').load() == {'ssid': 'a', 'count': 2}
+
+
+def test_kvstore_truncated_file_loads(workdir):
+    # 文件截断到任意长度后，每个键都是某次写入过的完整值（或不存在）
+    store = kvstore.KVStore('crash.kv')
+    history = {'a': [None], 'b': [None]}
+    for i in range(20):
+        key = 'a' if i % 3 else 'b'
+        value = json.dumps({'n': i, 'pad': 'x' * i}).encode()
+        store.put(key, value)
+        history[key].append(value)
+    store.close()
+    data = (workdir / 'crash.kv').read_bytes()
+    for length in range(len(data) + 1):
+        (workdir / 'crash.kv').write_bytes(data[:length])
+        store = kvstore.KVStore('crash.kv')
+        for key in history:
+            assert store.get(key) in history[key], (length, key)
+        store.close()
+
+
+def test_kvstore_compaction_keeps_latest_values(workdir):
+    store = kvstore.KVStore('settings.kv', compact_min_bytes=256)
+    for i in range(200):
+        store.put_json('count', {'n': i})
+        store.put_json('fixed', {'ssid': 'a'})
+    assert store.compactions > 0
+    assert store.get_json('count') == {'n': 199}
+    store.close()
+    store = kvstore.KVStore('settings.kv')
+    assert store.get_json('count') == {'n': 199} and store.get_json('fixed') == {'ssid': 'a'}
+    assert store.delete('fixed') and 'fixed' not in store
+    store.close()
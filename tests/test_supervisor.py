@@ -0,0 +1,143 @@
+# test_supervisor.py
+# wifi_service.ConnectionSupervisor：用模拟时钟和模拟AP检查退避、重连和断网统计（结果确定，不需要真实等待）
+
+import asyncio
+
+import wifi_service
+
+
+class Sim:
+    """模拟时钟和AP：AP在outages列表中的时间段内不可用，每次连接尝试耗时connect_ms"""
+    def __init__(self, outages, connect_ms=300):
+        self.now = 0
+        self.outages = outages
+        self.connect_ms = connect_ms
+        self.link = False
+        self.attempt_times = []
+
+    def ap_up(self):
+        for start, end in self.outages:
+            if start <= self.now < end:
+                return False
+        return True
+
+    async def sleep_ms(self, ms):
+        self.now += ms
+
+    def isconnected(self):
+        if not self.ap_up():
+            self.link = False
+        return self.link
+
+    async def connect(self):
+        self.attempt_times.append(self.now)
+        self.now += self.connect_ms
+        self.link = self.ap_up()
+        return self.link
+
+
+def _supervisor(sim, **kwargs):
+    kwargs.setdefault('jitter', 0)
+    return wifi_service.ConnectionSupervisor(
+        sim, sim.connect, clock=lambda: sim.now, sleep_ms=sim.sleep_ms, **kwargs)
+
+
+def _run_until(sim, supervisor, end_ms):
+    async def run():
+        while sim.now < end_ms:
+            await supervisor.step()
+    asyncio.run(run())
+
+
+def test_backoff_doubles_up_to_max():
+    supervisor = _supervisor(Sim([]), base_delay_ms=1000, max_delay_ms=8000)
+    assert [supervisor.backoff_ms(n) for n in range(1, 7)] == [1000, 2000, 4000, 8000, 8000, 8000]
+    supervisor = _supervisor(Sim([]), base_delay_ms=1000, jitter=0.5, rand=lambda: 0.5)
+    assert supervisor.backoff_ms(2) == 1500
+
+
+def test_retries_with_backoff_until_ap_returns():
+    # AP在前20秒不可用：第n次失败后等待1、2、4、8秒，AP恢复后的第一次尝试成功
+    sim = Sim([(0, 20000)])
+    failures = []
+    connects = []
+    supervisor = _supervisor(sim, base_delay_ms=1000, max_delay_ms=8000,
+                             on_failure=failures.append, on_connect=lambda: connects.append(sim.now))
+    _run_until(sim, supervisor, 30000)
+    assert sim.attempt_times == [0, 1300, 3600, 7900, 16200, 24500]
+    assert failures == [1, 2, 3, 4, 5]
+    assert connects == [24800]
+    metrics = supervisor.metrics()
+    assert metrics['attempts'] == 6 and metrics['connects'] == 1 and metrics['failures'] == 0
+    assert metrics['first_connect_ms'] == 24800
+
+
+def test_reconnects_immediately_and_records_outage():
+    # 连接10秒后AP掉线5秒：检查间隔内发现断开并立即重连，断网时长计入直方图
+    sim = Sim([(10000, 15000)])
+    supervisor = _supervisor(sim, base_delay_ms=1000, check_interval_ms=250)
+    _run_until(sim, supervisor, 30000)
+    metrics = supervisor.metrics()
+    assert metrics['connects'] == 2 and metrics['disconnects'] == 1
+    # 300ms连接成功，之后每250ms检查一次：10050ms发现断开，立即重连，失败后等待1、2、4秒
+    assert sim.attempt_times == [0, 10050, 11350, 13650, 17950]
+    assert metrics['total_uptime_ms'] == 10050 - 300
+    assert metrics['uptime_histogram'][wifi_service._bucket(9750)] == 1
+    assert metrics['total_outage_ms'] == 17950 + 300 - 10050
+    assert metrics['outage_histogram'][wifi_service._bucket(8200)] == 1
+    assert metrics['longest_outage_ms'] == metrics['total_outage_ms']
+    assert metrics['connected']
+
+
+class YieldingSim(Sim):
+    """每次休眠都让出事件循环，其他任务可以在退避等待期间运行"""
+    async def sleep_ms(self, ms):
+        self.now += ms
+        await asyncio.sleep(0)
+
+
+def test_request_retry_ends_backoff():
+    sim = YieldingSim([(0, 1000)])
+    supervisor = _supervisor(sim, base_delay_ms=60000, check_interval_ms=250)
+
+    async def retry_soon():
+        await asyncio.sleep(0)
+        supervisor.request_retry()
+
+    async def main():
+        # 第一次失败后进入60秒退避，在下一个检查间隔被request_retry()打断
+        await asyncio.gather(supervisor.step(), retry_soon())
+    asyncio.run(main())
+    assert sim.now <= 300 + 2 * 250
+    asyncio.run(supervisor.step())
+    assert supervisor.connected and supervisor.attempts == 2
+
+
+def test_less_offline_than_fixed_retry():
+    # AP每小时掉线5秒、最后一小时完全不可用：与固定60秒重试相比，断网总时长更短
+    hour = 3600000
+    hours = 6
+    outages = [(h * hour + 1800000, h * hour + 1805000) for h in range(hours - 1)]
+    outages.append(((hours - 1) * hour, hours * hour))
+
+    sim = Sim(outages)
+    fixed_offline = 0
+    while sim.now < hours * hour:
+        if sim.isconnected():
+            sim.now += 1000
+            continue
+        start = sim.now
+        asyncio.run(sim.connect())
+        if not sim.link:
+            sim.now += 60000
+        fixed_offline += sim.now - start
+
+    sim = Sim(outages)
+    supervisor = _supervisor(sim, base_delay_ms=1000, max_delay_ms=300000)
+    _run_until(sim, supervisor, hours * hour)
+    metrics = supervisor.metrics()
+    offline = metrics['total_outage_ms'] + metrics['current_outage_ms'] + metrics['first_connect_ms']
+    assert metrics['disconnects'] == hours
+    assert offline < fixed_offline
+    # 最后一小时退避到上限，重试次数远少于固定间隔的60次
+    assert len([t for t in sim.attempt_times if t >= (hours - 1) * hour]) < 25
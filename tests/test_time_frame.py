@@ -0,0 +1,83 @@
+# test_time_frame.py
+# time_frame：二进制时间帧的编解码往返，以及流式解码器在分段、噪声和错误CRC下的重新同步
+
+import random
+
+import pytest
+
+import sync_time_service
+import time_frame
+
+COUNT = 2000
+
+
+@pytest.fixture
+def service():
+    service = sync_time_service.TimeService(set_clock=lambda ms: None,
+                                            query=lambda *args, **kwargs: (0, 4))
+    service.sync()
+    return service
+
+
+def _stream(service, utc_s, count=COUNT):
+    # 10Hz输出count帧（每个元素是一帧的bytes）
+    encoder = time_frame.TimeFrameEncoder(service)
+    return [bytes(encoder.set_time(utc_s + i // 10, i * 100 % 1000)) for i in range(count)]
+
+
+def _check(frames, service, utc_s, start=0):
+    for i, (unix_s, ms, tz_minutes, flags) in enumerate(frames, start):
+        assert unix_s == utc_s + time_frame.EPOCH_OFFSET + i // 10
+        assert ms == i * 100 % 1000
+        assert tz_minutes == service.timezone_offset * 60
+        assert flags & time_frame.FLAG_SYNCED
+
+
+def test_round_trip_random_segments(service):
+    utc_s = sync_time_service.clock_s()
+    stream = b''.join(_stream(service, utc_s))
+    decoder = time_frame.FrameDecoder()
+    frames = []
+    rand = random.Random(1)
+    pos = 0
+    while pos < len(stream):
+        size = rand.randint(1, 40)
+        frames.extend(decoder.feed(stream[pos:pos + size]))
+        pos += size
+    assert len(frames) == COUNT
+    _check(frames, service, utc_s)
+    assert decoder.errors == 0
+
+
+def test_decoder_resyncs_after_noise(service):
+    utc_s = sync_time_service.clock_s()
+    frames = _stream(service, utc_s, 6)
+    # 帧头前的噪声（包括同步字节）、两帧之间的孤立同步字节
+    data = b'\xa5\x00garbage' + b''.join(frames[:3]) + b'\xa5' + b''.join(frames[3:])
+    decoder = time_frame.FrameDecoder()
+    decoded = decoder.feed(data)
+    _check(decoded, service, utc_s)
+    assert len(decoded) == 6
+
+
+def test_decoder_drops_corrupted_frame(service):
+    utc_s = sync_time_service.clock_s()
+    frames = _stream(service, utc_s, 3)
+    corrupted = bytearray(frames[1])
+    corrupted[5] ^= 0x01
+    decoder = time_frame.FrameDecoder()
+    decoded = decoder.feed(frames[0] + bytes(corrupted) + frames[2])
+    assert [frame[1] for frame in decoded] == [0, 200]
+    assert decoder.errors >= 1
+    with pytest.raises(ValueError):
+        time_frame.decode(bytes(corrupted))
+
+
+def test_frame_fields(service):
+    encoder = time_frame.TimeFrameEncoder(service)
+    frame = bytes(encoder.set_time(0x12345678, 999))
+    assert len(frame) == time_frame.FRAME_SIZE and frame[0] == time_frame.SYNC_BYTE
+    assert frame[9] == time_frame.crc8(frame, 0, 9)
+    assert time_frame.decode(frame)[:2] == (0x12345678 + time_frame.EPOCH_OFFSET, 999)
+    # 精度等级：往返延迟4ms时误差上限约为3ms（2^2）
+    assert frame[8] >> 4 == time_frame.accuracy_class(3) == 2
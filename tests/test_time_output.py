@@ -0,0 +1,214 @@
+# test_time_output.py
+# main.time_output_task的输出路径（TickScheduler.run + tick_scheduler.output）：
+# 槽位连续、输出内容正确，每次输出不创建协程、不分配堆内存（MicroPython中检查gc.mem_alloc()，PC上用tracemalloc）
+
+import inspect
+import os
+import shutil
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+
+import sync_time_service
+import tick_scheduler
+from conftest import ROOT
+
+BASE_MS = 1700000000000
+
+
+class _Clock:
+    """模拟时钟：ticks_ms()和TimeService的时钟（毫秒）由测试推进"""
+    def __init__(self):
+        self.ticks = 0
+
+    def ticks_ms(self):
+        return self.ticks
+
+    def now_ms(self):
+        return BASE_MS + self.ticks
+
+
+class _Sleep:
+    """预分配的可等待对象：代替asyncio.sleep_ms让出一次控制权，记录要等待的毫秒数"""
+    def __init__(self):
+        self.ms = 0
+        self._yielded = False
+
+    def __call__(self, ms):
+        self.ms = ms
+        return self
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._yielded:
+            self._yielded = False
+            raise StopIteration
+        self._yielded = True
+
+
+class _UART:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        self.lines.append(bytes(data))
+        return len(data)
+
+
+def _drive(monkeypatch, rate_hz, count, on_call=None):
+    # 手动驱动scheduler.run(output(...))，每次让出时把模拟时钟推进到要等待的时刻
+    clock = _Clock()
+    sleep = _Sleep()
+    monkeypatch.setattr(tick_scheduler, '_sleep_ms', sleep)
+    service = sync_time_service.TimeService(clock=clock.now_ms, set_clock=lambda ms: None)
+    formatter = sync_time_service.TimeFormatter(service, millis=rate_hz > 1)
+    scheduler = tick_scheduler.TickScheduler(service, rate_hz, ticks_ms=clock.ticks_ms)
+    uart = _UART()
+    coro = scheduler.run(tick_scheduler.output(formatter, uart))
+    if on_call is not None:
+        sys.setprofile(on_call)
+    try:
+        while len(uart.lines) < count:
+            coro.send(None)
+            clock.ticks += sleep.ms
+    finally:
+        sys.setprofile(None)
+        coro.close()
+    return uart.lines, scheduler
+
+
+def test_run_outputs_consecutive_slots(monkeypatch):
+    lines, scheduler = _drive(monkeypatch, 10, 25)
+    # 第一个槽位是BASE_MS之后的下一个100ms边界，之后每个槽位推进100ms
+    formatter = sync_time_service.TimeFormatter(
+        sync_time_service.TimeService(set_clock=lambda ms: None), millis=True)
+    expected = []
+    for i in range(25):
+        wall = BASE_MS + 100 * (i + 1)
+        expected.append(bytes(formatter.set_time(wall // 1000, wall % 1000)))
+    assert lines == expected
+    assert scheduler.metrics()['missed'] == 0
+    assert scheduler.metrics()['jitter_max_ms'] == 0
+
+
+def test_run_creates_no_coroutine_per_tick(monkeypatch):
+    # 只有run()本身是协程：每个槽位不再调用wait()等协程函数（每次调用都会分配协程对象）
+    started = []
+
+    def on_call(frame, event, arg):
+        code = frame.f_code
+        if event == 'call' and code.co_flags & inspect.CO_COROUTINE and code.co_name != 'run':
+            started.append(code.co_name)
+
+    lines, _ = _drive(monkeypatch, 10, 50, on_call)
+    assert len(lines) == 50
+    assert started == []
+
+
+class _SnapshotUART:
+    """snapshot为True时，在每次write时（输出路径中的临时对象仍然存在）记录由files中的模块分配、仍存活的内存块数"""
+    def __init__(self, files):
+        self.filters = [tracemalloc.Filter(True, path) for path in files]
+        self.snapshot = False
+        self.live = []
+
+    def write(self, data):
+        if self.snapshot:
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+            self.live.append(sum(stat.count for stat in snapshot.statistics('lineno')))
+        return len(data)
+
+
+@pytest.mark.parametrize('millis', [False, True])
+def test_output_path_allocation_free_on_host(millis):
+    # CPython的整数运算本身会分配对象，不能像MicroPython那样比较gc.mem_alloc()；
+    # 这里检查写入UART时没有由TimeFormatter/output()分配的存活对象（写入的是预分配缓冲区），
+    # 大量输出之后也没有
+    service = sync_time_service.TimeService(set_clock=lambda ms: None)
+    formatter = sync_time_service.TimeFormatter(service, millis=millis)
+    uart = _SnapshotUART([sync_time_service.__file__, tick_scheduler.__file__])
+    emit = tick_scheduler.output(formatter, uart)
+    utc_s = BASE_MS // 1000
+    emit(utc_s, 0)     # 第一次输出计算日期
+    tracemalloc.start()
+    try:
+        uart.snapshot = True
+        for i in range(20):
+            emit(utc_s + i // 10, i * 100 % 1000)
+        uart.snapshot = False
+        for i in range(10000):
+            emit(utc_s + i // 10, i * 100 % 1000)
+        uart.snapshot = True
+        emit(utc_s, 0)
+    finally:
+        tracemalloc.stop()
+    assert uart.live == [0] * 21
+
+
+_MICROPYTHON_SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+import gc
+import time
+import asyncio
+import sync_time_service
+import tick_scheduler
+
+class UART:
+    def write(self, data):
+        return len(data)
+
+COUNT = 200
+samples = [0] * COUNT
+count = [0]
+
+class Done(Exception):
+    pass
+
+service = sync_time_service.TimeService(set_clock=lambda ms: None)
+formatter = sync_time_service.TimeFormatter(service, millis=True)
+scheduler = tick_scheduler.TickScheduler(service, 100)
+write = tick_scheduler.output(formatter, UART())
+
+def emit(utc_s, ms):
+    write(utc_s, ms)
+    i = count[0]
+    samples[i] = gc.mem_alloc()
+    count[0] = i + 1
+    if i + 1 == COUNT:
+        raise Done
+
+async def main():
+    try:
+        await scheduler.run(emit)
+    except Done:
+        pass
+
+gc.collect()
+gc.disable()
+asyncio.run(main())
+gc.enable()
+# 跳过前几个槽位（第一次输出计算日期，首次对齐）
+deltas = [samples[i + 1] - samples[i] for i in range(10, COUNT - 1)]
+print(max(deltas), min(deltas))
+'''
+
+
+@pytest.mark.skipif(shutil.which(os.environ.get('MICROPYTHON', 'micropython')) is None,
+                    reason='需要MicroPython unix端口（micropython命令或MICROPYTHON环境变量）')
+def test_output_path_allocation_free_on_micropython(tmp_path):
+    # 在MicroPython中以100Hz运行实际的输出路径，相邻两次输出之间gc.mem_alloc()不应增加
+    script = tmp_path / 'alloc.py'
+    script.write_text(_MICROPYTHON_SCRIPT.format(root=ROOT), encoding='utf-8')
+    result = subprocess.run([os.environ.get('MICROPYTHON', 'micropython'), str(script)],
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr + result.stdout
+    max_delta, min_delta = map(int, result.stdout.split()[-2:])
+    assert max_delta == 0 and min_delta == 0
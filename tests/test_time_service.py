@@ -0,0 +1,135 @@
+# test_time_service.py
+# sync_time_service.TimeService：用模拟的漂移RTC和NTP检查漂移率估计、两次同步之间的校正和漂移率的保存
+
+import asyncio
+
+import pytest
+
+import kvstore
+import sync_time_service
+
+HOUR = 3600000
+
+
+class DriftingRTC:
+    """模拟RTC：相对真实时间每百万毫秒慢ppm毫秒；query()返回真实时间与RTC的偏差"""
+    def __init__(self, ppm, offset_ms=5000, delay_ms=10):
+        self.true = 1700000000000
+        self.rtc = self.true - offset_ms
+        self.ppm = ppm
+        self.delay_ms = delay_ms
+
+    def advance(self, ms):
+        self.true += ms
+        self.rtc += ms - ms * self.ppm // 1000000
+
+    def clock(self):
+        return self.rtc
+
+    def set_clock(self, ms):
+        self.rtc = ms
+
+    def query(self, servers, port, clock):
+        return self.true - clock(), self.delay_ms
+
+    async def query_async(self, servers, port, clock):
+        return self.query(servers, port, clock)
+
+
+def _service(rtc, store=None):
+    return sync_time_service.TimeService(clock=rtc.clock, set_clock=rtc.set_clock, query=rtc.query,
+                                         query_async=rtc.query_async, store=store)
+
+
+def test_first_sync_sets_clock_without_drift():
+    rtc = DriftingRTC(50)
+    service = _service(rtc)
+    assert service.due() and not service.synced()
+    assert service.sync()
+    assert rtc.rtc == rtc.true
+    assert (service.last_offset_ms, service.last_delay_ms, service.drift_ppm) == (5000, 10, 0)
+    assert service.correction_ms() == 0
+    assert not service.due()
+
+
+@pytest.mark.parametrize('ppm', [50, -30, 200])
+def test_drift_estimated_and_corrected(ppm):
+    rtc = DriftingRTC(ppm)
+    service = _service(rtc)
+    service.sync()
+    rtc.advance(HOUR)
+    # 同步前：一小时累计的漂移
+    assert service.now_ms() - rtc.true == -HOUR * ppm // 1000000
+    service.sync()
+    assert abs(service.drift_ppm - ppm) <= 1
+    # 第二次同步后按漂移率校正：再过半小时误差不超过2ms（不校正时为ppm * 1.8ms）
+    rtc.advance(HOUR // 2)
+    assert abs(service.now_ms() - rtc.true) <= 2
+    assert abs(service.correction_ms() - HOUR // 2 * ppm // 1000000) <= 2
+
+
+def test_short_interval_does_not_update_drift():
+    rtc = DriftingRTC(100)
+    service = _service(rtc)
+    service.sync()
+    rtc.advance(sync_time_service.MIN_DRIFT_INTERVAL_MS - 1000)
+    service.sync()
+    assert service.drift_ppm == 0 and service.drift_estimates == 0
+
+
+def test_drift_estimate_is_smoothed():
+    rtc = DriftingRTC(40)
+    service = _service(rtc)
+    service.sync()
+    rtc.advance(HOUR)
+    service.sync()
+    first = service.drift_ppm
+    # 漂移率突变（例如温度变化）：新估计只占1/4权重
+    rtc.ppm = 120
+    rtc.advance(HOUR)
+    service.sync()
+    assert abs(service.drift_ppm - (first * 3 + 120) // 4) <= 1
+    assert service.drift_estimates == 2
+
+
+def test_drift_saved_and_restored(tmp_path):
+    store = kvstore.KVStore(str(tmp_path / 'settings.kv'))
+    rtc = DriftingRTC(60)
+    service = _service(rtc, store)
+    service.sync()
+    rtc.advance(HOUR)
+    service.sync()
+    assert store.get_json(sync_time_service.DRIFT_KEY) == {'drift_ppm': service.drift_ppm}
+    # 重启后：第一次同步后立即开始补偿，不必等待第二次同步
+    rtc = DriftingRTC(60)
+    restarted = _service(rtc, store)
+    assert restarted.drift_ppm == service.drift_ppm and restarted.drift_estimates == 1
+    restarted.sync()
+    rtc.advance(HOUR)
+    assert abs(restarted.now_ms() - rtc.true) <= 2
+    store.close()
+
+
+def test_formatter_applies_correction():
+    rtc = DriftingRTC(100)
+    service = _service(rtc)
+    service.sync()
+    rtc.advance(HOUR)
+    service.sync()
+    rtc.advance(10 * HOUR)   # RTC累计慢约3.6秒
+    formatter = sync_time_service.TimeFormatter(service, clock=lambda: rtc.rtc // 1000)
+    expected = sync_time_service.TimeFormatter(service)
+    assert bytes(formatter.update()) == bytes(expected.set_time(rtc.true // 1000))
+
+
+def test_sync_async_updates_drift():
+    rtc = DriftingRTC(80)
+    service = _service(rtc)
+
+    async def main():
+        assert await service.sync_async()
+        rtc.advance(HOUR)
+        assert await service.sync_async()
+    asyncio.run(main())
+    assert abs(service.drift_ppm - 80) <= 1
+    assert service.sync_count == 2
@@ -0,0 +1,178 @@
+# test_uart_commands.py
+# uart_command_service：通过模拟UART输入字节，检查环形缓冲区回绕、过长的命令行、UTF-8解码错误，
+# 以及main注册的STATUS/SYNC/METRICS/LOG命令
+
+import importlib
+import json
+
+import pytest
+
+import kvstore
+import logger
+import machine
+import network
+import uart_command_service
+
+
+def _replies(uart):
+    lines = bytes(uart.written).decode('utf-8').split('\r\n')
+    uart.written = bytearray()
+    assert lines[-1] == ''
+    return lines[:-1]
+
+
+def _server(rx_size=256):
+    uart = machine.UART(1)
+    server = uart_command_service.CommandServer(uart, rx_size)
+    server.register('ECHO', lambda args: args)
+    return uart, server
+
+
+def test_ring_buffer_wraparound():
+    rx = uart_command_service.RingBuffer(8)
+    uart = machine.UART(1)
+    uart.feed(b'abcdef')
+    assert rx.fill_from(uart) == 6
+    assert rx.take(4) == b'abcd'
+    # 写入位置回绕到缓冲区开头：一次最多读到缓冲区末尾，再从开头继续
+    uart.feed(b'ghij\nXYZ')
+    assert rx.fill_from(uart) == 6
+    assert rx.count == rx.size and uart.any() == 2
+    assert rx.find(ord('\n')) == 6
+    assert rx.find(ord('Q')) == -1
+    assert rx.take(7) == b'efghij\n'
+    assert rx.start == 3 and rx.count == 1
+    assert rx.fill_from(uart) == 2
+    assert rx.take(3) == b'XYZ' and rx.count == 0
+
+
+def test_commands_across_wraparound_and_split_reads():
+    # 小缓冲区中反复回绕；命令分多次到达（包括在UTF-8字符中间断开）
+    uart, server = _server(rx_size=16)
+    expected = []
+    for i in range(20):
+        line = 'echo 你好{}\n'.format(i).encode('utf-8')
+        cut = 7 + i % 3       # 在"你"或"好"的字节中间断开
+        uart.feed(line[:cut])
+        assert server.poll() == 0
+        uart.feed(line[cut:])
+        assert server.poll() == 1
+        expected.append('OK 你好{}'.format(i))
+    assert _replies(uart) == expected
+    assert server.rx.count == 0 and server.metrics()['commands'] == 20
+
+
+def test_several_commands_in_one_read():
+    uart, server = _server()
+    uart.feed(b'ECHO a\r\necho b\n\nECHO c\n')
+    assert server.poll() == 4
+    assert _replies(uart) == ['OK a', 'OK b', 'OK c']
+
+
+@pytest.mark.parametrize('pieces', [
+    [b'x' * 40 + b'\nECHO ok\n'],
+    [b'x' * 20, b'x' * 20, b'x' * 20 + b'\nECHO ok\n'],      # 剩余部分在之后的轮询中到达
+    [b'x' * 16, b'\nECHO ok\n'],                            # 刚好填满缓冲区
+])
+def test_overlong_line_rejected_once(pieces):
+    uart, server = _server(rx_size=16)
+    for piece in pieces:
+        uart.feed(piece)
+        server.poll()
+    server.poll()      # 缓冲区满时UART中剩余的数据在下一次轮询时读取
+    # 过长的一行只回复一次错误，之后的命令正常处理
+    assert _replies(uart) == ['ERR 命令过长', 'OK ok']
+    assert server.metrics()['overflows'] == 1
+
+
+def test_invalid_utf8():
+    uart, server = _server()
+    uart.feed(b'ECHO \xff\xfe\nECHO \xe4\xbd\nECHO ok\n')
+    server.poll()
+    assert _replies(uart) == ['ERR 命令编码错误', 'ERR 命令编码错误', 'OK ok']
+    assert server.metrics()['errors'] == 2
+
+
+def test_unknown_command_and_handler_error():
+    uart, server = _server()
+
+    def fail(args):
+        raise ValueError('出错了\n第二行')
+
+    server.register('fail', fail)
+    uart.feed(b'NOPE\nFAIL\nECHO a\nb\n')
+    server.poll()
+    # 结果中的换行转义为\n，每个响应只占一行
+    assert _replies(uart) == ['ERR 未知命令: NOPE', 'ERR 出错了\\n第二行', 'OK a', 'ERR 未知命令: B']
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    # 在临时目录中导入main（导入config时会读取和迁移当前目录下的配置文件）
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(kvstore, '_default_store', None)
+    return importlib.import_module('main')
+
+
+@pytest.fixture
+def app(main):
+    uart = machine.UART(1)
+    server = uart_command_service.CommandServer(uart)
+    wlan = network.WLAN(network.STA_IF)
+    state = main.AppState(wlan)
+    main.register_commands(server, state)
+    return uart, server, state
+
+
+def _command(uart, server, line):
+    uart.feed(line)
+    server.poll()
+    return _replies(uart)
+
+
+def test_status_command(app):
+    uart, server, state = app
+    assert _command(uart, server, b'STATUS\n') == ['OK WiFi: 未连接, 本地时间: 未同步']
+    state.time_getter = lambda: '2024-01-01 08:00:00'
+    assert _command(uart, server, b'status\n') == ['OK WiFi: 未连接, 本地时间: 2024-01-01 08:00:00']
+
+
+def test_sync_command(app):
+    uart, server, state = app
+    assert not state.resync_request.is_set()
+    assert _command(uart, server, b'SYNC\n') == ['OK 已请求NTP同步']
+    assert state.resync_request.is_set()
+
+
+def test_metrics_command(app):
+    uart, server, state = app
+    _command(uart, server, b'STATUS\n')
+    reply = _command(uart, server, b'METRICS\n')
+    assert len(reply) == 1 and reply[0].startswith('OK ')
+    result = json.loads(reply[0][3:])
+    assert {'time', 'output', 'uart', 'wifi', 'boot', 'registry', 'log'} <= set(result)
+    assert result['uart']['commands'] == 1
+    assert result['time']['synced'] is False
+    assert 'wifi_supervisor' not in result and 'deepseek' not in result
+
+
+def test_log_command(app, monkeypatch):
+    uart, server, state = app
+    monkeypatch.setattr(logger, '_rates', {})
+    monkeypatch.setattr(logger, 'RATE_LIMIT', 1000)
+    logger.configure(buffer_size=4, console_level=logger.ERROR + 1)
+    try:
+        assert _command(uart, server, b'LOG\n') == ['OK 没有日志']
+        log = logger.get_logger('test')
+        for i in range(6):
+            log.info('记录 {}', i)
+        reply = _command(uart, server, b'LOG\n')
+        # 多条日志在一行响应中以\n分隔
+        assert len(reply) == 1
+        lines = reply[0][3:].split('\\n')
+        assert [line[-4:] for line in lines] == ['记录 2', '记录 3', '记录 4', '记录 5']
+        reply = _command(uart, server, b'LOG 2\n')
+        assert [line[-4:] for line in reply[0][3:].split('\\n')] == ['记录 4', '记录 5']
+        assert _command(uart, server, b'LOG x\n')[0].startswith('ERR ')
+    finally:
+        logger.configure(buffer_size=64, console_level=logger.INFO)
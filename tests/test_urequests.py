@@ -0,0 +1,532 @@
+# test_urequests.py
+# urequests：超时、Session的DNS缓存和空闲连接计时、响应体的分块读取和chunked解码
+
+import asyncio
+import errno
+import http.server as http_server
+import io
+import socket
+import threading
+import time
+
+import pytest
+
+import urequests
+from helpers import start_http_server
+
+
+def _start_stalled_server():
+    """接受连接但从不回复的TCP服务器，返回(socket, url)"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(4)
+    accepted = []
+
+    def serve():
+        while True:
+            try:
+                conn, addr = server.accept()
+            except OSError:
+                break
+            accepted.append(conn)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server, 'http://127.0.0.1:{}/'.format(server.getsockname()[1])
+
+
+def test_request_timeout_on_stalled_server():
+    server, url = _start_stalled_server()
+    try:
+        start = time.monotonic()
+        with pytest.raises(OSError):
+            urequests.get(url, timeout=0.3)
+        assert time.monotonic() - start < 2
+    finally:
+        server.close()
+
+
+def test_session_timeout_on_stalled_server():
+    server, url = _start_stalled_server()
+    session = urequests.Session(timeout=0.3)
+    try:
+        start = time.monotonic()
+        with pytest.raises(OSError):
+            session.get(url)
+        assert time.monotonic() - start < 2
+    finally:
+        session.close()
+        server.close()
+
+
+def test_session_caches_ignore_rtc_steps(monkeypatch):
+    server = start_http_server()
+    url = 'http://127.0.0.1:{}/status'.format(server.server_port)
+    session = urequests.Session()
+    try:
+        assert session.get(url).json() == {'ok': True}
+        # NTP校时把RTC从2000年跳到现在（或向回调整）不应使连接或DNS缓存失效
+        monkeypatch.setattr(time, 'time', lambda: 0)
+        assert session.get(url).json() == {'ok': True}
+        monkeypatch.setattr(time, 'time', lambda: 2000000000)
+        assert session.get(url).json() == {'ok': True}
+        assert session.connections_opened == 1
+        assert session.connections_reused == 2
+    finally:
+        session.close()
+        server.shutdown()
+
+
+def test_session_idle_timeout_uses_ticks(monkeypatch):
+    server = start_http_server()
+    url = 'http://127.0.0.1:{}/status'.format(server.server_port)
+    session = urequests.Session(idle_timeout=30)
+    now = [1000]
+    monkeypatch.setattr(time, 'ticks_ms', lambda: now[0])
+    try:
+        session.get(url).json()
+        now[0] += 29000
+        session.get(url).json()
+        assert session.connections_reused == 1
+        now[0] += 31000
+        session.get(url).json()
+        assert session.connections_opened == 2
+        assert session.connections_reused == 1
+    finally:
+        session.close()
+        server.shutdown()
+
+
+def _self_signed_context(tmp_path):
+    """用openssl生成localhost的自签名证书，返回(服务器TLS上下文, 信任该证书的客户端TLS上下文)"""
+    import shutil
+    import ssl
+    import subprocess
+    if shutil.which('openssl') is None:
+        pytest.skip('需要openssl生成自签名证书')
+    cert = str(tmp_path / 'cert.pem')
+    key = str(tmp_path / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-keyout', key, '-out', cert, '-subj', '/CN=localhost',
+                    '-addext', 'subjectAltName=DNS:localhost'],
+                   check=True, capture_output=True)
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert, key)
+    return server_context, ssl.create_default_context(cafile=cert)
+
+
+class _CloseHandler(http_server.BaseHTTPRequestHandler):
+    # /close: HTTP/1.1 + Connection: close；/eof: 没有Content-Length，响应体读到连接关闭为止；
+    # 其他路径: keep-alive
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        if self.path == '/eof':
+            self.close_connection = True
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            if self.path == '/close':
+                self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.mark.parametrize('path, read', [
+    ('/close', lambda resp: resp.json()),
+    ('/eof', lambda resp: resp.json()),
+    ('/keep', lambda resp: resp.close()),   # 不读响应体直接关闭，连接无法复用
+])
+def test_tls_session_resumed_without_pooled_connection(tmp_path, path, read):
+    server_context, client_context = _self_signed_context(tmp_path)
+    server = start_http_server(_CloseHandler)
+    server.socket = server_context.wrap_socket(server.socket, server_side=True)
+    url = 'https://localhost:{}{}'.format(server.server_port, path)
+    session = urequests.Session(ssl_context=client_context, timeout=5)
+    try:
+        for _ in range(4):
+            resp = session.get(url)
+            assert resp.status_code == 200
+            read(resp)
+        assert session.connections_opened == 4
+        assert session.connections_reused == 0
+        assert session.tls_resumed == 3
+    finally:
+        session.close()
+        server.shutdown()
+
+
+def _start_raw_server(segments, close=False, delay=0.002):
+    """
+    每个请求按segments分段发送原始响应（每段之间等待delay秒，使客户端分多次读到），
+    close为True时发送后关闭连接（模拟响应被截断），否则等待同一连接上的下一个请求；返回(socket, url)
+    """
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(4)
+
+    def handle(conn):
+        with conn:
+            pending = b''
+            while True:
+                while b'\r\n\r\n' not in pending:
+                    data = conn.recv(1024)
+                    if not data:
+                        return
+                    pending += data
+                pending = pending.split(b'\r\n\r\n', 1)[1]
+                for segment in segments:
+                    conn.sendall(segment)
+                    time.sleep(delay)
+                if close:
+                    return
+
+    def serve():
+        while True:
+            try:
+                conn, addr = server.accept()
+            except OSError:
+                break
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server, 'http://127.0.0.1:{}/'.format(server.getsockname()[1])
+
+
+CHUNKED_HEAD = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+
+
+def _split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 5, 1000])
+def test_chunked_extensions_and_split_reads(size):
+    # chunk大小行带扩展参数；响应按size字节分段到达（落在大小行、数据和\r\n中间）
+    body = b'4;name=value\r\nabcd\r\n6 ; x="y"\r\nefghij\r\n0\r\n\r\n'
+    server, url = _start_raw_server(_split(CHUNKED_HEAD + body, size))
+    try:
+        assert urequests.get(url, timeout=5).content == b'abcdefghij'
+    finally:
+        server.close()
+
+
+def test_chunked_trailer_keeps_connection_reusable():
+    # 最后一个chunk之后的trailer被完整读掉，下一个请求在同一连接上读到正确的响应
+    body = b'3\r\nabc\r\n0\r\nX-Checksum: 1234\r\nX-Other: 5\r\n\r\n'
+    server, url = _start_raw_server([CHUNKED_HEAD, body])
+    session = urequests.Session(timeout=5)
+    try:
+        for _ in range(3):
+            assert session.get(url).content == b'abc'
+        assert session.connections_opened == 1 and session.connections_reused == 2
+    finally:
+        session.close()
+        server.close()
+
+
+@pytest.mark.parametrize('body', [
+    b'a\r\nabc',                # chunk数据中间
+    b'3\r\nabc\r\n',            # chunk大小行之前
+    b'3\r\nabc\r\n5',           # chunk大小行中间
+])
+def test_truncated_chunked_stream_raises(body):
+    server, url = _start_raw_server([CHUNKED_HEAD, body], close=True)
+    try:
+        resp = urequests.get(url, timeout=5)
+        with pytest.raises(OSError):
+            resp.content
+        assert resp.raw is None
+    finally:
+        server.close()
+
+
+def test_truncated_content_length_raises():
+    server, url = _start_raw_server([b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nabc'], close=True)
+    try:
+        resp = urequests.get(url, timeout=5)
+        with pytest.raises(OSError):
+            resp.content
+    finally:
+        server.close()
+
+
+@pytest.mark.parametrize('head, body', [
+    (CHUNKED_HEAD, b'5\r\nhello\r\n7\r\n, world\r\n0\r\n\r\n'),
+    (b'HTTP/1.1 200 OK\r\nContent-Length: 12\r\n\r\n', b'hello, world'),
+    (b'HTTP/1.0 200 OK\r\n\r\n', b'hello, world'),     # 读到连接关闭为止
+])
+def test_readinto_short_buffer(head, body):
+    server, url = _start_raw_server([head, body], close=True)
+    try:
+        resp = urequests.get(url, timeout=5)
+        buf = bytearray(3)
+        parts = []
+        while True:
+            n = resp.readinto(buf)
+            if not n:
+                break
+            assert n <= 3
+            parts.append(bytes(buf[:n]))
+        assert b''.join(parts) == b'hello, world'
+        assert resp.readinto(buf) == 0 and resp.raw is None
+    finally:
+        server.close()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 256])
+def test_iter_lines_across_chunk_boundaries(chunk_size):
+    # 行跨越HTTP chunk和iter_content块的边界，\r\n和\n结尾，最后一行没有换行符
+    text = b'first line\r\nsecond\n\nthird\r\nlast'
+    body = b''.join(b'%x\r\n%s\r\n' % (len(part), part) for part in _split(text, 7)) + b'0\r\n\r\n'
+    server, url = _start_raw_server([CHUNKED_HEAD, body], close=True)
+    try:
+        resp = urequests.get(url, timeout=5)
+        lines = list(resp.iter_lines(chunk_size))
+        assert lines == [b'first line', b'second', b'', b'third', b'last']
+    finally:
+        server.close()
+
+
+class _FakeSocket:
+    """代替socket的流对象：记录每次write的数据，从reply中读取响应"""
+    def __init__(self, reply=b'HTTP/1.1 204 No Content\r\n\r\n'):
+        self.writes = []
+        self.reply = io.BytesIO(reply)
+        self.closed = False
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+        return len(data)
+
+    def readline(self):
+        return self.reply.readline()
+
+    def readinto(self, buf):
+        return self.reply.readinto(buf)
+
+    def close(self):
+        self.closed = True
+
+
+def _parse_head(data):
+    head, body = data.split(b'\r\n\r\n', 1)
+    lines = head.decode().split('\r\n')
+    return lines[0], [tuple(line.split(': ', 1)) for line in lines[1:]], body
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'data': 'x' * 10},
+    {'json': {'a': 1}},
+    {'data': b'x' * urequests._INLINE_BODY_MAX},
+    {'headers': {'X-Long': 'v' * 2000}},     # 超过请求头缓冲区的初始大小
+])
+def test_head_sent_in_one_write(kwargs):
+    s = _FakeSocket()
+    method = 'POST' if 'data' in kwargs or 'json' in kwargs else 'GET'
+    urequests._send_request(s, method, 'example.com', 'v1/x', kwargs.get('data'), kwargs.get('json'),
+                            kwargs.get('headers', {}), True)
+    # 请求行、所有头部和较小的请求体在同一次write中发出
+    assert len(s.writes) == 1
+    request_line, headers, body = _parse_head(s.writes[0])
+    assert request_line == '{} /v1/x HTTP/1.1'.format(method)
+    assert ('Host', 'example.com') in headers
+    if method == 'POST':
+        assert ('Content-Length', str(len(body))) in headers
+    else:
+        assert body == b'' and not [h for h in headers if h[0] == 'Content-Length']
+
+
+def test_large_body_written_after_head():
+    s = _FakeSocket()
+    data = b'y' * (urequests._INLINE_BODY_MAX + 1)
+    urequests._send_request(s, 'POST', 'example.com', '', data, None, {'Authorization': 'Bearer k'})
+    assert len(s.writes) == 2 and s.writes[1] == data
+    request_line, headers, body = _parse_head(s.writes[0])
+    assert request_line == 'POST / HTTP/1.0' and body == b''
+    assert ('Authorization', 'Bearer k') in headers
+    assert ('Content-Length', str(len(data))) in headers
+
+
+def test_response_headers_folded_duplicate_mixed_case():
+    reply = (b'HTTP/1.1 200 OK\r\n'
+             b'CONTENT-type: text/plain\r\n'
+             b'X-Folded: first\r\n'
+             b' second\r\n'
+             b'\tthird\r\n'
+             b'Cache-Control: no-cache\r\n'
+             b'cache-control: no-store\r\n'
+             b'Content-Length: 2\r\n'
+             b'content-length: 2\r\n'
+             b'\r\n'
+             b'ok')
+    s = _FakeSocket(reply)
+    resp = urequests._send_request(s, 'GET', 'example.com', '', None, None, {}, True)
+    assert resp.headers == {
+        'content-type': 'text/plain',
+        'x-folded': 'first second third',
+        'cache-control': 'no-cache, no-store',
+        'content-length': '2, 2',
+    }
+    assert resp.content == b'ok'
+
+
+def test_response_without_content_length():
+    # 没有Content-Length也不是chunked：读到连接关闭为止，连接不归还连接池
+    released = []
+    s = _FakeSocket(b'HTTP/1.1 200 OK\r\nConnection: keep-alive\r\n\r\nuntil close')
+    resp = urequests._send_request(s, 'GET', 'example.com', '', None, None, {}, True, released.append)
+    assert resp.content == b'until close'
+    assert released == [None] and s.closed
+    # 同样的响应带Content-Length时连接可以复用
+    released = []
+    s = _FakeSocket(b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello')
+    resp = urequests._send_request(s, 'GET', 'example.com', '', None, None, {}, True, released.append)
+    assert resp.content == b'hello'
+    assert released == [s] and not s.closed
+
+
+class _ScriptedServer:
+    """
+    按script逐个处理请求（所有连接共用）：'ok'回复200；'drop'读完请求后不回复直接关闭连接；
+    'stall'读完请求后不回复（客户端超时）；requests记录收到的每个请求行
+    """
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(4)
+        self.url = 'http://127.0.0.1:{}/'.format(self.sock.getsockname()[1])
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        f = conn.makefile('rb')
+        with conn:
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                length = 0
+                while True:
+                    header = f.readline()
+                    if header in (b'\r\n', b''):
+                        break
+                    if header.lower().startswith(b'content-length:'):
+                        length = int(header.split(b':')[1])
+                f.read(length)
+                self.requests.append(line.split()[0].decode())
+                action = self.script.pop(0) if self.script else 'ok'
+                if action == 'drop':
+                    return
+                if action == 'stall':
+                    time.sleep(2)
+                    return
+                conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+
+    def close(self):
+        self.sock.close()
+
+
+def _pool_connection(server, session):
+    # 第一个请求建立连接并归还连接池，服务器随后关闭这个空闲连接（下一个请求读完后不回复）
+    assert session.get(server.url).content == b'ok'
+
+
+def test_session_retries_get_on_stale_connection():
+    server = _ScriptedServer(['ok', 'drop'])
+    session = urequests.Session(timeout=5)
+    try:
+        _pool_connection(server, session)
+        # 状态行为空：GET可以安全重发
+        assert session.get(server.url).content == b'ok'
+        assert server.requests == ['GET', 'GET', 'GET']
+        assert session.connections_opened == 2
+    finally:
+        session.close()
+        server.close()
+
+
+def test_session_does_not_resend_post():
+    # POST的请求体已发出后连接关闭：服务器可能已处理，不重发
+    server = _ScriptedServer(['ok', 'drop'])
+    session = urequests.Session(timeout=5)
+    try:
+        _pool_connection(server, session)
+        with pytest.raises(OSError):
+            session.post(server.url, data=b'{"q": 1}')
+        assert server.requests == ['GET', 'POST']
+        assert session.connections_opened == 1
+    finally:
+        session.close()
+        server.close()
+
+
+def test_session_does_not_retry_after_timeout():
+    server = _ScriptedServer(['ok', 'stall'])
+    session = urequests.Session(timeout=0.3)
+    try:
+        _pool_connection(server, session)
+        with pytest.raises(OSError):
+            session.get(server.url)
+        assert server.requests == ['GET', 'GET']
+        assert session.connections_opened == 1
+    finally:
+        session.close()
+        server.close()
+
+
+def test_session_retries_when_head_write_fails():
+    # 空闲连接已被重置，发送请求头失败（请求没有发出）：POST也用新连接重发
+    class ResetSocket(_FakeSocket):
+        def write(self, data):
+            raise OSError(errno.ECONNRESET, 'ECONNRESET')
+
+    server = _ScriptedServer([])
+    session = urequests.Session(timeout=5)
+    try:
+        stale = ResetSocket()
+        session._pool[('http:',) + urequests._parse_url(server.url)[1:3]] = [(stale, None, time.ticks_ms())]
+        assert session.post(server.url, data=b'{"q": 1}').content == b'ok'
+        assert stale.closed and server.requests == ['POST']
+        assert session.connections_reused == 1 and session.connections_opened == 1
+    finally:
+        session.close()
+        server.close()
+
+
+@pytest.mark.parametrize('method, sent', [('GET', 3), ('POST', 2)])
+def test_session_async_retry_policy(method, sent):
+    server = _ScriptedServer(['ok', 'drop'])
+    session = urequests.Session(timeout=5)
+
+    async def main():
+        try:
+            resp = await session.request_async('GET', server.url)
+            assert await resp.read_all() == b'ok'
+            resp = await session.request_async(method, server.url, data=b'x')
+            return await resp.read_all()
+        finally:
+            session.close()
+
+    try:
+        if method == 'GET':
+            assert asyncio.run(main()) == b'ok'
+        else:
+            with pytest.raises(OSError):
+                asyncio.run(main())
+        assert len(server.requests) == sent
+    finally:
+        server.close()
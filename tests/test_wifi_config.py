@@ -0,0 +1,90 @@
+# test_wifi_config.py
+# wifi_config_service：连接结果的记录不在每次重试失败时写闪存、只追加变化的网络的统计，
+# 最近成功的顺序不依赖RTC
+
+import time
+
+import pytest
+
+import kvstore
+import wifi_config_service
+import wifi_service
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(kvstore, '_default_store', None)
+    monkeypatch.setattr(wifi_config_service, '_store', None)
+    monkeypatch.setattr(wifi_config_service, '_config', None)
+    monkeypatch.setattr(wifi_config_service, '_pending_failures', {})
+    wifi_config_service.save_wifi_config('a', 'pa', 1)
+    wifi_config_service.save_wifi_config('b', 'pb', 1)
+    store = kvstore.get_store()
+    yield store
+    store.close()
+
+
+def _profile(ssid):
+    for profile in wifi_config_service.load_networks():
+        if profile['ssid'] == ssid:
+            return profile
+
+
+def test_failures_written_with_next_success(store):
+    writes = store.writes
+    for _ in range(5):
+        wifi_config_service.record_connect_result('a', False)
+    assert store.writes == writes
+    assert _profile('a')['failures'] == 5
+    config_size = store.size
+    wifi_config_service.record_connect_result('b', True)
+    # 只追加a和b各自的统计记录，不重写配置
+    assert store.writes == writes + 2
+    assert store.get_json(wifi_config_service.CONFIG_KEY)['networks'][0] == {'ssid': 'a', 'password': 'pa', 'priority': 1}
+    assert store.size - config_size < 2 * 40
+    # 重新读取存储：失败次数已经和成功结果一起保存
+    wifi_config_service.invalidate_config()
+    assert _profile('a')['failures'] == 5
+    assert _profile('b')['successes'] == 1
+    wifi_config_service.record_connect_result('b', True)
+    assert _profile('a')['failures'] == 5
+
+
+def test_last_success_ignores_rtc(store, monkeypatch):
+    wifi_config_service.record_connect_result('a', True)
+    # NTP同步前RTC从2000年开始计时：之后的成功仍排在前面
+    monkeypatch.setattr(time, 'time', lambda: 0)
+    wifi_config_service.record_connect_result('b', True)
+    assert _profile('b')['last_success'] > _profile('a')['last_success']
+    scan = [(b'a', b'\x00' * 6, 1, -50, 3, False), (b'b', b'\x01' * 6, 6, -50, 3, False)]
+    ranked = wifi_service.rank_networks(scan, wifi_config_service.load_networks())
+    assert [profile['ssid'] for profile, ap in ranked] == ['b', 'a']
+
+
+def test_stats_stored_per_network(store):
+    wifi_config_service.record_connect_result('a', True)
+    size = store.size
+    for _ in range(10):
+        wifi_config_service.record_connect_result('a', True)
+    # 每次只追加一条小记录（旧版本每次重写整个配置，约400字节）
+    assert (store.size - size) / 10 < 40
+    assert _profile('a')['successes'] == 11 and _profile('b')['successes'] == 0
+    wifi_config_service.remove_network('a')
+    assert wifi_config_service.STATS_KEY_PREFIX + 'a' not in store
+    wifi_config_service.save_wifi_config('a', 'pa')
+    assert _profile('a')['successes'] == 0
+    wifi_config_service.record_connect_result('b', True)
+    wifi_config_service.clear_wifi_config()
+    assert store.keys() == []
+
+
+def test_legacy_stats_in_config(store):
+    # 旧版本的统计保存在配置的网络列表中：第一次记录后改用单独的键
+    config = store.get_json(wifi_config_service.CONFIG_KEY)
+    config['networks'][0].update(successes=3, failures=2, last_success=7)
+    store.put_json(wifi_config_service.CONFIG_KEY, config)
+    wifi_config_service.invalidate_config()
+    assert _profile('a')['successes'] == 3 and _profile('a')['last_success'] == 7
+    wifi_config_service.record_connect_result('a', True)
+    assert store.get_json(wifi_config_service.STATS_KEY_PREFIX + 'a') == [4, 2, 8]
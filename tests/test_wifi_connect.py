@@ -0,0 +1,97 @@
+# test_wifi_connect.py
+# wifi_service：快速连接先用缓存的BSSID和信道，失败后才扫描；扫描期间事件循环中的其他任务照常运行
+
+import asyncio
+import time
+
+import pytest
+
+import host_stubs
+import kvstore
+import network
+import wifi_config_service
+import wifi_service
+
+
+@pytest.fixture
+def wlan(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(kvstore, '_default_store', None)
+    monkeypatch.setattr(wifi_config_service, '_store', None)
+    monkeypatch.setattr(wifi_config_service, '_config', None)
+    monkeypatch.setattr(wifi_config_service, '_pending_failures', {})
+    monkeypatch.setattr(wifi_service, '_last_scan', [None, None])
+    monkeypatch.setattr(network.WLAN, 'networks', {'home': 'secret'})
+    monkeypatch.setattr(network.WLAN, 'connect_delay', 0.05)
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    scans = []
+    real_scan = wlan.scan
+
+    def counting_scan():
+        scans.append(time.monotonic())
+        return real_scan()
+
+    wlan.scan = counting_scan
+    wlan.scans = scans
+    yield wlan
+    kvstore.get_store().close()
+
+
+def _ticking(coro, interval=0.02):
+    """运行coro，同时每interval秒记录一次时刻；返回(结果, 相邻两次记录的最大间隔)"""
+    async def scenario():
+        stamps = []
+
+        async def ticker():
+            while True:
+                stamps.append(time.monotonic())
+                await asyncio.sleep(interval)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        result = await coro
+        task.cancel()
+        stamps.append(time.monotonic())
+        return result, max(b - a for a, b in zip(stamps, stamps[1:]))
+    return asyncio.run(scenario())
+
+
+def test_fast_connect_skips_scan(wlan):
+    stats = {}
+    assert asyncio.run(wifi_service.wifi_connect_fast(wlan, 'home', 'secret', stats=stats))
+    assert len(wlan.scans) == 1 and not stats['fast']
+    assert wifi_config_service.load_fast_connect('home') is not None
+    # 重启后用缓存的BSSID和信道连接，不扫描
+    wlan.disconnect()
+    wifi_service._last_scan[:] = [None, None]
+    stats = {}
+    assert asyncio.run(wifi_service.wifi_connect_fast(wlan, 'home', 'secret', stats=stats))
+    assert len(wlan.scans) == 1 and stats['fast'] and 'scan_ms' not in stats
+
+
+def test_stale_fast_cache_falls_back_to_scan(wlan, monkeypatch):
+    wifi_config_service.save_fast_connect('home', b'\x00\x11\x22\x33\x44\x55', 6,
+                                          ('192.168.1.9', '255.255.255.0', '192.168.1.1', '192.168.1.1'))
+    stats = {}
+    assert asyncio.run(wifi_service.wifi_connect_fast(wlan, 'home', 'secret', stats=stats))
+    assert stats['fast'] and len(wlan.scans) == 1
+    # 缓存更新为扫描到的AP
+    assert wifi_config_service.load_fast_connect('home')['bssid'] == host_stubs.BSSID
+
+
+def test_scan_does_not_block_loop(wlan, monkeypatch):
+    # 扫描耗时0.5秒：期间每20ms一次的任务不中断
+    monkeypatch.setattr(network.WLAN, 'scan_delay', 0.5)
+    stats = {}
+    connected, gap = _ticking(wifi_service.wifi_connect_fast(wlan, 'home', 'secret', stats=stats))
+    assert connected and stats['scan_ms'] >= 500
+    assert gap < 0.2
+
+
+def test_recent_scan_reused(wlan):
+    results = asyncio.run(wifi_service.wifi_scan(wlan))
+    assert asyncio.run(wifi_service.wifi_scan(wlan)) is results
+    assert len(wlan.scans) == 1
+    asyncio.run(wifi_service.wifi_scan(wlan, 0))
+    assert len(wlan.scans) == 2
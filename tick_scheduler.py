@@ -0,0 +1,169 @@
+# tick_scheduler.py
+# 按时间边界对齐的周期输出调度器：输出时刻对齐到整秒（或整周期）边界，
+# 用ticks_ms计时，不受循环体执行时间影响，不会累积漂移，也不会重复或跳过某一秒
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# 每隔多少秒按NTP校准时间重新对齐一次（对齐计算使用毫秒，ESP32上会分配大整数）
+REALIGN_INTERVAL_S = 60
+
+if hasattr(asyncio, 'sleep_ms'):
+    _sleep_ms = asyncio.sleep_ms
+else:
+    def _sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+class TickScheduler:
+    """
+    对齐到时间边界的周期调度器
+
+    每个输出槽位对应一个确定的时间（秒 + 毫秒，间隔为1000 // rate_hz毫秒），
+    槽位之间用ticks_add推进目标tick，因此输出间隔均匀；每REALIGN_INTERVAL_S秒或重新同步后
+    按TimeService的时间修正目标tick，时钟跳变超过一个周期时重新对齐到下一个边界
+
+    参数:
+        service: TimeService对象（提供经过漂移校正的时间now_ms()）
+        rate_hz: 每秒输出次数，必须能整除1000（例如1或10）
+        ticks_ms: 毫秒tick函数，测试时可替换为模拟时钟
+    """
+    def __init__(self, service, rate_hz=1, ticks_ms=time.ticks_ms):
+        if rate_hz <= 0 or 1000 % rate_hz:
+            raise ValueError('rate_hz必须能整除1000')
+        self.service = service
+        self.period_ms = 1000 // rate_hz
+        self.ticks_ms = ticks_ms
+        self.slot_s = 0        # 下一个槽位的UTC时间（秒）
+        self.slot_ms = 0       # 下一个槽位的毫秒部分
+        self.utc_s = 0         # 上一次take()取出的槽位（UTC秒和毫秒）
+        self.ms = 0
+        self._target = None    # 下一个槽位的目标tick
+        self._realign_at = 0
+        self._sync_count = -1
+        self.emitted = 0
+        self.missed = 0        # 因执行延迟超过一个周期而跳过的槽位数
+        self.realigned = 0     # 时钟跳变导致的重新对齐次数
+        self.jitter_max_ms = 0
+        self.jitter_total_ms = 0
+
+    def align(self):
+        """按当前校准时间计算下一个槽位的目标tick"""
+        period = self.period_ms
+        now_ticks = self.ticks_ms()
+        wall = self.service.now_ms()
+        self._sync_count = self.service.sync_count
+        if self._target is not None:
+            lead = self.slot_s * 1000 + self.slot_ms - wall
+            if -period < lead < 2 * period:
+                # 保持槽位连续，只修正目标tick
+                self._target = time.ticks_add(now_ticks, lead)
+                self._realign_at = self.slot_s + REALIGN_INTERVAL_S
+                return
+            self.realigned += 1
+        wall = (wall // period + 1) * period
+        self.slot_s = wall // 1000
+        self.slot_ms = wall % 1000
+        self._target = time.ticks_add(now_ticks, wall - self.service.now_ms())
+        self._realign_at = self.slot_s + REALIGN_INTERVAL_S
+
+    def _advance(self, slots):
+        self._target = time.ticks_add(self._target, slots * self.period_ms)
+        ms = self.slot_ms + slots * self.period_ms
+        self.slot_s += ms // 1000
+        self.slot_ms = ms % 1000
+
+    def next_delay(self):
+        """
+        返回:
+            距下一个槽位的毫秒数，<=0表示已经到时（应调用take()）
+        """
+        if (self._target is None or self.slot_s >= self._realign_at
+                or self.service.sync_count != self._sync_count):
+            self.align()
+        return time.ticks_diff(self._target, self.ticks_ms())
+
+    def take(self):
+        """
+        取出已到时的槽位并推进到下一个槽位：槽位时间保存在utc_s和ms属性中（不创建元组，不分配内存）
+        """
+        late = -time.ticks_diff(self._target, self.ticks_ms())
+        if late < 0:
+            late = 0
+        if late >= self.period_ms:
+            # 错过了整个周期：跳过这些槽位，保证输出不重复、不堆积
+            skipped = late // self.period_ms
+            self.missed += skipped
+            self._advance(skipped)
+            late -= skipped * self.period_ms
+        self.emitted += 1
+        self.jitter_total_ms += late
+        if late > self.jitter_max_ms:
+            self.jitter_max_ms = late
+        self.utc_s = self.slot_s
+        self.ms = self.slot_ms
+        self._advance(1)
+
+    async def wait(self):
+        """
+        等待下一个槽位
+
+        返回:
+            (utc_s, ms) 槽位对应的UTC时间
+        """
+        while True:
+            delay = self.next_delay()
+            if delay <= 0:
+                break
+            await _sleep_ms(delay)
+        self.take()
+        return self.utc_s, self.ms
+
+    async def run(self, emit):
+        """
+        按槽位循环调用emit(utc_s, ms)：每个槽位只等待asyncio.sleep_ms()，
+        不创建协程或元组（与output()配合时整个输出路径不分配堆内存）
+
+        参数:
+            emit: 输出函数
+        """
+        while True:
+            delay = self.next_delay()
+            if delay > 0:
+                await _sleep_ms(delay)
+                continue
+            self.take()
+            emit(self.utc_s, self.ms)
+
+    def metrics(self):
+        """
+        返回:
+            调度统计字典（抖动为实际输出时刻相对目标时刻的延迟）
+        """
+        return {
+            'period_ms': self.period_ms,
+            'emitted': self.emitted,
+            'missed': self.missed,
+            'realigned': self.realigned,
+            'jitter_avg_ms': self.jitter_total_ms / self.emitted if self.emitted else 0,
+            'jitter_max_ms': self.jitter_max_ms,
+        }
+
+def output(formatter, uart):
+    """
+    创建TickScheduler.run()使用的输出函数：把槽位时间写入formatter的预分配缓冲区并通过uart输出
+
+    参数:
+        formatter: sync_time_service.TimeFormatter或time_frame.TimeFrameEncoder
+        uart: 提供write()的串口对象
+
+    返回:
+        emit(utc_s, ms)函数（每次调用不分配堆内存）
+    """
+    def emit(utc_s, ms):
+        formatter.set_time(utc_s, ms)
+        uart.write(formatter.buf)
+    return emit
@@ -0,0 +1,192 @@
+# time_frame.py
+# UART二进制时间帧：编码（ESP32端）和解码（接收端，MicroPython或CPython均可使用）
+#
+# 帧格式（10字节，多字节字段为小端）：
+#     0     SYNC_BYTE (0xA5)
+#     1-4   Unix时间（秒，uint32）
+#     5-6   毫秒（uint16，0-999）
+#     7     时区偏移（int8，单位15分钟）
+#     8     标志：bit0 已同步，bit1 需要重新同步（超过同步间隔），bit2 已做漂移补偿，
+#           bit4-7 精度等级n（时间误差上限约为2^n毫秒，根据上次同步的往返延迟估算）
+#     9     CRC-8（多项式0x07，初值0，覆盖字节0-8）
+
+import time
+
+SYNC_BYTE = 0xA5
+FRAME_SIZE = 10
+
+FLAG_SYNCED = 0x01
+FLAG_STALE = 0x02
+FLAG_DRIFT_COMPENSATED = 0x04
+
+# 本地纪元与Unix纪元的秒数差：ESP32等端口的纪元为2000年
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+_EPOCH_OFFSET_BYTES = bytes((EPOCH_OFFSET & 0xff, (EPOCH_OFFSET >> 8) & 0xff,
+                             (EPOCH_OFFSET >> 16) & 0xff, EPOCH_OFFSET >> 24))
+
+# 帧状态（标志和精度）每隔多少秒刷新一次（需要读取毫秒时钟，ESP32上会分配大整数）
+STATUS_REFRESH_S = 60
+
+def _make_crc8_table():
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xff if crc & 0x80 else (crc << 1) & 0xff
+        table[i] = crc
+    return bytes(table)
+
+_CRC8_TABLE = _make_crc8_table()
+
+def crc8(data, start=0, stop=None):
+    """
+    计算CRC-8（多项式0x07）
+
+    参数:
+        data: bytes/bytearray/memoryview
+        start, stop: 计算范围
+
+    返回:
+        CRC值（0-255）
+    """
+    if stop is None:
+        stop = len(data)
+    crc = 0
+    table = _CRC8_TABLE
+    for i in range(start, stop):
+        crc = table[crc ^ data[i]]
+    return crc
+
+def accuracy_class(uncertainty_ms):
+    """
+    返回:
+        满足2^n >= uncertainty_ms的最小n（最大15）
+    """
+    n = 0
+    while n < 15 and (1 << n) < uncertainty_ms:
+        n += 1
+    return n
+
+class TimeFrameEncoder:
+    """
+    时间帧编码器：与sync_time_service.TimeFormatter接口相同（set_time()写入预分配的buf），
+    可以直接替换文本输出；编码过程不分配堆内存
+
+    参数:
+        service: TimeService对象（提供时区偏移和同步状态）
+    """
+    def __init__(self, service):
+        self.service = service
+        self.buf = bytearray(FRAME_SIZE)
+        self.buf[0] = SYNC_BYTE
+        self.view = memoryview(self.buf)
+        self._refresh_at = 0
+        self._sync_count = -1
+
+    def _refresh_status(self, utc_s):
+        service = self.service
+        flags = 0
+        if service.synced():
+            flags |= FLAG_SYNCED
+            if service.due():
+                flags |= FLAG_STALE
+            if service.drift_ppm:
+                flags |= FLAG_DRIFT_COMPENSATED
+            # 误差上限：往返延迟的一半加上尚未校正的漂移（按1ppm估计）
+            uncertainty = service.last_delay_ms // 2 + 1
+            uncertainty += (service.clock() - service.last_sync_ms) // 1000000
+            flags |= accuracy_class(uncertainty) << 4
+        self.buf[8] = flags
+        self.buf[7] = int(service.timezone_offset * 4) & 0xff
+        self._sync_count = service.sync_count
+        self._refresh_at = utc_s + STATUS_REFRESH_S
+
+    def set_time(self, utc_s, ms=0):
+        """
+        把指定时间编码为一帧
+
+        参数:
+            utc_s: UTC时间（本地纪元起的秒数）
+            ms: 毫秒
+
+        返回:
+            帧的memoryview
+        """
+        if utc_s >= self._refresh_at or self.service.sync_count != self._sync_count:
+            self._refresh_status(utc_s)
+        buf = self.buf
+        # 逐字节加上纪元差，避免在ESP32上产生超过小整数范围的Unix时间
+        carry = 0
+        value = utc_s
+        offset = _EPOCH_OFFSET_BYTES
+        for i in range(4):
+            byte = (value & 0xff) + offset[i] + carry
+            buf[1 + i] = byte & 0xff
+            carry = byte >> 8
+            value >>= 8
+        buf[5] = ms & 0xff
+        buf[6] = ms >> 8
+        buf[9] = crc8(buf, 0, 9)
+        return self.view
+
+def decode(frame):
+    """
+    解码一帧
+
+    参数:
+        frame: 10字节的帧
+
+    返回:
+        (unix_s, ms, tz_minutes, flags) 元组
+
+    异常:
+        ValueError: 长度、同步字节或CRC错误
+    """
+    if len(frame) != FRAME_SIZE or frame[0] != SYNC_BYTE:
+        raise ValueError('无效的时间帧')
+    if crc8(frame, 0, 9) != frame[9]:
+        raise ValueError('时间帧CRC错误')
+    unix_s = frame[1] | (frame[2] << 8) | (frame[3] << 16) | (frame[4] << 24)
+    ms = frame[5] | (frame[6] << 8)
+    tz = frame[7]
+    if tz >= 128:
+        tz -= 256
+    return unix_s, ms, tz * 15, frame[8]
+
+class FrameDecoder:
+    """
+    流式解码器：从UART读取的任意分段数据中找出完整的帧，
+    同步字节或CRC不匹配时丢弃一个字节后重新查找帧头
+    """
+    def __init__(self):
+        self._buf = bytearray()
+        self.frames = 0
+        self.errors = 0
+
+    def feed(self, data):
+        """
+        输入接收到的数据
+
+        返回:
+            本次解码出的帧列表 [(unix_s, ms, tz_minutes, flags), ...]
+        """
+        buf = self._buf
+        buf.extend(data)
+        result = []
+        pos = 0
+        while len(buf) - pos >= FRAME_SIZE:
+            if buf[pos] != SYNC_BYTE:
+                pos += 1
+                continue
+            frame = buf[pos:pos + FRAME_SIZE]
+            try:
+                result.append(decode(frame))
+            except ValueError:
+                self.errors += 1
+                pos += 1
+                continue
+            self.frames += 1
+            pos += FRAME_SIZE
+        if pos:
+            self._buf = buf[pos:]
+        return result
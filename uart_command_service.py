@@ -0,0 +1,208 @@
+# uart_command_service.py
+# UART命令服务：从UART读取以换行结尾的命令行，分发给注册的处理函数，并把结果写回UART
+#
+# 协议（文本行，UTF-8）：
+#     请求:  <命令> [参数]\n          命令不区分大小写，例如 "STATUS"、"ASK 今天天气怎么样"
+#     响应:  OK <结果>\r\n 或 ERR <错误信息>\r\n
+#     异步结果（如ASK的回复）稍后以 <命令> <结果>\r\n 的形式发送
+#     结果中的换行转义为 \n 两个字符，保证每个响应只占一行
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+if hasattr(asyncio, 'sleep_ms'):
+    _sleep_ms = asyncio.sleep_ms
+else:
+    def _sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+class RingBuffer:
+    """
+    固定大小的接收环形缓冲区，直接从UART读入预分配的bytearray
+
+    参数:
+        size: 缓冲区字节数（也是单条命令的最大长度）
+    """
+    def __init__(self, size=256):
+        self.size = size
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.count = 0
+
+    def fill_from(self, uart):
+        """
+        读取uart中已到达的数据（不阻塞）
+
+        返回:
+            读取的字节数
+        """
+        total = 0
+        while self.count < self.size:
+            available = uart.any()
+            if not available:
+                break
+            end = (self.start + self.count) % self.size
+            limit = min(self.size - end, self.size - self.count, available)
+            n = uart.readinto(self.view[end:end + limit])
+            if not n:
+                break
+            self.count += n
+            total += n
+        return total
+
+    def find(self, byte):
+        """
+        返回:
+            byte相对缓冲区开头的位置，不存在时返回-1
+        """
+        buf = self.buf
+        pos = self.start
+        for i in range(self.count):
+            if buf[pos] == byte:
+                return i
+            pos += 1
+            if pos == self.size:
+                pos = 0
+        return -1
+
+    def take(self, n):
+        """取出开头的n个字节"""
+        end = self.start + n
+        if end <= self.size:
+            data = bytes(self.view[self.start:end])
+        else:
+            data = bytes(self.view[self.start:]) + bytes(self.view[:end - self.size])
+        self.discard(n)
+        return data
+
+    def discard(self, n):
+        """丢弃开头的n个字节"""
+        self.start = (self.start + n) % self.size
+        self.count -= n
+
+class CommandServer:
+    """
+    UART命令服务器，作为协程任务与时间输出等任务并发运行
+
+    参数:
+        uart: UART对象（需要支持any()、readinto()、write()）
+        rx_size: 接收环形缓冲区大小（字节）
+        poll_ms: 没有数据时的轮询间隔（毫秒）
+    """
+    def __init__(self, uart, rx_size=256, poll_ms=10):
+        self.uart = uart
+        self.rx = RingBuffer(rx_size)
+        self.poll_ms = poll_ms
+        self.handlers = {}
+        self.commands = 0
+        self.errors = 0
+        self.overflows = 0        # 超过缓冲区大小而被丢弃的命令行数
+        self._skipping = False    # 正在丢弃过长命令行的剩余部分
+        self.total_latency_us = 0
+        self.max_latency_us = 0
+
+    def register(self, name, handler):
+        """
+        注册命令
+
+        参数:
+            name: 命令名（不区分大小写）
+            handler: 处理函数handler(args)，返回结果字符串；抛出异常时回复ERR
+        """
+        self.handlers[name.upper()] = handler
+
+    def send(self, kind, text):
+        """发送一行响应：<kind> <text>"""
+        text = str(text).replace('\r', '').replace('\n', '\\n')
+        self.uart.write('{} {}\r\n'.format(kind, text).encode('utf-8'))
+
+    def dispatch(self, line):
+        """
+        执行一行命令并回复，记录从收到命令到写出回复的耗时
+
+        参数:
+            line: 命令行（bytes，不含换行）
+        """
+        start = time.ticks_us()
+        try:
+            line = line.decode('utf-8').strip()
+        except UnicodeError:
+            line = None
+        if not line:
+            if line is None:
+                self.errors += 1
+                self.send('ERR', '命令编码错误')
+            return
+        parts = line.split(None, 1)
+        name = parts[0].upper()
+        args = parts[1] if len(parts) > 1 else ''
+        handler = self.handlers.get(name)
+        if handler is None:
+            self.errors += 1
+            self.send('ERR', '未知命令: {}'.format(name))
+        else:
+            try:
+                self.send('OK', handler(args))
+            except Exception as e:
+                self.errors += 1
+                self.send('ERR', e)
+        latency = time.ticks_diff(time.ticks_us(), start)
+        self.commands += 1
+        self.total_latency_us += latency
+        if latency > self.max_latency_us:
+            self.max_latency_us = latency
+
+    def poll(self):
+        """
+        读取UART并处理所有完整的命令行（不阻塞）
+
+        返回:
+            处理的命令数
+        """
+        rx = self.rx
+        rx.fill_from(self.uart)
+        handled = 0
+        while True:
+            end = rx.find(10)  # '\n'
+            if end < 0:
+                if rx.count == rx.size:
+                    # 缓冲区已满仍没有换行：丢弃这一行（包括之后到达的剩余部分）
+                    rx.discard(rx.count)
+                    if not self._skipping:
+                        self._skipping = True
+                        self.overflows += 1
+                        self.send('ERR', '命令过长')
+                    rx.fill_from(self.uart)
+                    continue
+                return handled
+            if self._skipping:
+                rx.discard(end + 1)
+                self._skipping = False
+                continue
+            line = rx.take(end + 1)
+            self.dispatch(line[:-1])
+            handled += 1
+
+    async def run(self):
+        """后台任务：轮询UART并处理命令"""
+        while True:
+            self.poll()
+            await _sleep_ms(self.poll_ms)
+
+    def metrics(self):
+        """
+        返回:
+            命令统计字典
+        """
+        return {
+            'commands': self.commands,
+            'errors': self.errors,
+            'overflows': self.overflows,
+            'latency_avg_us': self.total_latency_us // self.commands if self.commands else 0,
+            'latency_max_us': self.max_latency_us,
+        }
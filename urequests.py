@@ -1,30 +1,166 @@
-
 # urequests.py
 # MicroPython HTTP请求库（简化版）
 # 允许在ESP32等设备上用类似requests的方式进行HTTP通信
 # 来源：https://github.com/micropython/micropython-lib/blob/master/python-ecosys/urequests/urequests.py
 
-import usocket  # MicroPython的socket库，用于网络通信
-import ujson    # MicroPython的json库，用于处理JSON数据
+try:
+    import usocket  # MicroPython的socket库，用于网络通信
+except ImportError:
+    import socket as usocket
+try:
+    import ujson    # MicroPython的json库，用于处理JSON数据
+except ImportError:
+    import json as ujson
+import time
+try:
+    import errno
+except ImportError:
+    import uerrno as errno
+try:
+    import ssl      # TLS支持（MicroPython旧版本为ussl）
+except ImportError:
+    try:
+        import ussl as ssl
+    except ImportError:
+        ssl = None
+try:
+    import uasyncio as asyncio  # request_async()使用的asyncio流
+except ImportError:
+    import asyncio
+import metrics
+
+# 请求各阶段的耗时（微秒）：DNS解析、TCP连接、TLS握手、请求发出后等待响应状态行
+_dns_time = metrics.histogram('http_client_dns_us')
+_connect_time = metrics.histogram('http_client_connect_us')
+_tls_time = metrics.histogram('http_client_tls_us')
+_response_time = metrics.histogram('http_client_response_us')
 
 # HTTP响应对象，封装了底层socket和常用属性
+# status_code、reason为状态行内容，headers为响应头字典（键为小写字符串）
+# 响应体可以一次性读取（content/text/json），也可以用iter_content()/iter_lines()/readinto()
+# 分块读取，内存占用与响应大小无关
 class Response:
-    def __init__(self, sock):
+    def __init__(self, sock, content_length=None, chunked=False, release=None, reusable=False):
         self.raw = sock         # 原始socket对象
         self._cached = None    # 缓存读取的内容
+        self._remaining = content_length  # 剩余响应体字节数，None表示读到连接关闭为止
+        self._chunked = chunked  # 是否为Transfer-Encoding: chunked
+        self._chunk_left = 0    # 当前chunk剩余字节数
+        # 响应结束时调用一次的回调release(sock)（Session用于保存TLS会话和归还连接）：
+        # sock为可复用的连接，连接将被关闭时为None
+        self._release = release
+        self._reusable = reusable  # 响应体读完后连接是否可以复用（keep-alive）
 
     def close(self):
-        # 关闭socket连接
+        # 关闭socket连接（响应体未读完的连接无法复用）
+        self._finish(None)
         if self.raw:
             self.raw.close()
             self.raw = None
 
+    def readinto(self, buf):
+        # 读取响应体到调用方提供的缓冲区，返回读取的字节数，0表示响应体已读完
+        if self.raw is None or not len(buf):
+            return 0
+        mv = memoryview(buf)
+        if self._chunked:
+            if self._chunk_left == 0:
+                self._chunk_left = _chunk_size(self.raw.readline())
+                if self._chunk_left == 0:
+                    # 最后一个chunk，跳过trailer
+                    while True:
+                        line = self.raw.readline()
+                        if not line or line == b"\r\n":
+                            break
+                    self._done()
+                    return 0
+            n = self._read_some(mv[:min(len(mv), self._chunk_left)])
+            self._chunk_left -= n
+            if self._chunk_left == 0:
+                self.raw.readline()  # chunk数据后的\r\n
+            return n
+        if self._remaining is not None:
+            if self._remaining == 0:
+                self._done()
+                return 0
+            n = self._read_some(mv[:min(len(mv), self._remaining)])
+            self._remaining -= n
+            if self._remaining == 0:
+                self._done()
+            return n
+        n = self.raw.readinto(mv)
+        if not n:
+            self._done()
+            return 0
+        return n
+
+    def _read_some(self, mv):
+        n = self.raw.readinto(mv)
+        if not n:
+            raise OSError("连接意外关闭")
+        return n
+
+    def _done(self):
+        # 响应体已读完，可复用的连接归还连接池
+        if self._reusable and self.raw is not None:
+            raw = self.raw
+            self.raw = None
+            self._finish(raw)
+        self.close()
+
+    def _finish(self, sock):
+        # 在关闭socket之前调用release（之后无法再读取TLS会话）
+        release = self._release
+        if release is not None:
+            self._release = None
+            release(sock)
+
+    def iter_content(self, chunk_size=256):
+        # 逐块返回响应体，每块最多chunk_size字节
+        buf = bytearray(chunk_size)
+        while True:
+            n = self.readinto(buf)
+            if not n:
+                break
+            yield bytes(buf[:n])
+
+    def iter_lines(self, chunk_size=256, delimiter=b"\n"):
+        # 逐行返回响应体（不含换行符），只缓存未完成的一行
+        pending = b""
+        for chunk in self.iter_content(chunk_size):
+            pending += chunk
+            while True:
+                i = pending.find(delimiter)
+                if i < 0:
+                    break
+                line = pending[:i]
+                pending = pending[i + len(delimiter):]
+                if line[-1:] == b"\r":
+                    line = line[:-1]
+                yield line
+        if pending:
+            yield pending
+
     @property
     def content(self):
-        # 获取响应的原始字节内容
+        # 获取响应的原始字节内容（读取出错时同样关闭连接）
         if self._cached is None:
-            self._cached = self.raw.read()
-            self.close()
+            try:
+                if self._remaining is not None and not self._chunked:
+                    # 已知长度时只分配一次缓冲区
+                    buf = bytearray(self._remaining)
+                    mv = memoryview(buf)
+                    pos = 0
+                    while pos < len(buf):
+                        pos += self.readinto(mv[pos:])
+                    self._cached = bytes(buf)
+                else:
+                    data = bytearray()
+                    for chunk in self.iter_content(1024):
+                        data.extend(chunk)
+                    self._cached = bytes(data)
+            finally:
+                self.close()
         return self._cached
 
     @property
@@ -36,9 +172,191 @@ class Response:
         # 以JSON格式解析响应内容
         return ujson.loads(self.content)
 
-# 发送HTTP请求的主函数
-def request(method, url, data=None, json=None, headers={}, stream=None):
-    # 解析URL，获取协议、主机、路径
+# request_async()返回的响应对象：status_code、reason、headers与Response相同，
+# 响应体用await read()/readline()/read_all()读取，等待数据时让出事件循环，不阻塞其他任务
+class AsyncResponse:
+    def __init__(self, reader, writer, content_length=None, chunked=False, timeout=None,
+                 release=None, reusable=False):
+        self._reader = reader   # 流对象（asyncio.StreamReader）
+        self._writer = writer
+        self._remaining = content_length  # 剩余响应体字节数，None表示读到连接关闭为止
+        self._chunked = chunked
+        self._chunk_left = 0
+        self._timeout = timeout  # 每次读取的超时（秒）
+        self._pending = b""     # readline()已读入、尚未返回的数据
+        # 与Response相同：响应结束时调用一次release((reader, writer))，连接将被关闭时参数为None
+        self._release = release
+        self._reusable = reusable
+
+    def close(self):
+        # 关闭连接（响应体未读完的连接无法复用）
+        self._finish(None)
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    def _done(self):
+        if self._reusable and self._writer is not None:
+            streams = (self._reader, self._writer)
+            self._reader = self._writer = None
+            self._finish(streams)
+        self.close()
+
+    def _finish(self, streams):
+        release = self._release
+        if release is not None:
+            self._release = None
+            release(streams)
+
+    async def _readline(self):
+        return await _wait(self._reader.readline(), self._timeout)
+
+    async def _read_some(self, n):
+        data = await _wait(self._reader.read(n), self._timeout)
+        if not data:
+            raise OSError("连接意外关闭")
+        return data
+
+    async def read(self, size=256):
+        # 返回最多size字节的响应体，b""表示响应体已读完
+        if self._reader is None:
+            return b""
+        if self._chunked:
+            if self._chunk_left == 0:
+                self._chunk_left = _chunk_size(await self._readline())
+                if self._chunk_left == 0:
+                    # 最后一个chunk，跳过trailer
+                    while True:
+                        line = await self._readline()
+                        if not line or line == b"\r\n":
+                            break
+                    self._done()
+                    return b""
+            data = await self._read_some(min(size, self._chunk_left))
+            self._chunk_left -= len(data)
+            if self._chunk_left == 0:
+                await self._readline()  # chunk数据后的\r\n
+            return data
+        if self._remaining is not None:
+            if self._remaining == 0:
+                self._done()
+                return b""
+            data = await self._read_some(min(size, self._remaining))
+            self._remaining -= len(data)
+            if self._remaining == 0:
+                self._done()
+            return data
+        data = await _wait(self._reader.read(size), self._timeout)
+        if not data:
+            self._done()
+        return data
+
+    async def readline(self):
+        # 返回响应体的下一行（不含换行符），None表示响应体已读完
+        while True:
+            i = self._pending.find(b"\n")
+            if i >= 0:
+                line = self._pending[:i]
+                self._pending = self._pending[i + 1:]
+                if line[-1:] == b"\r":
+                    line = line[:-1]
+                return line
+            data = await self.read()
+            if not data:
+                line = self._pending
+                self._pending = b""
+                return line or None
+            self._pending += data
+
+    async def read_all(self):
+        # 读取剩余的全部响应体
+        data = bytearray(self._pending)
+        self._pending = b""
+        while True:
+            chunk = await self.read(1024)
+            if not chunk:
+                break
+            data.extend(chunk)
+        return bytes(data)
+
+_default_context = None
+
+# 默认TLS上下文（CPython下校验证书；MicroPython使用ssl.wrap_socket，不校验证书）
+def _tls_context():
+    global _default_context
+    if _default_context is None and hasattr(ssl, "create_default_context"):
+        _default_context = ssl.create_default_context()
+    return _default_context
+
+# 建立TCP连接（tls为True时进行TLS握手），返回(流对象, TLS socket)
+# 流对象支持read/readinto/readline/write；TLS socket用于读取会话以便下次恢复，非TLS连接为None
+# session为之前连接保存的TLS会话，支持时用于会话恢复（省去完整握手）
+# timeout为连接、握手和之后每次读写的超时（秒），None表示一直等待
+def _open_stream(ai, host=None, tls=False, context=None, session=None, timeout=None):
+    s = usocket.socket(ai[0], ai[1], ai[2])
+    try:
+        if timeout is not None:
+            s.settimeout(timeout)
+        start = time.ticks_us()
+        s.connect(ai[-1])
+        _connect_time.since(start)
+        tls_sock = None
+        if tls:
+            if ssl is None:
+                raise ValueError('Unsupported protocol: https:')
+            if context is None:
+                context = _tls_context()
+            start = time.ticks_us()
+            if context is not None:
+                tls_sock = context.wrap_socket(s, server_hostname=host, session=session)
+            else:
+                tls_sock = ssl.wrap_socket(s, server_hostname=host)
+            _tls_time.since(start)
+            s = tls_sock
+    except Exception:
+        s.close()
+        raise
+    if not hasattr(s, "readline"):
+        # CPython的socket没有流接口，包装为文件对象
+        f = s.makefile("rwb")
+        s.close()
+        return f, tls_sock
+    return s, tls_sock
+
+# 解析chunk大小行（十六进制，可能带扩展参数），连接已关闭（空行）时抛出OSError
+def _chunk_size(line):
+    if not line:
+        raise OSError("连接意外关闭")
+    return int(line.split(b";")[0].strip(), 16)
+
+# 等待aw完成，超过timeout秒抛出OSError（None表示一直等待）
+async def _wait(aw, timeout):
+    if timeout is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, timeout)
+    except asyncio.TimeoutError:
+        raise OSError("请求超时")
+
+# 用asyncio流建立连接（tls为True时进行TLS握手），返回(reader, writer)
+# ai为getaddrinfo的结果（直接连接解析出的地址），握手期间让出事件循环
+async def _open_async(ai, host, port, tls=False, context=None, timeout=None):
+    ssl_arg = None
+    if tls:
+        if ssl is None:
+            raise ValueError('Unsupported protocol: https:')
+        ssl_arg = context or _tls_context() or True
+    start = time.ticks_us()
+    if ssl_arg is None:
+        streams = await _wait(asyncio.open_connection(ai[-1][0], port), timeout)
+    else:
+        streams = await _wait(asyncio.open_connection(ai[-1][0], port, ssl=ssl_arg,
+                                                      server_hostname=host), timeout)
+    (_tls_time if tls else _connect_time).since(start)
+    return streams
+
+# 解析URL，返回(proto, host, port, path)
+def _parse_url(url):
     try:
         proto, dummy, host, path = url.split('/', 3)
     except ValueError:
@@ -46,52 +364,449 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
         path = ''
     if proto == 'http:':
         port = 80
+    elif proto == 'https:':
+        port = 443
     else:
         raise ValueError('Unsupported protocol: ' + proto)
     # 支持主机:端口格式
     if ':' in host:
         host, port = host.split(':', 1)
         port = int(port)
-    # 域名解析，获取IP和端口
-    ai = usocket.getaddrinfo(host, port)
-    addr = ai[0][-1]
-    s = usocket.socket()
-    s.connect(addr)
-    # 发送HTTP请求行
-    s.write(b"%s /%s HTTP/1.0\r\n" % (method, path))
-    # 发送Host头
-    if not 'Host' in headers:
-        s.write(b"Host: %s\r\n" % host)
-    # 发送自定义头部
-    for k in headers:
-        s.write(b"%s: %s\r\n" % (k, headers[k]))
+    return proto, host, port, path
+
+# 请求头缓冲区：请求行和所有头部（以及较小的请求体）拼接在同一个缓冲区中，用一次write发出，
+# 避免逐行write产生大量小TCP分段；缓冲区在请求之间复用，不足时扩容
+_head_buf = bytearray(512)
+# 请求体不超过此长度时与请求头合并发送
+_INLINE_BODY_MAX = 1024
+# 流式请求体每次读取的字节数
+_BODY_CHUNK = 512
+
+def _put(pos, data):
+    global _head_buf
+    end = pos + len(data)
+    if end > len(_head_buf):
+        buf = bytearray(max(end, 2 * len(_head_buf)))
+        buf[:pos] = _head_buf[:pos]
+        _head_buf = buf
+    _head_buf[pos:end] = data
+    return end
+
+# 逐块产生流式请求体：文件类对象（有read方法）或生成器/迭代器
+def _iter_body(data):
+    if hasattr(data, "read"):
+        while True:
+            chunk = data.read(_BODY_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in data:
+            yield chunk
+
+# 构造请求行和请求头（写入_head_buf），较小的请求体一起放在缓冲区末尾
+# 返回(缓冲区中的字节数, 仍需单独发送的请求体或None, 请求体是否流式, 是否chunked发送)
+def _encode_head(method, host, path, data, json, headers, keep_alive):
     # 处理JSON数据
+    content_type = None
     if json is not None:
         assert data is None
-        import ujson
         data = ujson.dumps(json)
-        s.write(b"Content-Type: application/json\r\n")
-    # 发送Content-Length头
-    if data:
-        s.write(b"Content-Length: %d\r\n" % len(data))
+        content_type = b"application/json"
+    if isinstance(data, str):
+        data = data.encode()
+    streaming = data is not None and not isinstance(data, (bytes, bytearray, memoryview))
+    chunked = streaming and not 'Content-Length' in headers
+    # 请求行：流式chunked请求体需要HTTP/1.1
+    http11 = keep_alive or chunked
+    pos = _put(0, ("%s /%s %s\r\n" % (method, path, "HTTP/1.1" if http11 else "HTTP/1.0")).encode())
+    # Host头
+    if not 'Host' in headers:
+        pos = _put(pos, b"Host: ")
+        pos = _put(pos, host.encode())
+        pos = _put(pos, b"\r\n")
+    if http11 and not keep_alive:
+        pos = _put(pos, b"Connection: close\r\n")
+    # 自定义头部
+    for k in headers:
+        pos = _put(pos, ("%s: %s\r\n" % (k, headers[k])).encode())
+    if content_type:
+        pos = _put(pos, b"Content-Type: application/json\r\n")
+    if chunked:
+        pos = _put(pos, b"Transfer-Encoding: chunked\r\n")
+    elif data and not streaming:
+        pos = _put(pos, b"Content-Length: %d\r\n" % len(data))
     # 结束头部
-    s.write(b"\r\n")
+    pos = _put(pos, b"\r\n")
+    if data and not streaming and len(data) <= _INLINE_BODY_MAX:
+        pos = _put(pos, data)
+        data = None
+    return pos, data or None, streaming, chunked
+
+# 解析一行响应头，加入resp_headers（键统一为小写字符串），返回该行的键
+# key为上一行的键：以空格或制表符开头的行是上一个头部的续行（折叠的头部）；
+# 重复出现的头部按顺序用", "合并
+def _parse_header(l, resp_headers, key=None):
+    if l[:1] in (b" ", b"\t"):
+        if key is not None:
+            resp_headers[key] += " " + l.strip().decode()
+        return key
+    k, v = l.split(b":", 1)
+    k = k.strip().lower().decode()
+    v = v.strip().decode()
+    if k in resp_headers:
+        v = resp_headers[k] + ", " + v
+    resp_headers[k] = v
+    return k
+
+# 根据状态行和响应头确定响应体长度、是否chunked以及连接是否可以复用
+# 返回(content_length, chunked, reusable)，content_length为None表示读到连接关闭为止
+def _body_framing(method, protover, status, resp_headers, keep_alive):
+    content_length = resp_headers.get("content-length")
+    if content_length is not None:
+        # 重复的Content-Length合并为"n, n"（值相同）
+        content_length = int(content_length.split(",")[0])
+    chunked = "chunked" in resp_headers.get("transfer-encoding", "").lower()
+    reusable = (keep_alive and protover == b"HTTP/1.1"
+                and not "close" in resp_headers.get("connection", "").lower())
+    if method == "HEAD" or status in (204, 304):
+        content_length = 0
+    if content_length is None and not chunked:
+        # 响应体读到连接关闭为止，连接无法复用
+        reusable = False
+    return content_length, chunked, reusable
+
+# 复用的空闲连接已被服务器关闭、请求没有被处理：Session用新连接重发请求
+# 只在收到任何响应数据之前发生时抛出：发送请求头时连接被重置（ECONNRESET/EPIPE），
+# 或幂等方法的状态行为空/连接被重置；超时和非幂等请求（如POST）的请求体已发出后不抛出
+class _StaleConnection(OSError):
+    pass
+
+_STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE)
+_IDEMPOTENT = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+def _stale_error(e):
+    return e.args and e.args[0] in _STALE_ERRNOS
+
+# 发送请求并读取响应头，返回Response对象
+# keep_alive为True时使用HTTP/1.1；release在响应结束时调用，服务器允许复用时传入连接以归还连接池
+# data可以是bytes/str，也可以是文件类对象或生成器（流式发送，不整体读入内存）；
+# 未在headers中指定Content-Length的流式请求体使用chunked编码发送
+def _send_request(s, method, host, path, data, json, headers, keep_alive=False, release=None):
+    pos, data, streaming, chunked = _encode_head(method, host, path, data, json, headers, keep_alive)
+    try:
+        s.write(memoryview(_head_buf)[:pos])
+        if data is None and hasattr(s, "flush"):
+            s.flush()
+    except OSError as e:
+        if _stale_error(e):
+            raise _StaleConnection(e.args[0])
+        raise
     # 发送请求体
-    if data:
+    if streaming:
+        for chunk in _iter_body(data):
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if not chunk:
+                continue
+            if chunked:
+                s.write(b"%x\r\n" % len(chunk))
+                s.write(chunk)
+                s.write(b"\r\n")
+            else:
+                s.write(chunk)
+        if chunked:
+            s.write(b"0\r\n\r\n")
+    elif data:
         s.write(data)
+    if hasattr(s, "flush"):
+        s.flush()
     # 读取响应状态行
-    l = s.readline()
+    start = time.ticks_us()
+    try:
+        l = s.readline()
+    except OSError as e:
+        if _stale_error(e) and method in _IDEMPOTENT:
+            raise _StaleConnection(e.args[0])
+        raise
+    if not l:
+        raise (_StaleConnection if method in _IDEMPOTENT else OSError)("连接已被服务器关闭")
+    _response_time.since(start)
     protover, status, msg = l.split(None, 2)
-    # 跳过响应头
+    status = int(status)
+    # 读取响应头
+    resp_headers = {}
+    key = None
     while True:
         l = s.readline()
         if not l or l == b"\r\n":
             break
+        key = _parse_header(l, resp_headers, key)
+    content_length, chunked, reusable = _body_framing(method, protover, status, resp_headers, keep_alive)
     # 返回Response对象
-    resp = Response(s)
-    resp.status_code = int(status)
+    resp = Response(s, content_length, chunked, release, reusable)
+    resp.status_code = status
+    resp.reason = msg.strip()
+    resp.headers = resp_headers
+    if content_length == 0 and not chunked:
+        resp._done()
+    return resp
+
+# _send_request的协程版本：发送请求后逐行等待响应头，返回AsyncResponse对象
+# 请求体只能是bytes/str或json（不支持流式请求体）
+async def _send_request_async(reader, writer, method, host, path, data, json, headers,
+                              keep_alive=False, release=None, timeout=None):
+    pos, data, streaming, chunked = _encode_head(method, host, path, data, json, headers, keep_alive)
+    if streaming:
+        raise ValueError("request_async不支持流式请求体")
+    # write()把数据复制到流的发送缓冲区，之后_head_buf可以被其他请求使用
+    writer.write(bytes(memoryview(_head_buf)[:pos]))
+    try:
+        await _wait(writer.drain(), timeout)
+    except OSError as e:
+        if _stale_error(e):
+            raise _StaleConnection(e.args[0])
+        raise
+    if data:
+        writer.write(data)
+        await _wait(writer.drain(), timeout)
+    # 读取响应状态行
+    start = time.ticks_us()
+    try:
+        l = await _wait(reader.readline(), timeout)
+    except OSError as e:
+        if _stale_error(e) and method in _IDEMPOTENT:
+            raise _StaleConnection(e.args[0])
+        raise
+    if not l:
+        raise (_StaleConnection if method in _IDEMPOTENT else OSError)("连接已被服务器关闭")
+    _response_time.since(start)
+    protover, status, msg = l.split(None, 2)
+    status = int(status)
+    # 读取响应头
+    resp_headers = {}
+    key = None
+    while True:
+        l = await _wait(reader.readline(), timeout)
+        if not l or l == b"\r\n":
+            break
+        key = _parse_header(l, resp_headers, key)
+    content_length, chunked, reusable = _body_framing(method, protover, status, resp_headers, keep_alive)
+    resp = AsyncResponse(reader, writer, content_length, chunked, timeout, release, reusable)
+    resp.status_code = status
+    resp.reason = msg.strip()
+    resp.headers = resp_headers
+    if content_length == 0 and not chunked:
+        resp._done()
     return resp
 
+# 发送HTTP请求的主函数（每次请求新建连接，使用HTTP/1.0）
+# timeout为连接和每次读写的超时（秒），超时抛出OSError；None表示一直等待
+def request(method, url, data=None, json=None, headers={}, stream=None, timeout=None):
+    # 解析URL，获取协议、主机、端口、路径
+    proto, host, port, path = _parse_url(url)
+    # 域名解析，获取IP和端口
+    start = time.ticks_us()
+    ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
+    _dns_time.since(start)
+    s, tls_sock = _open_stream(ai[0], host, proto == 'https:', timeout=timeout)
+    try:
+        return _send_request(s, method, host, path, data, json, headers)
+    except Exception:
+        s.close()
+        raise
+
+# request()的协程版本：连接、TLS握手和读取都在等待时让出事件循环（DNS解析仍是阻塞的）
+# 返回AsyncResponse对象
+async def request_async(method, url, data=None, json=None, headers={}, timeout=None):
+    proto, host, port, path = _parse_url(url)
+    start = time.ticks_us()
+    ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
+    _dns_time.since(start)
+    reader, writer = await _open_async(ai[0], host, port, proto == 'https:', timeout=timeout)
+    try:
+        return await _send_request_async(reader, writer, method, host, path, data, json, headers,
+                                         timeout=timeout)
+    except Exception:
+        writer.close()
+        raise
+
+# 会话对象：缓存DNS解析结果，并为每个主机:端口保留空闲的HTTP/1.1连接，
+# 后续请求复用已有连接，省去DNS查询和TCP（及TLS）握手；
+# 需要新建https连接时，若TLS实现支持则用保存的会话进行会话恢复
+#   pool_size: 每个主机:端口最多保留的空闲连接数
+#   idle_timeout: 空闲连接的最长保留时间（秒）
+#   dns_ttl: DNS解析结果的缓存时间（秒）
+#   ssl_context: https使用的TLS上下文（如需信任自签名证书），None使用默认上下文
+#   timeout: 连接和每次读写的超时（秒），None表示一直等待
+# 缓存和空闲时间用ticks_ms()计时，不受NTP校时引起的RTC跳变影响
+class Session:
+    def __init__(self, pool_size=2, idle_timeout=30, dns_ttl=300, ssl_context=None, timeout=None):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.dns_ttl = dns_ttl
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self._dns = {}   # (host, port) -> (addrinfo, 解析时的ticks_ms)
+        self._pool = {}  # (proto, host, port) -> [(连接, TLS socket, 归还时的ticks_ms), ...]
+        self._stream_pool = {}  # request_async()的空闲连接 (proto, host, port) -> [(reader, writer, 归还时的ticks_ms), ...]
+        self._tls_sessions = {}  # (proto, host, port) -> TLS会话
+        self.connections_opened = 0  # 新建连接次数
+        self.connections_reused = 0  # 复用连接次数
+        self.tls_resumed = 0  # 通过会话恢复建立的TLS连接次数
+
+    def _resolve(self, host, port):
+        key = (host, port)
+        now = time.ticks_ms()
+        entry = self._dns.get(key)
+        if entry is None or time.ticks_diff(now, entry[1]) >= self.dns_ttl * 1000:
+            start = time.ticks_us()
+            ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)[0]
+            _dns_time.since(start)
+            entry = (ai, now)
+            self._dns[key] = entry
+        return entry[0]
+
+    def _acquire(self, key):
+        # 取出最近归还的空闲连接，关闭超过idle_timeout的连接
+        idle = self._pool.get(key)
+        now = time.ticks_ms()
+        while idle:
+            s, tls_sock, returned = idle.pop()
+            if time.ticks_diff(now, returned) <= self.idle_timeout * 1000:
+                return s, tls_sock
+            s.close()
+        return None, None
+
+    def _acquire_streams(self, key):
+        # _acquire()的asyncio流版本
+        idle = self._stream_pool.get(key)
+        now = time.ticks_ms()
+        while idle:
+            reader, writer, returned = idle.pop()
+            if time.ticks_diff(now, returned) <= self.idle_timeout * 1000:
+                return reader, writer
+            writer.close()
+        return None
+
+    def _connect(self, key):
+        proto, host, port = key
+        tls = proto == 'https:'
+        session = self._tls_sessions.get(key) if tls else None
+        s, tls_sock = _open_stream(self._resolve(host, port), host, tls,
+                                   self.ssl_context, session, self.timeout)
+        self.connections_opened += 1
+        if getattr(tls_sock, "session_reused", False):
+            self.tls_resumed += 1
+        return s, tls_sock
+
+    def _releaser(self, key, tls_sock):
+        def release(s):
+            # TLS 1.3的会话票据在握手后才到达，因此在响应结束时保存会话；
+            # 服务器要求关闭连接（Connection: close、读到连接关闭为止）时同样保存，下次新建连接时恢复
+            session = getattr(tls_sock, "session", None)
+            if session is not None:
+                self._tls_sessions[key] = session
+            if s is None:
+                return
+            idle = self._pool.setdefault(key, [])
+            if len(idle) >= self.pool_size:
+                s.close()
+            else:
+                idle.append((s, tls_sock, time.ticks_ms()))
+        return release
+
+    def _stream_releaser(self, key):
+        def release(streams):
+            if streams is None:
+                return
+            idle = self._stream_pool.setdefault(key, [])
+            if len(idle) >= self.pool_size:
+                streams[1].close()
+            else:
+                idle.append((streams[0], streams[1], time.ticks_ms()))
+        return release
+
+    def request(self, method, url, data=None, json=None, headers={}, stream=None):
+        proto, host, port, path = _parse_url(url)
+        key = (proto, host, port)
+        s, tls_sock = self._acquire(key)
+        # 流式请求体无法重放，不在可能已失效的空闲连接上发送
+        if s is not None and isinstance(data, (str, bytes, bytearray, memoryview, type(None))):
+            self.connections_reused += 1
+            try:
+                return _send_request(s, method, host, path, data, json, headers, True,
+                                     self._releaser(key, tls_sock))
+            except _StaleConnection:
+                # 服务器已关闭空闲连接，请求没有被处理：用新连接重发一次
+                s.close()
+            except Exception:
+                # 超时、请求体已发出后连接断开等：服务器可能已处理请求，不重发
+                s.close()
+                raise
+        elif s is not None:
+            s.close()
+        s, tls_sock = self._connect(key)
+        try:
+            return _send_request(s, method, host, path, data, json, headers, True,
+                                 self._releaser(key, tls_sock))
+        except Exception:
+            s.close()
+            raise
+
+    async def request_async(self, method, url, data=None, json=None, headers={}):
+        # request()的协程版本（见模块级request_async），同样复用DNS缓存和空闲连接；
+        # asyncio流不提供TLS会话，新建的https连接不能进行会话恢复
+        proto, host, port, path = _parse_url(url)
+        key = (proto, host, port)
+        streams = self._acquire_streams(key)
+        if streams is not None:
+            self.connections_reused += 1
+            try:
+                return await _send_request_async(streams[0], streams[1], method, host, path, data, json,
+                                                 headers, True, self._stream_releaser(key), self.timeout)
+            except _StaleConnection:
+                # 服务器已关闭空闲连接，请求没有被处理：用新连接重发一次
+                streams[1].close()
+            except Exception:
+                streams[1].close()
+                raise
+        reader, writer = await _open_async(self._resolve(host, port), host, port, proto == 'https:',
+                                           self.ssl_context, self.timeout)
+        self.connections_opened += 1
+        try:
+            return await _send_request_async(reader, writer, method, host, path, data, json,
+                                             headers, True, self._stream_releaser(key), self.timeout)
+        except Exception:
+            writer.close()
+            raise
+
+    def get(self, url, **kw):
+        return self.request("GET", url, **kw)
+
+    def post(self, url, **kw):
+        return self.request("POST", url, **kw)
+
+    def put(self, url, **kw):
+        return self.request("PUT", url, **kw)
+
+    def patch(self, url, **kw):
+        return self.request("PATCH", url, **kw)
+
+    def delete(self, url, **kw):
+        return self.request("DELETE", url, **kw)
+
+    def close(self):
+        # 关闭所有空闲连接
+        for idle in self._pool.values():
+            for s, tls_sock, returned in idle:
+                s.close()
+        self._pool = {}
+        for idle in self._stream_pool.values():
+            for reader, writer, returned in idle:
+                writer.close()
+        self._stream_pool = {}
+
 # 以下为常用HTTP方法的快捷函数
 def get(url, **kw):
     return request("GET", url, **kw)
@@ -1,132 +1,71 @@
-import socket
+import binascii
 import network
 import time
+import metrics
+import logger
 
-class WebConfigService:
-    def __init__(self, ap_ssid='ESP32-Config', ap_password='12345678'):
-        """
-        Web配置服务初始化
-        
-        参数:
-            ap_ssid: AP模式下的热点名称
-            ap_password: AP模式下的密码（至少8个字符）
-        """
-        self.ap_ssid = ap_ssid
-        self.ap_password = ap_password
-        self.ap = None
-        self.server_socket = None
-        
-    def start_ap(self):
-        """
-        启动AP模式（创建WiFi热点）
-        
-        返回:
-            True如果成功启动，否则False
-        """
-        try:
-            self.ap = network.WLAN(network.AP_IF)
-            self.ap.active(True)
-            self.ap.config(essid=self.ap_ssid, password=self.ap_password)
-            
-            # 等待AP启动
-            time.sleep(2)
-            
-            if self.ap.active():
-                print('AP模式已启动')
-                print('热点名称: {}, 密码: {}'.format(self.ap_ssid, self.ap_password))
-                print('AP IP地址: {}'.format(self.ap.ifconfig()[0]))
-                return True
-            else:
-                print('AP模式启动失败')
-                return False
-        except Exception as e:
-            print('启动AP模式时出错: {}'.format(e))
-            return False
-    
-    def stop_ap(self):
-        """
-        停止AP模式
-        """
-        if self.ap and self.ap.active():
-            self.ap.active(False)
-            print('AP模式已停止')
-    
-    def handle_client(self, client_socket):
-        """
-        处理客户端HTTP请求
-        
-        参数:
-            client_socket: 客户端socket对象
-        """
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# keep-alive连接的空闲超时（秒）
+KEEP_ALIVE_TIMEOUT = 5
+# 单个keep-alive连接最多处理的请求数
+MAX_KEEP_ALIVE_REQUESTS = 100
+# 允许的最大请求体（字节）
+MAX_BODY_SIZE = 1024
+
+_log = logger.get_logger('portal')
+
+# 每个请求从读完请求到响应发送完毕的耗时
+_request_time = metrics.histogram('http_request_us')
+_request_errors = metrics.counter('http_request_errors')
+
+HTML_CONTENT_TYPE = b'Content-Type: text/html; charset=utf-8\r\n'
+METRICS_CONTENT_TYPE = b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+
+STATUS_TEXT = {
+    200: b'OK',
+    303: b'See Other',
+    304: b'Not Modified',
+    404: b'Not Found',
+    500: b'Internal Server Error',
+}
+
+def url_decode(value):
+    """
+    解码application/x-www-form-urlencoded格式的表单值（'+'为空格，%XX为字节）
+    """
+    value = value.replace('+', ' ')
+    if '%' not in value:
+        return value
+    parts = value.split('%')
+    result = bytearray(parts[0].encode('utf-8'))
+    for part in parts[1:]:
         try:
-            request = client_socket.recv(1024).decode('utf-8')
-            
-            # 解析请求
-            if 'GET / ' in request or 'GET /index.html' in request:
-                # 返回配置页面
-                response = self.get_config_page()
-                client_socket.send(response)
-            elif 'POST /configure' in request:
-                # 处理配置提交
-                content_length = 0
-                lines = request.split('\r\n')
-                for line in lines:
-                    if 'Content-Length:' in line:
-                        content_length = int(line.split(':')[1].strip())
-                        break
-                
-                # 读取POST数据
-                body = request.split('\r\n\r\n')[1] if '\r\n\r\n' in request else ''
-                if len(body) < content_length:
-                    # 可能需要更多数据，但简单起见我们假设一次性收到
-                    pass
-                
-                # 解析表单数据
-                config_data = {}
-                for pair in body.split('&'):
-                    if '=' in pair:
-                        key, value = pair.split('=', 1)
-                        config_data[key] = value
-                
-                # 保存配置
-                ssid = config_data.get('ssid', '')
-                password = config_data.get('password', '')
-                
-                # 导入wifi_config_service并保存
-                import wifi_config_service
-                saved = wifi_config_service.save_wifi_config(ssid, password)
-                
-                if saved:
-                    response = self.get_success_page(ssid)
-                else:
-                    response = self.get_error_page('保存配置失败')
-                
-                client_socket.send(response)
-            else:
-                # 404 Not Found
-                response = 'HTTP/1.1 404 Not Found\r\nContent-Type: text/html\r\n\r\n<h1>404 Not Found</h1>'
-                client_socket.send(response)
-        
-        except Exception as e:
-            print('处理客户端请求时出错: {}'.format(e))
-            response = 'HTTP/1.1 500 Internal Server Error\r\nContent-Type: text/html\r\n\r\n<h1>500 Internal Server Error</h1>'
-            client_socket.send(response)
-        
-        finally:
-            client_socket.close()
+            result.append(int(part[:2], 16))
+            result.extend(part[2:].encode('utf-8'))
+        except ValueError:
+            result.extend(('%' + part).encode('utf-8'))
+    return str(result, 'utf-8')
+
+def parse_form(body):
+    """
+    解析application/x-www-form-urlencoded格式的请求体
     
-    def get_config_page(self):
-        """
-        获取配置页面HTML
-        
-        返回:
-            HTTP响应字符串
-        """
-        html = """HTTP/1.1 200 OK
-Content-Type: text/html
-Connection: close
+    返回:
+        字段字典
+    """
+    fields = {}
+    for pair in body.decode('utf-8').split('&'):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            fields[key] = url_decode(value)
+    return fields
 
-<!DOCTYPE html>
+# 页面模板：首次使用时编译为bytes并缓存，{ssid}、{error_message}为动态字段
+CONFIG_PAGE = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -167,26 +106,14 @@ Connection: close
         <div class="info message">
             配置保存后，ESP32将尝试连接指定的WiFi网络
         </div>
+        <div class="info message">
+            <a href="/networks">管理已保存的网络</a>
+        </div>
     </div>
 </body>
 </html>"""
-        return html.replace('\n', '\r\n')
-    
-    def get_success_page(self, ssid):
-        """
-        获取成功页面HTML
-        
-        参数:
-            ssid: 已配置的WiFi名称
-        
-        返回:
-            HTTP响应字符串
-        """
-        html = """HTTP/1.1 200 OK
-Content-Type: text/html
-Connection: close
 
-<!DOCTYPE html>
+SUCCESS_PAGE = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -216,24 +143,9 @@ Connection: close
         </div>
     </div>
 </body>
-</html>""".format(ssid=ssid)
-        return html.replace('\n', '\r\n')
-    
-    def get_error_page(self, error_message):
-        """
-        获取错误页面HTML
-        
-        参数:
-            error_message: 错误信息
-        
-        返回:
-            HTTP响应字符串
-        """
-        html = """HTTP/1.1 200 OK
-Content-Type: text/html
-Connection: close
+</html>"""
 
-<!DOCTYPE html>
+ERROR_PAGE = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -257,60 +169,462 @@ Connection: close
         </div>
     </div>
 </body>
-</html>""".format(error_message=error_message)
-        return html.replace('\n', '\r\n')
+</html>"""
+
+NETWORKS_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>已保存的网络</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; padding: 20px; background-color: #f5f5f5; }
+        .container { max-width: 400px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        h1 { color: #333; text-align: center; }
+        table { width: 100%; border-collapse: collapse; margin-bottom: 20px; }
+        th, td { padding: 8px; border-bottom: 1px solid #ddd; text-align: left; }
+        .form-group { margin-bottom: 15px; }
+        label { display: block; margin-bottom: 5px; font-weight: bold; }
+        input[type="text"], input[type="password"], input[type="number"] { width: 100%; padding: 10px; border: 1px solid #ddd; border-radius: 5px; box-sizing: border-box; }
+        button { padding: 8px 12px; background-color: #4CAF50; color: white; border: none; border-radius: 5px; cursor: pointer; }
+        .delete { background-color: #d9534f; }
+        .info { background-color: #d9edf7; color: #31708f; padding: 15px; border-radius: 5px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>已保存的网络</h1>
+        <table>
+            <tr><th>SSID</th><th>优先级</th><th>成功/失败</th><th></th></tr>
+            {rows}
+        </table>
+        <form method="POST" action="/networks/add">
+            <div class="form-group">
+                <label for="ssid">WiFi名称 (SSID):</label>
+                <input type="text" id="ssid" name="ssid" required>
+            </div>
+            <div class="form-group">
+                <label for="password">WiFi密码:</label>
+                <input type="password" id="password" name="password" required>
+            </div>
+            <div class="form-group">
+                <label for="priority">优先级（越大越优先，相同时选择信号最强的网络）:</label>
+                <input type="number" id="priority" name="priority" value="0">
+            </div>
+            <button type="submit">添加/更新网络</button>
+        </form>
+        <div class="info">
+            <a href="/">返回配置页面</a>
+        </div>
+    </div>
+</body>
+</html>"""
+
+NETWORK_ROW = ('<tr><td>{ssid}</td><td>{priority}</td><td>{successes}/{failures}</td><td>'
+               '<form method="POST" action="/networks/delete">'
+               '<input type="hidden" name="ssid" value="{ssid}">'
+               '<button type="submit" class="delete">删除</button></form></td></tr>')
+
+PAGE_TEMPLATES = {
+    'config': (CONFIG_PAGE, None),
+    'networks': (NETWORKS_PAGE, 'rows'),
+    'success': (SUCCESS_PAGE, 'ssid'),
+    'error': (ERROR_PAGE, 'error_message'),
+}
+
+def gzip_compress(data):
+    """
+    gzip压缩（CPython使用gzip模块，MicroPython使用deflate模块，均不可用时返回None）
+    """
+    try:
+        import gzip
+        return gzip.compress(data, mtime=0)
+    except ImportError:
+        pass
+    try:
+        import io
+        import deflate
+        buf = io.BytesIO()
+        with deflate.DeflateIO(buf, deflate.GZIP) as f:
+            f.write(data)
+        return buf.getvalue()
+    except Exception:
+        # 固件未启用deflate压缩
+        return None
+
+def html_escape(text):
+    """
+    转义HTML特殊字符
     
-    def run_server(self, port=80, timeout=300):
+    返回:
+        转义后的UTF-8字节串
+    """
+    return (text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            .replace('"', '&quot;').encode('utf-8'))
+
+class CachedPage:
+    """
+    预编译的页面：模板只编码一次为bytes，并在动态字段处预先切分成片段，
+    每次请求只需依次发送片段，不再构建整页字符串
+    
+    属性:
+        segments: 动态字段前后的字节片段
+        etag: 静态页面的ETag（动态页面为None）
+        gzipped: 静态页面的gzip压缩版本（不支持压缩时为None）
+        headers: 预编码的附加响应头（ETag等）
+        gzip_headers: 发送gzip版本时的附加响应头
+    """
+    def __init__(self, template, field=None):
+        if field is None:
+            body = template.encode('utf-8')
+            self.segments = (body,)
+            self.etag = '"{:08x}"'.format(binascii.crc32(body))
+            self.gzipped = gzip_compress(body)
+            self.headers = b'ETag: %s\r\nVary: Accept-Encoding\r\n' % self.etag.encode('utf-8')
+            self.gzip_headers = self.headers + b'Content-Encoding: gzip\r\n'
+        else:
+            before, after = template.split('{' + field + '}', 1)
+            self.segments = (before.encode('utf-8'), after.encode('utf-8'))
+            self.etag = None
+            self.gzipped = None
+            self.headers = b''
+            self.gzip_headers = b''
+    
+    def parts(self, value=b''):
         """
-        运行Web服务器
+        参数:
+            value: 动态字段的字节串
+        
+        返回:
+            页面字节片段元组（动态字段位于片段之间）
+        """
+        if len(self.segments) == 1:
+            return self.segments
+        return (self.segments[0], value, self.segments[1])
+
+_page_cache = {}
+
+def get_cached_page(name):
+    """
+    获取缓存的页面，首次调用时编译
+    
+    参数:
+        name: 页面名称（'config'、'success'、'error'）
+    
+    返回:
+        CachedPage对象
+    """
+    page = _page_cache.get(name)
+    if page is None:
+        template, field = PAGE_TEMPLATES[name]
+        page = CachedPage(template, field)
+        _page_cache[name] = page
+    return page
+
+class WebConfigService:
+    def __init__(self, ap_ssid='ESP32-Config', ap_password='12345678'):
+        """
+        Web配置服务初始化
         
         参数:
-            port: 服务器端口（默认80）
-            timeout: 服务器运行超时时间（秒，默认300秒/5分钟）
+            ap_ssid: AP模式下的热点名称
+            ap_password: AP模式下的密码（至少8个字符）
+        """
+        self.ap_ssid = ap_ssid
+        self.ap_password = ap_password
+        self.ap = None
+        self.server_socket = None
+        self._writers = []
+        
+    def start_ap(self):
+        """
+        启动AP模式（创建WiFi热点）
         
         返回:
-            无
+            True如果成功启动，否则False
         """
         try:
-            # 创建socket服务器
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind(('0.0.0.0', port))
-            self.server_socket.listen(5)
-            
-            print('Web服务器已启动，端口: {}'.format(port))
-            print('请在浏览器中访问: http://{}'.format(self.ap.ifconfig()[0]))
+            self._activate_ap()
             
-            # 设置超时
-            self.server_socket.settimeout(1)
+            # 等待AP启动
+            time.sleep(2)
             
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                try:
-                    client_socket, addr = self.server_socket.accept()
-                    print('客户端连接: {}'.format(addr))
-                    self.handle_client(client_socket)
-                except OSError as e:
-                    # MicroPython中，超时错误号可能是110或116，具体取决于平台
-                    # 110: ETIMEDOUT (某些平台)
-                    # 116: ETIMEDOUT (其他平台)
-                    if hasattr(e, 'errno') and e.errno in (110, 116):
-                        # 超时，继续循环
-                        pass
-                    elif hasattr(e, 'args') and e.args and e.args[0] in (110, 116):
-                        # 另一种错误号表示方式
-                        pass
+            return self._check_ap()
+        except Exception as e:
+            _log.error('启动AP模式时出错: {}', e)
+            return False
+    
+    async def start_ap_async(self):
+        """
+        启动AP模式（协程版本，等待AP启动时不阻塞其他任务）
+        
+        返回:
+            True如果成功启动，否则False
+        """
+        try:
+            self._activate_ap()
+            await asyncio.sleep(2)
+            return self._check_ap()
+        except Exception as e:
+            _log.error('启动AP模式时出错: {}', e)
+            return False
+    
+    def _activate_ap(self):
+        self.ap = network.WLAN(network.AP_IF)
+        self.ap.active(True)
+        self.ap.config(essid=self.ap_ssid, password=self.ap_password)
+    
+    def _check_ap(self):
+        if self.ap.active():
+            _log.info('AP模式已启动')
+            _log.info('热点名称: {}, 密码: {}', self.ap_ssid, self.ap_password)
+            _log.info('AP IP地址: {}', self.ap.ifconfig()[0])
+            return True
+        else:
+            _log.error('AP模式启动失败')
+            return False
+    
+    def stop_ap(self):
+        """
+        停止AP模式
+        """
+        if self.ap and self.ap.active():
+            self.ap.active(False)
+            _log.info('AP模式已停止')
+    
+    async def handle_client(self, reader, writer):
+        """
+        处理一个客户端连接（协程）
+        支持HTTP/1.1 keep-alive：同一连接上可依次处理多个请求，
+        空闲超过KEEP_ALIVE_TIMEOUT秒或客户端要求关闭时断开
+        
+        参数:
+            reader: 连接的输入流
+            writer: 连接的输出流
+        """
+        self._writers.append(writer)
+        try:
+            for _ in range(MAX_KEEP_ALIVE_REQUESTS):
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                
+                with _request_time.time():
+                    try:
+                        status, extra_headers, parts = self.handle_request(method, path, headers, body)
+                    except Exception as e:
+                        _log.error('处理客户端请求时出错: {}', e)
+                        _request_errors.inc()
+                        status, extra_headers, parts = 500, b'', (b'<h1>500 Internal Server Error</h1>',)
+                    
+                    connection = headers.get('connection', '').lower()
+                    if version == 'HTTP/1.1':
+                        keep_alive = connection != 'close'
                     else:
-                        # 其他错误，重新抛出
-                        raise
-            
-            print('Web服务器已停止（超时）')
-            
+                        keep_alive = connection == 'keep-alive'
+                    
+                    content_length = 0
+                    for part in parts:
+                        content_length += len(part)
+                    writer.write(self.response_head(status, content_length, keep_alive, extra_headers))
+                    for part in parts:
+                        writer.write(part)
+                    await writer.drain()
+                if not keep_alive:
+                    break
         except Exception as e:
-            print('运行Web服务器时出错: {}'.format(e))
+            # 超时、客户端提前断开等
+            pass
         finally:
-            if self.server_socket:
-                self.server_socket.close()
+            self._writers.remove(writer)
+            writer.close()
+            await writer.wait_closed()
+    
+    async def read_request(self, reader):
+        """
+        读取一个完整的HTTP请求（请求行、头部，以及按Content-Length读取的完整请求体）
+        
+        参数:
+            reader: 连接的输入流
+        
+        返回:
+            (method, path, version, headers, body) 元组，连接已关闭或空闲超时时返回None
+        """
+        try:
+            line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if not line:
+            return None
+        parts = line.decode('utf-8').split()
+        if len(parts) != 3:
+            raise ValueError('请求行格式错误')
+        method, path, version = parts
+        
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+            if not line or line == b'\r\n':
+                break
+            key, _, value = line.decode('utf-8').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        
+        body = b''
+        content_length = int(headers.get('content-length', 0))
+        if content_length > MAX_BODY_SIZE:
+            raise ValueError('请求体过大')
+        if content_length > 0:
+            body = await asyncio.wait_for(reader.readexactly(content_length), KEEP_ALIVE_TIMEOUT)
+        return method, path, version, headers, body
+    
+    def handle_request(self, method, path, headers, body):
+        """
+        处理一个HTTP请求
+        
+        参数:
+            method: 请求方法
+            path: 请求路径
+            headers: 请求头字典（键为小写）
+            body: 请求体（bytes）
+        
+        返回:
+            (status, extra_headers, parts) 元组，extra_headers为附加响应头bytes，parts为响应体字节片段
+        """
+        if method == 'GET' and path in ('/', '/index.html'):
+            # 返回配置页面（浏览器已缓存时返回304）
+            page = self.get_config_page()
+            if headers.get('if-none-match') == page.etag:
+                return 304, page.headers, ()
+            if page.gzipped is not None and 'gzip' in headers.get('accept-encoding', ''):
+                return 200, page.gzip_headers, (page.gzipped,)
+            return 200, page.headers, page.segments
+        
+        if method == 'POST' and path == '/configure':
+            # 解析表单数据
+            config_data = parse_form(body)
+            
+            # 保存配置
+            ssid = config_data.get('ssid', '')
+            password = config_data.get('password', '')
+            
+            # 导入wifi_config_service并保存
+            import wifi_config_service
+            saved = wifi_config_service.save_wifi_config(ssid, password)
+            
+            if saved:
+                parts = self.get_success_page(ssid)
+            else:
+                parts = self.get_error_page('保存配置失败')
+            return 200, b'', parts
+        
+        if path == '/metrics' and method == 'GET':
+            # 各服务的指标（Prometheus文本格式）
+            return 200, METRICS_CONTENT_TYPE, (metrics.render_text().encode('utf-8'),)
+        
+        if path == '/networks' and method == 'GET':
+            return 200, b'', self.get_networks_page()
+        
+        if method == 'POST' and path in ('/networks/add', '/networks/delete'):
+            import wifi_config_service
+            fields = parse_form(body)
+            ssid = fields.get('ssid', '')
+            if path == '/networks/add':
+                try:
+                    priority = int(fields.get('priority') or 0)
+                except ValueError:
+                    priority = 0
+                saved = wifi_config_service.save_wifi_config(ssid, fields.get('password', ''), priority)
+            else:
+                saved = wifi_config_service.remove_network(ssid)
+            if not saved:
+                return 200, b'', self.get_error_page('保存配置失败')
+            # 处理完成后返回网络列表页面（POST/Redirect/GET）
+            return 303, b'Location: /networks\r\n', ()
+        
+        # 404 Not Found
+        return 404, b'', (b'<h1>404 Not Found</h1>',)
+    
+    def response_head(self, status, content_length, keep_alive, extra_headers=b''):
+        """
+        生成HTTP响应头
+        
+        参数:
+            status: 状态码
+            content_length: 响应体长度
+            keep_alive: 是否保持连接
+            extra_headers: 附加响应头bytes（每行以CRLF结尾），以Content-Type开头时替换默认的HTML类型
+        
+        返回:
+            响应头bytes
+        """
+        content_type = b'' if extra_headers.startswith(b'Content-Type:') else HTML_CONTENT_TYPE
+        return b'HTTP/1.1 %d %s\r\n%sContent-Length: %d\r\nConnection: %s\r\n%s\r\n' % (
+            status, STATUS_TEXT.get(status, ''), content_type, content_length,
+            b'keep-alive' if keep_alive else b'close', extra_headers)
+    
+    def get_config_page(self):
+        """
+        获取配置页面（静态页面，附带ETag和可选的gzip压缩版本）
+        
+        返回:
+            CachedPage对象
+        """
+        return get_cached_page('config')
+    
+    def get_networks_page(self):
+        """
+        获取已保存的网络列表页面
+        
+        返回:
+            页面字节片段元组
+        """
+        import wifi_config_service
+        rows = []
+        for profile in wifi_config_service.load_networks():
+            rows.append(NETWORK_ROW.format(
+                ssid=html_escape(profile['ssid']).decode('utf-8'),
+                priority=profile.get('priority', 0),
+                successes=profile.get('successes', 0),
+                failures=profile.get('failures', 0)))
+        return get_cached_page('networks').parts(''.join(rows).encode('utf-8'))
+    
+    def get_success_page(self, ssid):
+        """
+        获取成功页面
+        
+        参数:
+            ssid: 已配置的WiFi名称
+        
+        返回:
+            页面字节片段元组
+        """
+        return get_cached_page('success').parts(html_escape(ssid))
+    
+    def get_error_page(self, error_message):
+        """
+        获取错误页面
+        
+        参数:
+            error_message: 错误信息
+        
+        返回:
+            页面字节片段元组
+        """
+        return get_cached_page('error').parts(html_escape(error_message))
+    
+    def run_server(self, port=80, timeout=300):
+        """
+        运行Web服务器（阻塞直到超时）
+        
+        参数:
+            port: 服务器端口（默认80）
+            timeout: 服务器运行超时时间（秒，默认300秒/5分钟）
+        
+        返回:
+            无
+        """
+        asyncio.run(self.run_server_async(port=port, timeout=timeout))
     
     def run_config_portal(self, timeout=300):
         """
@@ -322,11 +636,11 @@ Connection: close
         返回:
             无
         """
-        print('启动配置门户...')
+        _log.info('启动配置门户...')
         
         # 启动AP
         if not self.start_ap():
-            print('无法启动AP模式，配置门户失败')
+            _log.error('无法启动AP模式，配置门户失败')
             return
         
         # 运行Web服务器
@@ -334,7 +648,65 @@ Connection: close
         
         # 停止AP
         self.stop_ap()
-        print('配置门户已关闭')
+        _log.info('配置门户已关闭')
+
+    async def run_server_async(self, port=80, timeout=300):
+        """
+        运行Web服务器（协程版本）
+        每个客户端连接由独立的协程处理，多个连接可以同时被服务，
+        等待期间让出CPU，使其他任务（如串口时间输出）继续运行
+        
+        参数:
+            port: 服务器端口（默认80）
+            timeout: 服务器运行超时时间（秒，默认300秒/5分钟）
+        
+        返回:
+            无
+        """
+        server = None
+        try:
+            server = await asyncio.start_server(self.handle_client, '0.0.0.0', port)
+            self.server_socket = server
+            
+            _log.info('Web服务器已启动，端口: {}', port)
+            if self.ap:
+                _log.info('请在浏览器中访问: http://{}', self.ap.ifconfig()[0])
+            
+            await asyncio.sleep(timeout)
+            
+            _log.info('Web服务器已停止（超时）')
+            
+        except Exception as e:
+            _log.error('运行Web服务器时出错: {}', e)
+        finally:
+            if server:
+                server.close()
+                # 关闭仍处于keep-alive状态的连接
+                for writer in self._writers:
+                    writer.close()
+                await server.wait_closed()
+            self.server_socket = None
+    
+    async def run_config_portal_async(self, timeout=300):
+        """
+        运行配置门户（协程版本，启动AP + Web服务器）
+        
+        参数:
+            timeout: 配置门户运行时间（秒）
+        
+        返回:
+            无
+        """
+        _log.info('启动配置门户...')
+        
+        if not await self.start_ap_async():
+            _log.error('无法启动AP模式，配置门户失败')
+            return
+        
+        await self.run_server_async(port=80, timeout=timeout)
+        
+        self.stop_ap()
+        _log.info('配置门户已关闭')
 
 def main():
     """
@@ -1,77 +1,380 @@
 import json
 import os
 import sys
+import binascii
+import kvstore
+import logger
 
 # 兼容MicroPython和标准Python
 try:
     import uos
     # MicroPython环境
-    def listdir():
-        return uos.listdir()
-    
     def remove_file(filename):
         uos.remove(filename)
+    
+    def rename_file(old, new):
+        uos.rename(old, new)
+    
+    def file_exists(filename):
+        try:
+            uos.stat(filename)
+            return True
+        except OSError:
+            return False
 except ImportError:
     # 标准Python环境
-    def listdir():
-        return os.listdir()
-    
     def remove_file(filename):
         os.remove(filename)
+    
+    def rename_file(old, new):
+        os.replace(old, new)
+    
+    def file_exists(filename):
+        try:
+            os.stat(filename)
+            return True
+        except OSError:
+            return False
 
+# WiFi配置和快速重连缓存（上次连接的AP的BSSID、信道和DHCP分配的IP配置）保存在kvstore中，
+# 旧版本的JSON文件在第一次使用时迁移过来
+CONFIG_KEY = 'wifi_config'
+FAST_CONNECT_KEY = 'wifi_fast'
+# 每个网络的连接统计单独保存在STATS_KEY_PREFIX + ssid下：[成功次数, 失败次数, 最近成功的序号]，
+# 记录一次连接结果只追加变化的这几条小记录，不重写整个配置
+STATS_KEY_PREFIX = 'wifi_stats:'
 CONFIG_FILE = 'wifi_config.json'
+FAST_CONNECT_FILE = 'wifi_fast.json'
 DEFAULT_CONFIG = {
     'ssid': '',
     'password': ''
 }
 
-def load_wifi_config():
+_log = logger.get_logger('config')
+
+# 写入时先写临时文件，再把旧文件改名为备份、临时文件改名为正式文件
+TMP_SUFFIX = '.tmp'
+BAK_SUFFIX = '.bak'
+
+class AtomicJSONFile:
     """
-    加载WiFi配置
-    
-    返回:
-        包含ssid和password的字典，如果文件不存在或格式错误，返回默认配置
+    掉电安全的JSON文件
+
+    文件内容为一行文件头"<版本号> <CRC32>"加JSON正文；写入时先完整写入临时文件，
+    再把旧文件改名为备份、临时文件改名为正式文件，任何时刻掉电都至少保留一份完整的副本。
+    加载时选择校验通过且版本号最大的副本（正式文件或未改名的临时文件），都无效时使用备份；
+    内容与上次加载/写入的相同时不写闪存。没有文件头的旧版本JSON文件按版本号0读取
+
+    参数:
+        filename: 文件名
     """
+    def __init__(self, filename):
+        self.filename = filename
+        self.generation = None   # 当前内容的版本号，None表示尚未读取
+        self.body = None         # 当前内容的JSON正文（bytes），用于跳过内容不变的写入
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:1] == b'{':
+            return 0, data
+        header, body = data.split(b'\n', 1)
+        generation, crc = header.split()
+        if int(crc, 16) != binascii.crc32(body) & 0xffffffff:
+            raise ValueError('校验和错误')
+        return int(generation), body
+
+    def load(self):
+        """
+        加载文件内容
+
+        返回:
+            解析后的对象，没有有效的副本时返回None
+        """
+        best = None
+        for path in (self.filename, self.filename + TMP_SUFFIX, self.filename + BAK_SUFFIX):
+            if best is not None and path.endswith(BAK_SUFFIX):
+                break
+            if not file_exists(path):
+                continue
+            try:
+                generation, body = self._read(path)
+                value = json.loads(body)
+            except Exception as e:
+                _log.warning('{}已损坏: {}', path, e)
+                continue
+            if best is None or generation > best[0]:
+                best = (generation, body, value)
+        if best is None:
+            self.generation = 0
+            self.body = None
+            return None
+        self.generation, self.body, value = best
+        return value
+
+    def save(self, value):
+        """
+        保存内容（与当前内容相同时不写闪存）
+
+        参数:
+            value: 可以转换为JSON的对象
+
+        返回:
+            True如果保存成功（或无需保存），否则False
+        """
+        body = json.dumps(value).encode('utf-8')
+        if self.generation is None:
+            self.load()
+        if body == self.body:
+            self.skipped_writes += 1
+            return True
+        generation = self.generation + 1
+        header = '{} {:08x}\n'.format(generation, binascii.crc32(body) & 0xffffffff)
+        tmp = self.filename + TMP_SUFFIX
+        bak = self.filename + BAK_SUFFIX
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(header.encode('utf-8'))
+                f.write(body)
+            if file_exists(self.filename):
+                if file_exists(bak):
+                    remove_file(bak)
+                rename_file(self.filename, bak)
+            rename_file(tmp, self.filename)
+        except Exception as e:
+            _log.error('保存{}时出错: {}', self.filename, e)
+            self.generation = None   # 下次保存前重新读取
+            return False
+        self.generation = generation
+        self.body = body
+        self.writes += 1
+        return True
+
+    def remove(self):
+        """
+        删除文件及其临时文件和备份
+
+        返回:
+            True如果删除了文件，False如果文件不存在
+        """
+        removed = False
+        for path in (self.filename, self.filename + TMP_SUFFIX, self.filename + BAK_SUFFIX):
+            if file_exists(path):
+                remove_file(path)
+                removed = True
+        self.generation = 0
+        self.body = None
+        return removed
+
+_store = None
+
+def _get_store():
+    # 打开键值存储，第一次打开时迁移旧版本的JSON文件
+    global _store
+    if _store is None:
+        store = kvstore.get_store()
+        for key, filename in ((CONFIG_KEY, CONFIG_FILE), (FAST_CONNECT_KEY, FAST_CONNECT_FILE)):
+            if key in store:
+                continue
+            legacy = AtomicJSONFile(filename)
+            value = legacy.load()
+            if value is not None:
+                store.put_json(key, value)
+                legacy.remove()
+                _log.info('已把{}迁移到{}', filename, store.path)
+        _store = store
+    return _store
+
+# 已加载的配置（整个程序共用一份，保存或清除配置时更新，不再重复读取存储）
+_config = None
+
+# 尚未写入存储的连接失败次数 {ssid: 次数}（下次连接成功时一起保存）
+_pending_failures = {}
+
+def _read_config():
     try:
-        if CONFIG_FILE in listdir():
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                # 验证必要的字段
-                if 'ssid' in config and 'password' in config:
-                    return config
-                else:
-                    print('WiFi配置文件格式错误，使用默认配置')
+        config = _get_store().get_json(CONFIG_KEY)
+        if config is None:
+            _log.info('没有保存的WiFi配置，使用默认配置')
+        # 验证必要的字段
+        elif 'ssid' in config and 'password' in config:
+            return config
         else:
-            print('WiFi配置文件不存在，使用默认配置')
+            _log.warning('WiFi配置格式错误，使用默认配置')
     except Exception as e:
-        print('加载WiFi配置时出错: {}'.format(e))
+        _log.error('加载WiFi配置时出错: {}', e)
     
     return DEFAULT_CONFIG.copy()
 
-def save_wifi_config(ssid, password):
+def load_wifi_config():
     """
-    保存WiFi配置
+    加载WiFi配置（只在第一次调用时读取存储，之后返回缓存的配置）
+    
+    返回:
+        包含ssid和password的字典，如果没有保存的配置或格式错误，返回默认配置；
+        返回的是缓存对象，修改配置请使用save_wifi_config()等函数
+    """
+    global _config
+    if _config is None:
+        _config = _read_config()
+    return _config
+
+def invalidate_config():
+    """
+    丢弃缓存的配置，下次加载时重新读取存储
+    """
+    global _config
+    _config = None
+
+def _write_config(config):
+    global _config
+    try:
+        _get_store().put_json(CONFIG_KEY, config)
+        _config = config
+        return True
+    except Exception as e:
+        _log.error('保存WiFi配置时出错: {}', e)
+        # 记录可能只写了一部分，下次加载时重新读取
+        _config = None
+        return False
+
+def _new_profile(ssid, password, priority=0):
+    return {
+        'ssid': ssid,
+        'password': password,
+        'priority': priority
+    }
+
+def _profiles(config):
+    # 旧版本配置文件只有一个网络（ssid/password），转换为网络列表
+    networks = config.get('networks')
+    if networks is None:
+        networks = []
+        if config.get('ssid'):
+            networks.append(_new_profile(config['ssid'], config['password']))
+    return networks
+
+def save_wifi_config(ssid, password, priority=0):
+    """
+    保存WiFi配置（同时加入已保存的网络列表，已存在时更新密码和优先级）
     
     参数:
         ssid: WiFi网络名称
         password: WiFi密码
+        priority: 优先级（越大越优先）
     
     返回:
         True如果保存成功，否则False
     """
-    config = {
-        'ssid': ssid,
-        'password': password
-    }
+    config = dict(load_wifi_config())
+    networks = [dict(profile) for profile in _profiles(config)]
+    for profile in networks:
+        if profile['ssid'] == ssid:
+            profile['password'] = password
+            profile['priority'] = priority
+            break
+    else:
+        networks.append(_new_profile(ssid, password, priority))
+    config['ssid'] = ssid
+    config['password'] = password
+    config['networks'] = networks
     
-    try:
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config, f)
-        print('WiFi配置已保存到 {}'.format(CONFIG_FILE))
+    if _write_config(config):
+        _log.info('WiFi配置已保存到 {}', _get_store().path)
         return True
-    except Exception as e:
-        print('保存WiFi配置时出错: {}'.format(e))
+    return False
+
+def load_networks():
+    """
+    加载已保存的网络列表
+    
+    返回:
+        列表，每项为字典 {'ssid', 'password', 'priority', 'successes', 'failures', 'last_success'}，
+        连接统计从各网络的STATS_KEY_PREFIX键读取，failures包括尚未写入存储的失败次数
+    """
+    return [_with_stats(profile) for profile in _profiles(load_wifi_config())]
+
+def remove_network(ssid):
+    """
+    从已保存的网络列表中删除一个网络
+    
+    参数:
+        ssid: WiFi网络名称
+    
+    返回:
+        True如果删除成功，否则False
+    """
+    config = dict(load_wifi_config())
+    networks = [profile for profile in _profiles(config) if profile['ssid'] != ssid]
+    config['networks'] = networks
+    if config.get('ssid') == ssid:
+        # 删除的是当前网络：改用列表中的第一个网络
+        config['ssid'] = networks[0]['ssid'] if networks else ''
+        config['password'] = networks[0]['password'] if networks else ''
+    if not _write_config(config):
         return False
+    _pending_failures.pop(ssid, None)
+    try:
+        _get_store().delete(STATS_KEY_PREFIX + ssid)
+    except Exception as e:
+        _log.warning('删除连接统计时出错: {}', e)
+    return True
+
+def _with_stats(profile):
+    # 返回加上连接统计（存储中的和尚未写入存储的失败次数）后的网络配置副本
+    profile = dict(profile)
+    stats = None
+    try:
+        stats = _get_store().get_json(STATS_KEY_PREFIX + profile['ssid'])
+    except Exception as e:
+        _log.warning('加载连接统计时出错: {}', e)
+    if stats is not None:
+        profile['successes'], profile['failures'], profile['last_success'] = stats
+    else:
+        # 旧版本的统计保存在配置中，第一次记录连接结果后改用单独的键
+        profile.setdefault('successes', 0)
+        profile.setdefault('failures', 0)
+        profile.setdefault('last_success', 0)
+    profile['failures'] += _pending_failures.get(profile['ssid'], 0)
+    return profile
+
+def record_connect_result(ssid, success):
+    """
+    记录一次连接结果（成功/失败次数和最近成功的顺序），用于排序候选网络
+    
+    失败只在内存中计数，下次连接成功时和成功结果一起写入存储，重试失败不会反复写闪存；
+    每个网络的统计保存在单独的键下，只写入统计有变化的网络，不重写整个配置；
+    last_success是递增的成功序号（比所有网络的last_success都大），不依赖RTC，
+    NTP同步之前记录的结果也能正确排序
+    
+    参数:
+        ssid: WiFi网络名称
+        success: 是否连接成功
+    """
+    if not success:
+        _pending_failures[ssid] = _pending_failures.get(ssid, 0) + 1
+        return
+    networks = load_networks()
+    latest = 0
+    for profile in networks:
+        latest = max(latest, profile['last_success'])
+    if not any(profile['ssid'] == ssid for profile in networks):
+        return
+    try:
+        store = _get_store()
+        for profile in networks:
+            if profile['ssid'] == ssid:
+                profile['successes'] += 1
+                profile['last_success'] = latest + 1
+            elif profile['ssid'] not in _pending_failures:
+                continue
+            store.put_json(STATS_KEY_PREFIX + profile['ssid'],
+                           [profile['successes'], profile['failures'], profile['last_success']])
+        _pending_failures.clear()
+    except Exception as e:
+        _log.error('保存连接统计时出错: {}', e)
 
 def get_current_config():
     """
@@ -87,14 +390,80 @@ def clear_wifi_config():
     """
     清除保存的WiFi配置
     """
+    global _config
     try:
-        if CONFIG_FILE in listdir():
-            remove_file(CONFIG_FILE)
-            print('WiFi配置已清除')
+        _config = None
+        store = _get_store()
+        for key in store.keys():
+            if key.startswith(STATS_KEY_PREFIX):
+                store.delete(key)
+        _pending_failures.clear()
+        if store.delete(CONFIG_KEY):
+            _log.info('WiFi配置已清除')
             return True
         else:
-            print('WiFi配置文件不存在，无需清除')
+            _log.info('没有保存的WiFi配置，无需清除')
             return True
     except Exception as e:
-        print('清除WiFi配置时出错: {}'.format(e))
+        _log.error('清除WiFi配置时出错: {}', e)
+        return False
+
+def load_fast_connect(ssid=None):
+    """
+    加载快速重连缓存
+    
+    参数:
+        ssid: 要连接的WiFi网络名称（与缓存的网络不同时不使用缓存），None表示任意网络
+    
+    返回:
+        字典 {'ssid', 'bssid'(bytes), 'channel', 'ifconfig'(元组)}，没有可用的缓存时返回None
+    """
+    try:
+        cache = _get_store().get_json(FAST_CONNECT_KEY)
+        if cache is None:
+            return None
+        if ssid is not None and cache.get('ssid') != ssid:
+            return None
+        cache['bssid'] = binascii.unhexlify(cache['bssid'])
+        cache['ifconfig'] = tuple(cache['ifconfig'])
+        return cache
+    except Exception as e:
+        _log.warning('加载快速重连缓存时出错: {}', e)
+        return None
+
+def save_fast_connect(ssid, bssid, channel, ifconfig):
+    """
+    保存快速重连缓存（内容没有变化时不写闪存）
+    
+    参数:
+        ssid: WiFi网络名称
+        bssid: AP的BSSID（bytes）
+        channel: AP的信道
+        ifconfig: DHCP分配的(ip, 子网掩码, 网关, DNS)
+    
+    返回:
+        True如果保存成功（或无需保存），否则False
+    """
+    cache = {
+        'ssid': ssid,
+        'bssid': binascii.hexlify(bssid).decode(),
+        'channel': channel,
+        'ifconfig': list(ifconfig)
+    }
+    try:
+        _get_store().put_json(FAST_CONNECT_KEY, cache)
+        return True
+    except Exception as e:
+        _log.warning('保存快速重连缓存时出错: {}', e)
+        return False
+
+def clear_fast_connect():
+    """
+    清除快速重连缓存（例如AP更换或IP地址失效后）
+    """
+    try:
+        _get_store().delete(FAST_CONNECT_KEY)
+        return True
+    except Exception as e:
+        _log.warning('清除快速重连缓存时出错: {}', e)
         return False
@@ -1,5 +1,47 @@
 import network
 import time
+import wifi_config_service
+import metrics
+import logger
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+try:
+    import random
+except ImportError:
+    import urandom as random
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+_log = logger.get_logger('wifi')
+
+if hasattr(asyncio, 'sleep_ms'):
+    _sleep_ms = asyncio.sleep_ms
+else:
+    def _sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+# 等待连接时的状态轮询间隔：从POLL_MIN_MS开始，每次加倍，最大POLL_MAX_MS
+POLL_MIN_MS = 10
+POLL_MAX_MS = 100
+
+# 使用缓存的BSSID和IP快速连接的超时时间（毫秒），超时后清除缓存并扫描后完整连接
+FAST_CONNECT_TIMEOUT_MS = 3000
+
+# 扫描结果的有效期（毫秒）：期间再次连接（例如退避后重试）直接使用上次的结果，不再扫描
+SCAN_MAX_AGE_MS = 10000
+
+# 表示连接已经失败（不必等到超时）的状态码，不同端口支持的状态码不同
+_FAIL_STATUSES = tuple(getattr(network, name) for name in
+                       ('STAT_WRONG_PASSWORD', 'STAT_NO_AP_FOUND', 'STAT_CONNECT_FAIL',
+                        'STAT_ASSOC_FAIL', 'STAT_HANDSHAKE_TIMEOUT')
+                       if hasattr(network, name))
 
 def wifi_init():
     """
@@ -13,6 +55,7 @@ def wifi_init():
         wlan.active(True)
     return wlan
 
+@metrics.timed('wifi_connect_us')
 def wifi_connect(wlan, ssid, password, timeout_seconds=15):
     """
     连接WiFi网络
@@ -31,7 +74,7 @@ def wifi_connect(wlan, ssid, password, timeout_seconds=15):
         wifi_disconnect(wlan)
         time.sleep(0.5)
     
-    print('正在连接WiFi网络: {}...'.format(ssid))
+    _log.info('正在连接WiFi网络: {}...', ssid)
     
     wlan.connect(ssid, password)
     
@@ -42,15 +85,312 @@ def wifi_connect(wlan, ssid, password, timeout_seconds=15):
         timeout -= 1
         # 每隔5秒打印一次等待信息
         if timeout % 5 == 0 and timeout != timeout_seconds:
-            print('等待连接...剩余{}秒'.format(timeout))
+            _log.debug('等待连接...剩余{}秒', timeout)
     
     if wlan.isconnected():
-        print('WiFi连接成功! 网络配置: {}'.format(wlan.ifconfig()))
+        _log.info('WiFi连接成功! 网络配置: {}', wlan.ifconfig())
         return True
     else:
-        print('WiFi连接失败! 请检查SSID和密码，或网络状况。')
+        _log.warning('WiFi连接失败! 请检查SSID和密码，或网络状况。')
         return False
 
+@metrics.timed_async('wifi_connect_us')
+async def wifi_connect_async(wlan, ssid, password, timeout_seconds=15):
+    """
+    连接WiFi网络（协程版本，等待期间让出CPU，不阻塞其他任务）
+    
+    参数:
+        wlan: wlan对象
+        ssid: WiFi网络名称
+        password: WiFi密码
+        timeout_seconds: 连接超时时间（秒）
+    
+    返回:
+        True如果连接成功，否则False
+    """
+    # 如果已经连接，则断开以重新连接
+    if wlan.isconnected():
+        wifi_disconnect(wlan)
+        await asyncio.sleep(0.5)
+    
+    _log.info('正在连接WiFi网络: {}...', ssid)
+    
+    wlan.connect(ssid, password)
+    
+    connected = await _wait_connected(wlan, timeout_seconds * 1000)
+    
+    if connected:
+        _log.info('WiFi连接成功! 网络配置: {}', wlan.ifconfig())
+        return True
+    else:
+        _log.warning('WiFi连接失败! 请检查SSID和密码，或网络状况。')
+        return False
+
+async def _wait_connected(wlan, timeout_ms, stats=None):
+    """
+    等待连接完成：开始时每POLL_MIN_MS毫秒检查一次状态，之后逐渐放慢到POLL_MAX_MS，
+    状态码表示连接失败时立即返回
+    
+    返回:
+        True如果连接成功，否则False
+    """
+    start = time.ticks_ms()
+    delay = POLL_MIN_MS
+    next_report = 5000
+    polls = 0
+    connected = False
+    while True:
+        polls += 1
+        if wlan.isconnected():
+            connected = True
+            break
+        if wlan.status() in _FAIL_STATUSES:
+            break
+        elapsed = time.ticks_diff(time.ticks_ms(), start)
+        if elapsed >= timeout_ms:
+            break
+        # 每隔5秒打印一次等待信息
+        if elapsed >= next_report:
+            _log.debug('等待连接...剩余{}秒', (timeout_ms - elapsed) // 1000)
+            next_report += 5000
+        await _sleep_ms(delay)
+        if delay < POLL_MAX_MS:
+            delay = min(delay * 2, POLL_MAX_MS)
+    if stats is not None:
+        stats['polls'] = stats.get('polls', 0) + polls
+    return connected
+
+# 最近一次扫描：[完成时的ticks_ms, 扫描结果]
+_last_scan = [None, None]
+
+def _scan_thread(wlan, state):
+    # 在后台线程中扫描，完成后设置state[0]
+    try:
+        state[1] = wlan.scan()
+    except Exception as e:
+        state[2] = e
+    state[0] = True
+
+async def wifi_scan(wlan, max_age_ms=SCAN_MAX_AGE_MS):
+    """
+    扫描WiFi网络（协程）
+    
+    wlan.scan()会阻塞1.5~2秒：有_thread模块时在后台线程中扫描（ESP32扫描期间释放GIL），
+    事件循环照常运行；否则在扫描前后各让出一次CPU。max_age_ms内扫描过时直接返回上次的结果
+    
+    参数:
+        wlan: wlan对象
+        max_age_ms: 可以直接使用的上次扫描结果的最长时间（毫秒），0表示总是重新扫描
+    
+    返回:
+        wlan.scan()的结果
+    """
+    stamp, results = _last_scan
+    if stamp is not None and time.ticks_diff(time.ticks_ms(), stamp) < max_age_ms:
+        return results
+    await _sleep_ms(0)
+    if _thread is not None:
+        state = [False, None, None]
+        _thread.start_new_thread(_scan_thread, (wlan, state))
+        while not state[0]:
+            await _sleep_ms(POLL_MAX_MS)
+        if state[2] is not None:
+            raise state[2]
+        results = state[1]
+    else:
+        results = wlan.scan()
+        await _sleep_ms(0)
+    _last_scan[0] = time.ticks_ms()
+    _last_scan[1] = results
+    return results
+
+async def _find_ap(wlan, ssid):
+    # 扫描并返回信号最强的同名AP：(ssid, bssid, channel, RSSI, security, hidden)
+    best = None
+    name = ssid.encode()
+    for ap in await wifi_scan(wlan):
+        if ap[0] == name and (best is None or ap[3] > best[3]):
+            best = ap
+    return best
+
+def _set_dhcp(wlan):
+    # 恢复DHCP（旧版本固件不支持时忽略）
+    try:
+        wlan.ifconfig('dhcp')
+    except Exception:
+        pass
+
+async def _connect_cached(wlan, cache, password, stats):
+    # 使用缓存的BSSID和IP配置连接，失败时清除缓存
+    start = time.ticks_ms()
+    ssid = cache['ssid']
+    _log.info('正在快速连接WiFi网络: {}（信道{}）...', ssid, cache['channel'])
+    stats['fast'] = True
+    wlan.ifconfig(cache['ifconfig'])
+    wlan.connect(ssid, password, bssid=cache['bssid'])
+    if await _wait_connected(wlan, FAST_CONNECT_TIMEOUT_MS, stats):
+        stats['connect_ms'] = time.ticks_diff(time.ticks_ms(), start)
+        _log.info('WiFi快速连接成功! 耗时{}毫秒, 网络配置: {}', stats['connect_ms'], wlan.ifconfig())
+        return True
+    _log.warning('WiFi快速连接失败，清除缓存后重新扫描')
+    wlan.disconnect()
+    wifi_config_service.clear_fast_connect()
+    return False
+
+async def _connect_ap(wlan, ssid, password, ap, timeout_ms, stats):
+    # 连接扫描到的AP（ap为None时由驱动自行查找），成功后保存快速重连缓存
+    start = time.ticks_ms()
+    _log.info('正在连接WiFi网络: {}...', ssid)
+    _set_dhcp(wlan)
+    if ap is not None:
+        wlan.connect(ssid, password, bssid=ap[1])
+    else:
+        # 没有扫描到（可能是隐藏网络）
+        wlan.connect(ssid, password)
+    connected = await _wait_connected(wlan, timeout_ms, stats)
+    stats['connect_ms'] = time.ticks_diff(time.ticks_ms(), start)
+    if connected:
+        _log.info('WiFi连接成功! 网络配置: {}', wlan.ifconfig())
+        if ap is not None:
+            wifi_config_service.save_fast_connect(ssid, ap[1], ap[2], wlan.ifconfig())
+    else:
+        wlan.disconnect()
+        _log.warning('WiFi连接失败! 请检查SSID和密码，或网络状况。')
+    return connected
+
+@metrics.timed_async('wifi_connect_us')
+async def wifi_connect_fast(wlan, ssid, password, timeout_seconds=15, stats=None):
+    """
+    快速连接WiFi网络（协程）
+    
+    已连接到同一网络时直接返回；有快速重连缓存时，使用缓存的BSSID（跳过扫描）和
+    上次DHCP分配的IP配置（跳过DHCP）连接，失败后清除缓存；只有没有缓存或快速连接失败时才扫描
+    （wifi_scan()，不阻塞事件循环），连接信号最强的AP，成功后把AP和IP配置保存到缓存，供下次启动使用
+    
+    参数:
+        wlan: wlan对象
+        ssid: WiFi网络名称
+        password: WiFi密码
+        timeout_seconds: 连接超时时间（秒）
+        stats: 可选字典，填入各阶段耗时：fast（是否使用缓存）、scan_ms、connect_ms、total_ms、polls
+    
+    返回:
+        True如果连接成功，否则False
+    """
+    if stats is None:
+        stats = {}
+    start = time.ticks_ms()
+    stats['fast'] = False
+    if wlan.isconnected():
+        if wlan.config('essid') == ssid:
+            stats['total_ms'] = 0
+            return True
+        wifi_disconnect(wlan)
+    
+    cache = wifi_config_service.load_fast_connect(ssid)
+    connected = cache is not None and await _connect_cached(wlan, cache, password, stats)
+    if not connected:
+        phase = time.ticks_ms()
+        ap = await _find_ap(wlan, ssid)
+        stats['scan_ms'] = time.ticks_diff(time.ticks_ms(), phase)
+        remaining = timeout_seconds * 1000 - time.ticks_diff(time.ticks_ms(), start)
+        connected = await _connect_ap(wlan, ssid, password, ap, remaining, stats)
+    stats['total_ms'] = time.ticks_diff(time.ticks_ms(), start)
+    return connected
+
+def rank_networks(scan_results, networks):
+    """
+    按扫描结果给已保存的网络排序
+    
+    参数:
+        scan_results: wlan.scan()的结果
+        networks: 已保存的网络列表（wifi_config_service.load_networks()）
+    
+    返回:
+        [(profile, ap), ...]：扫描到的网络按优先级、信号强度（同名AP取最强的）、
+        最近成功连接的顺序排序，未扫描到的网络（可能是隐藏网络）按优先级排在最后，ap为None
+    """
+    strongest = {}
+    for ap in scan_results:
+        best = strongest.get(ap[0])
+        if best is None or ap[3] > best[3]:
+            strongest[ap[0]] = ap
+    visible = []
+    hidden = []
+    for profile in networks:
+        ap = strongest.get(profile['ssid'].encode())
+        if ap is not None:
+            visible.append((profile, ap))
+        else:
+            hidden.append((profile, None))
+    visible.sort(key=lambda item: (item[0].get('priority', 0), item[1][3],
+                                   item[0].get('last_success', 0)), reverse=True)
+    hidden.sort(key=lambda item: item[0].get('priority', 0), reverse=True)
+    return visible + hidden
+
+@metrics.timed_async('wifi_connect_us')
+async def wifi_connect_best(wlan, networks, timeout_seconds=15, stats=None, fast=True):
+    """
+    连接已保存的网络中最合适的一个（协程）
+    
+    已连接到列表中的网络时直接返回；fast为True且快速重连缓存属于列表中的网络时先尝试快速连接；
+    否则扫描一次（wifi_scan()，不阻塞事件循环；SCAN_MAX_AGE_MS内的退避重试使用上次的结果），
+    按rank_networks()的顺序依次尝试，每次结果记录到网络的统计信息中
+    
+    参数:
+        wlan: wlan对象
+        networks: 已保存的网络列表（wifi_config_service.load_networks()）
+        timeout_seconds: 总超时时间（秒）
+        stats: 可选字典，填入ssid、attempts和各阶段耗时（同wifi_connect_fast）
+        fast: 是否使用快速重连缓存
+    
+    返回:
+        True如果连接成功，否则False
+    """
+    if stats is None:
+        stats = {}
+    start = time.ticks_ms()
+    stats['fast'] = False
+    stats['attempts'] = 0
+    passwords = {}
+    for profile in networks:
+        passwords[profile['ssid']] = profile['password']
+    
+    if wlan.isconnected():
+        essid = wlan.config('essid')
+        if essid in passwords:
+            stats['ssid'] = essid
+            stats['total_ms'] = 0
+            return True
+        wifi_disconnect(wlan)
+    
+    cache = wifi_config_service.load_fast_connect() if fast else None
+    if cache is not None and cache['ssid'] in passwords:
+        stats['attempts'] += 1
+        if await _connect_cached(wlan, cache, passwords[cache['ssid']], stats):
+            wifi_config_service.record_connect_result(cache['ssid'], True)
+            stats['ssid'] = cache['ssid']
+            stats['total_ms'] = time.ticks_diff(time.ticks_ms(), start)
+            return True
+    
+    phase = time.ticks_ms()
+    candidates = rank_networks(await wifi_scan(wlan), networks)
+    stats['scan_ms'] = time.ticks_diff(time.ticks_ms(), phase)
+    timeout_ms = timeout_seconds * 1000
+    for profile, ap in candidates:
+        remaining = timeout_ms - time.ticks_diff(time.ticks_ms(), start)
+        if remaining <= 0:
+            break
+        stats['attempts'] += 1
+        connected = await _connect_ap(wlan, profile['ssid'], profile['password'], ap, remaining, stats)
+        wifi_config_service.record_connect_result(profile['ssid'], connected)
+        if connected:
+            stats['ssid'] = profile['ssid']
+            stats['total_ms'] = time.ticks_diff(time.ticks_ms(), start)
+            return True
+    stats['total_ms'] = time.ticks_diff(time.ticks_ms(), start)
+    return False
+
 def wifi_disconnect(wlan):
     """
     断开WiFi连接
@@ -60,7 +400,7 @@ def wifi_disconnect(wlan):
     """
     if wlan.isconnected():
         wlan.disconnect()
-        print('WiFi已断开连接')
+        _log.info('WiFi已断开连接')
 
 def wifi_status(wlan):
     """
@@ -76,3 +416,193 @@ def wifi_status(wlan):
         return '已连接，IP: {}'.format(wlan.ifconfig()[0])
     else:
         return '未连接'
+
+# 连接/断开时长直方图的桶上界（毫秒）：1秒、10秒、1分钟、10分钟、1小时，最后一个桶为更长
+DURATION_BUCKETS_MS = (1000, 10000, 60000, 600000, 3600000)
+
+def _random():
+    return random.getrandbits(16) / 65536
+
+def _bucket(duration_ms):
+    for i in range(len(DURATION_BUCKETS_MS)):
+        if duration_ms < DURATION_BUCKETS_MS[i]:
+            return i
+    return len(DURATION_BUCKETS_MS)
+
+async def _call(callback, *args):
+    # 回调可以是普通函数或协程函数
+    if callback is None:
+        return
+    result = callback(*args)
+    if result is not None and hasattr(result, 'send'):
+        await result
+
+class ConnectionSupervisor:
+    """
+    WiFi连接监管：每check_interval_ms检查一次连接状态，断开后立即重连，
+    连续失败时按带抖动的指数退避等待（base_delay_ms * 2^(失败次数-1)，最大max_delay_ms，
+    实际等待时间在[(1 - jitter) * delay, delay]之间随机，避免多个设备同时重试）
+    
+    同时统计每次连接保持的时长和每次断网的时长（直方图，桶上界见DURATION_BUCKETS_MS）
+    
+    参数:
+        wlan: wlan对象
+        connect: 连接函数（协程函数，无参数，返回True/False）
+        on_connect: 可选，每次连接（包括重连）成功后调用，例如触发NTP同步
+        on_failure: 可选，每次连接失败后调用on_failure(连续失败次数)，可以是协程函数（会等待其完成）
+        base_delay_ms: 第一次失败后的重试等待时间（毫秒）
+        max_delay_ms: 重试等待时间上限（毫秒）
+        jitter: 抖动比例（0-1）
+        check_interval_ms: 连接状态检查间隔（毫秒）
+        clock: 毫秒tick函数；sleep_ms: 协程休眠函数；rand: 返回[0, 1)随机数的函数，测试时可替换
+    """
+    def __init__(self, wlan, connect, on_connect=None, on_failure=None,
+                 base_delay_ms=1000, max_delay_ms=300000, jitter=0.5, check_interval_ms=250,
+                 clock=time.ticks_ms, sleep_ms=_sleep_ms, rand=_random):
+        self.wlan = wlan
+        self.connect = connect
+        self.on_connect = on_connect
+        self.on_failure = on_failure
+        self.base_delay_ms = base_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.jitter = jitter
+        self.check_interval_ms = check_interval_ms
+        self.clock = clock
+        self.sleep_ms = sleep_ms
+        self.rand = rand
+        self.connected = False
+        self.failures = 0            # 连续失败次数
+        self.attempts = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.first_connect_ms = None # 启动到第一次连接成功的时间
+        self.uptime_histogram = [0] * (len(DURATION_BUCKETS_MS) + 1)
+        self.outage_histogram = [0] * (len(DURATION_BUCKETS_MS) + 1)
+        self.total_uptime_ms = 0
+        self.total_outage_ms = 0
+        self.longest_outage_ms = 0
+        self.next_retry_ms = 0       # 当前退避等待时间
+        self._retry_now = False
+        self._period_ms = 0          # 当前连接/断网状态已持续的时间
+        self._last_tick = None
+
+    def backoff_ms(self, failures):
+        """
+        返回:
+            第failures次连续失败后的等待时间（毫秒，含抖动）
+        """
+        delay = self.base_delay_ms
+        for _ in range(failures - 1):
+            delay *= 2
+            if delay >= self.max_delay_ms:
+                delay = self.max_delay_ms
+                break
+        return int(delay - delay * self.jitter * self.rand())
+
+    def request_retry(self):
+        """结束当前的退避等待，立即重试（例如保存了新的WiFi配置后）"""
+        self._retry_now = True
+
+    def _tick(self):
+        now = self.clock()
+        if self._last_tick is None:
+            self._last_tick = now
+        self._period_ms += time.ticks_diff(now, self._last_tick)
+        self._last_tick = now
+
+    def _end_period(self):
+        self._tick()
+        duration = self._period_ms
+        self._period_ms = 0
+        return duration
+
+    async def _set_connected(self):
+        outage = self._end_period()
+        if self.first_connect_ms is None:
+            self.first_connect_ms = outage
+        else:
+            self.outage_histogram[_bucket(outage)] += 1
+            self.total_outage_ms += outage
+            if outage > self.longest_outage_ms:
+                self.longest_outage_ms = outage
+            _log.info('WiFi已恢复，断网{}毫秒', outage)
+        self.connected = True
+        self.connects += 1
+        self.failures = 0
+        self.next_retry_ms = 0
+        await _call(self.on_connect)
+
+    def _set_disconnected(self):
+        uptime = self._end_period()
+        self.uptime_histogram[_bucket(uptime)] += 1
+        self.total_uptime_ms += uptime
+        self.connected = False
+        self.disconnects += 1
+        _log.warning('WiFi连接已断开（已连接{}秒），立即重连', uptime // 1000)
+
+    async def _wait(self, delay_ms):
+        # 按检查间隔分段等待，期间可以被request_retry()打断
+        start = self.clock()
+        while not self._retry_now:
+            remaining = delay_ms - time.ticks_diff(self.clock(), start)
+            if remaining <= 0:
+                break
+            await self.sleep_ms(min(remaining, self.check_interval_ms))
+        self._retry_now = False
+
+    async def step(self):
+        """执行一次检查：已连接时等待一个检查间隔，断开时尝试连接，失败时进行退避等待"""
+        if self._last_tick is None:
+            self._tick()
+        if self.wlan.isconnected():
+            if not self.connected:
+                await self._set_connected()
+            await self.sleep_ms(self.check_interval_ms)
+            self._tick()
+            return
+        if self.connected:
+            self._set_disconnected()
+        self.attempts += 1
+        if await self.connect():
+            await self._set_connected()
+            return
+        self.failures += 1
+        await _call(self.on_failure, self.failures)
+        self.next_retry_ms = self.backoff_ms(self.failures)
+        _log.warning('WiFi连接失败（连续{}次），{}毫秒后重试', self.failures, self.next_retry_ms)
+        await self._wait(self.next_retry_ms)
+        self._tick()
+
+    async def run(self):
+        """后台任务：保持WiFi连接"""
+        while True:
+            await self.step()
+
+    def metrics(self):
+        """
+        返回:
+            连接统计字典（直方图的桶上界见DURATION_BUCKETS_MS）
+        """
+        self._tick()
+        if self.connected:
+            uptime = self._period_ms
+            outage = 0
+        else:
+            uptime = 0
+            outage = self._period_ms
+        return {
+            'connected': self.connected,
+            'attempts': self.attempts,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'failures': self.failures,
+            'next_retry_ms': self.next_retry_ms,
+            'first_connect_ms': self.first_connect_ms,
+            'current_uptime_ms': uptime,
+            'current_outage_ms': outage,
+            'total_uptime_ms': self.total_uptime_ms,
+            'total_outage_ms': self.total_outage_ms,
+            'longest_outage_ms': self.longest_outage_ms,
+            'uptime_histogram': self.uptime_histogram,
+            'outage_histogram': self.outage_histogram,
+        }